@@ -0,0 +1,65 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+
+File size and write/read throughput of the point cloud output formats
+for a registered 1080p frame (full resolution and the default 10%
+sampling). Open3D's default writer (float64 positions) is the reference.
+The points are uniformly random, which is the worst case for the
+compression of the npz format.
+
+    python benchmarks/bench_pointcloud_io.py
+"""
+
+import os
+import time
+import tempfile
+import numpy as np
+import open3d as o3d
+from pathlib import Path
+from calibpy.PointCloudIO import (
+    POINTCLOUD_FORMATS,
+    format_suffix,
+    read_points,
+    write_pointcloud)
+
+
+def timed(func, repeat=3):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def read_o3d(fname):
+    pcd = o3d.io.read_point_cloud(fname)
+    return np.asarray(pcd.points), np.asarray(pcd.colors)
+
+
+def read_all(fname):
+    # touch all values, so memory-mapped files are actually read
+    points, colors = read_points(fname)
+    return np.sum(points), np.sum(colors)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [1920 * 1080, 1920 * 1080 // 10]:
+            pcd = o3d.geometry.PointCloud()
+            pcd.points = o3d.utility.Vector3dVector(
+                rng.uniform(-10, 10, (n, 3)))
+            pcd.colors = o3d.utility.Vector3dVector(
+                rng.integers(0, 256, (n, 3)) / 255)
+            print(f"{n} points")
+            for fmt in POINTCLOUD_FORMATS:
+                fname = str(Path(tmp) / f"pcl.{format_suffix(fmt)}")
+                write_ms = timed(lambda: write_pointcloud(fname, pcd, fmt))
+                size = os.path.getsize(fname) / 2**20
+                read_ms = timed(lambda: read_all(fname))
+                if fmt == "ply":
+                    read_ms = timed(lambda: read_o3d(fname))
+                print(f"  {fmt:12s} {size:8.1f} MB  write {write_ms:8.1f} ms"
+                      f"  read {read_ms:8.1f} ms")
+                os.remove(fname)
@@ -0,0 +1,73 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+
+Peak memory and latency of the depth back-projection for a 1080p and a
+4K depth map. The float64 homogeneous projection used before the
+float32 projector is measured as reference.
+
+Targets for a 4K (2160x3840) depth map, projection only:
+    peak transient memory <= 100 MB (the float32 output buffer),
+                             ~0 MB with a caller provided buffer
+    latency               <= 50% of the float64 reference
+
+    python benchmarks/bench_registration.py
+"""
+
+import time
+import tracemalloc
+import numpy as np
+from calibpy.Camera import Camera
+from calibpy.Registration import backproject_depth
+
+
+def reference_projection(depth_map, camera):
+    h, w = depth_map.shape
+    u, v = np.meshgrid(np.arange(w), np.arange(h))
+    x = np.multiply(u - camera.cx, depth_map) / camera.fx
+    y = np.multiply(-(v - camera.cy), depth_map) / camera.fy
+    xyz = np.zeros((4, w*h))
+    xyz[0, :] = np.reshape(x, -1)
+    xyz[1, :] = np.reshape(y, -1)
+    xyz[2, :] = np.reshape(-depth_map, -1)
+    xyz[3, :] = 1
+    xyz = np.matmul(camera.RTb, xyz)
+    pcl = np.zeros((w*h, 3))
+    for i in range(3):
+        pcl[:, i] = xyz[i, :]
+    return pcl
+
+
+def measure(func, repeat=5):
+    func()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return peak / 2**20, (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == "__main__":
+    for h, w in [(1080, 1920), (2160, 3840)]:
+        cam = Camera()
+        cam.quick_init(image_size=(h, w))
+        cam.RT = np.array([[1, 0, 0, 0.1],
+                           [0, 0, -1, 0.2],
+                           [0, 1, 0, 3.0],
+                           [0, 0, 0, 1]])
+        depth = np.random.default_rng(0).uniform(
+            1, 10, (h, w)).astype(np.float32)
+        out = np.empty((h * w, 3), dtype=np.float32)
+        print(f"depth map {w}x{h}")
+        for name, func in [
+                ("float64 reference",
+                 lambda: reference_projection(depth, cam)),
+                ("float32", lambda: backproject_depth(depth, cam)),
+                ("float32 + buffer", lambda: backproject_depth(
+                    depth, cam, out=out))]:
+            peak, latency = measure(func)
+            print(f"  {name:20s} peak {peak:8.1f} MB  {latency:8.1f} ms")
@@ -0,0 +1,109 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+
+Save and load times and file sizes of the Camera serialization
+formats: the binary record .npy format, pickled .npy files of former
+versions, .yaml and .json. Sequences of 10k frames are stored as one
+file per frame, as a single array of records and as CameraArray in
+all formats, the text formats with base64 array blocks.
+
+    python benchmarks/bench_serialization.py
+"""
+
+import os
+import time
+import tempfile
+import numpy as np
+from pathlib import Path
+from calibpy.Camera import Camera
+from calibpy.CameraArray import CameraArray
+from calibpy.Serializer import Serializer
+
+
+def timed(func, repeat=3):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def make_camera(n: int) -> Camera:
+    cam = Camera(name=f"{n:06d}")
+    cam.quick_init(image_size=(1080, 1920))
+    cam.distortion = np.array([[0.1, -0.05, 0.001, 0.002, 0.01]])
+    RT = np.identity(4)
+    RT[:3, 3] = [0.01 * n, 0, 4]
+    cam.RT = RT
+    return cam
+
+
+def save_pickle(cam: Camera, fname: Path):
+    # the .npy format of former versions
+    Serializer._write_npy(cam, fname, cam.serialize())
+
+
+def load_all(filenames):
+    for fname in filenames:
+        Camera().load(fname)
+
+
+def load_records(fname):
+    cams = []
+    for record in np.load(fname, allow_pickle=False):
+        cam = Camera()
+        cam.from_record(record)
+        cams.append(cam)
+    return cams
+
+
+if __name__ == "__main__":
+    num_frames = 10000
+    cams = [make_camera(n) for n in range(num_frames)]
+    savers = {
+        "record": lambda cam, fname: cam.serialize(fname),
+        "pickle": save_pickle,
+        "yaml": lambda cam, fname: cam.serialize(fname),
+        "json": lambda cam, fname: cam.serialize(fname)}
+    suffixes = {"record": "npy", "pickle": "npy", "yaml": "yaml",
+                "json": "json"}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, save in savers.items():
+            fname = Path(tmp) / f"cam_{fmt}.{suffixes[fmt]}"
+            # the text formats print on every write
+            save_ms = timed(lambda: save(cams[0], fname), repeat=1)
+            size = os.path.getsize(fname)
+            load_ms = timed(lambda: Camera().load(fname), repeat=100)
+            print(f"{fmt:7s} {size:6d} B  save {save_ms:7.3f} ms"
+                  f"  load {load_ms:7.3f} ms")
+
+        for fmt in ["record", "pickle"]:
+            directory = Path(tmp) / fmt
+            directory.mkdir()
+            filenames = [directory / f"extrinsics_{n:06d}.npy"
+                         for n in range(num_frames)]
+            start = time.perf_counter()
+            for cam, fname in zip(cams, filenames):
+                savers[fmt](cam, fname)
+            save_ms = (time.perf_counter() - start) * 1000
+            load_ms = timed(lambda: load_all(filenames), repeat=1)
+            print(f"{num_frames} files   {fmt:7s} save {save_ms:8.1f} ms"
+                  f"  load {load_ms:8.1f} ms")
+
+        fname = Path(tmp) / "extrinsics.npy"
+        save_ms = timed(lambda: np.save(
+            fname, np.stack([cam.to_record() for cam in cams])), repeat=1)
+        read_ms = timed(lambda: np.load(fname, allow_pickle=False))
+        load_ms = timed(lambda: load_records(fname), repeat=1)
+        print(f"{num_frames} records in one file: save {save_ms:8.1f} ms"
+              f"  read {read_ms:8.1f} ms  to cameras {load_ms:8.1f} ms")
+
+        array = CameraArray.from_cameras(cams)
+        for suffix in ["npy", "yaml", "json"]:
+            fname = Path(tmp) / f"extrinsics_array.{suffix}"
+            save_ms = timed(lambda: array.serialize(fname), repeat=1)
+            size = os.path.getsize(fname)
+            load_ms = timed(lambda: CameraArray().load(fname), repeat=1)
+            print(f"CameraArray {suffix:4s} {size / 1e6:6.2f} MB"
+                  f"  save {save_ms:8.1f} ms  load {load_ms:8.1f} ms")
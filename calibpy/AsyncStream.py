@@ -0,0 +1,151 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import asyncio
+import threading
+from collections import deque
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from calibpy.Stream import Stream
+
+
+class AsyncStream:
+    """asyncio adapter for Stream instances. Frames are decoded in an
+    executor so the event loop is never blocked by disk reads or image
+    decoding. The number of reads in flight is bounded by max_in_flight.
+
+    Usage::
+
+        async with AsyncStream(stream) as astream:
+            async for img in astream:
+                result = await astream.submit(calib.detect_corners, img)
+            img = await astream.aget(0)
+    """
+
+    def __init__(
+            self,
+            stream: Stream,
+            max_in_flight: int = 4,
+            executor: ThreadPoolExecutor = None,
+            **read_kwargs):
+        """
+        :param stream: initialized Stream instance
+        :type stream: Stream
+        :param max_in_flight: maximum number of concurrent reads,
+            defaults to 4
+        :type max_in_flight: int, optional
+        :param executor: executor to run reads and submitted functions,
+            if None a ThreadPoolExecutor is created, defaults to None
+        :type executor: ThreadPoolExecutor, optional
+        :param read_kwargs: keyword arguments passed to each read,
+            e.g. flag=cv2.IMREAD_COLOR
+        """
+        assert isinstance(stream, Stream)
+        assert max_in_flight >= 1
+        self._stream = stream
+        self._max_in_flight = max_in_flight
+        self._read_kwargs = read_kwargs
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._executor = executor
+        self._semaphore = None
+        # streams without concurrent_reads are decoded one at a time
+        self._read_lock = None
+        if not stream.concurrent_reads:
+            self._read_lock = threading.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        # waiting for running reads must not block the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def __aiter__(self):
+        return self.frames()
+
+    @property
+    def stream(self):
+        return self._stream
+
+    @property
+    def length(self):
+        return self._stream.length
+
+    def close(self):
+        """Shut down the executor if it was created by this instance
+        """
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _read(self, index: int, kwargs: dict):
+        if self._read_lock is None:
+            return self._stream.read(index, **kwargs)
+        with self._read_lock:
+            return self._stream.read(index, **kwargs)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_in_flight)
+        return self._semaphore
+
+    def submit(self, func, *args, **kwargs) -> asyncio.Future:
+        """Run an arbitrary function in the executor and return an
+        awaitable of its result, e.g. corner detection on a frame:
+        await astream.submit(calib.detect_corners, img)
+
+        :param func: function to run
+        :type func: callable
+        :return: awaitable result
+        :rtype: asyncio.Future
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(
+            self._executor, partial(func, *args, **kwargs))
+
+    async def aget(self, index: int, **kwargs):
+        """Load an arbitrary frame without blocking the event loop.
+        The current_frame pointer of the stream is not changed.
+
+        :param index: frame pointer
+        :type index: int
+        :return: frame or None if index is out of range
+        """
+        read_kwargs = dict(self._read_kwargs)
+        read_kwargs.update(kwargs)
+        return await self._bounded_read(index, read_kwargs)
+
+    async def _bounded_read(self, index: int, kwargs: dict):
+        # all reads share the semaphore, so aget calls and read-ahead
+        # of frames() together stay below max_in_flight
+        async with self._get_semaphore():
+            return await self.submit(self._read, index, kwargs)
+
+    async def frames(self, from_index: int = 0, **kwargs):
+        """Asynchronous generator yielding all frames in order starting
+        at from_index. Up to max_in_flight upcoming frames are read
+        ahead while the caller processes the current one.
+
+        :param from_index: first frame pointer, defaults to 0
+        :type from_index: int, optional
+        """
+        read_kwargs = dict(self._read_kwargs)
+        read_kwargs.update(kwargs)
+        pending = deque()
+        index = from_index
+        try:
+            while index < self.length or len(pending) > 0:
+                while index < self.length and \
+                        len(pending) < self._max_in_flight:
+                    pending.append(asyncio.ensure_future(
+                        self._bounded_read(index, read_kwargs)))
+                    index += 1
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -9,6 +9,8 @@ import numpy as np
 from pathlib import Path
 import matplotlib.pylab as plt
 from calibpy.Camera import Camera
+from calibpy.CameraArray import CameraArray
+from calibpy.CameraSequence import CameraSequence
 from calibpy.Settings import Settings
 from calibpy.Aruco import (
     ArucoTarget,
@@ -128,17 +130,46 @@ class Calibration:
                           self._settings.max_count,
                           self._settings.epsilon)
 
-    def calibrate_extrinsics(self, stream: Stream, cam: Camera) -> list:
+    def detect_corners(self, img: np.ndarray) -> tuple:
+        """Finds the charuco corners of the calibration target
+
+        :param img: grayscale input image
+        :type img: np.ndarray
+        :return: response, charuco_corners, charuco_ids, corners
+        :rtype: tuple
+        """
+        return get_aruco_corners(img, self._aruco_target, self._criteria)
+
+    def calibrate_extrinsics(
+            self,
+            stream: Stream,
+            cam: Camera,
+            quality: list = None,
+            sequence: CameraSequence = None,
+            as_array: bool = False) -> list:
         """calibrate extrinsics from input stream
 
         :param stream: Stream instance
         :type stream: Stream
         :param cam: Camera instance with instrinsics
         :type cam: Camera
-        :return: list of cameras with extrinsics
+        :param quality: if a list is passed, a dict with the number of
+            detected corners (num_corners) and the RMS reprojection
+            error in px (reprojection_error) is appended for each
+            camera, defaults to None
+        :type quality: list, optional
+        :param sequence: if passed, each camera is appended to the
+            sequence file as soon as it is calibrated, defaults to None
+        :type sequence: CameraSequence, optional
+        :param as_array: return a CameraArray sharing the intrinsics of
+            cam instead of a Camera copy per frame, defaults to False
+        :type as_array: bool, optional
+        :return: list of cameras with extrinsics or CameraArray
         :rtype: list
         """
         cams = []
+        names = []
+        RTs = []
 
         image_size = None
         while True:
@@ -166,7 +197,7 @@ class Calibration:
 
             # get targets aruco corners
             response, charuco_corners, charuco_ids, corners = \
-                get_aruco_corners(img, self._aruco_target, self._criteria)
+                self.detect_corners(img)
 
             if self.visualize:
                 vis = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
@@ -200,11 +231,34 @@ class Calibration:
             Rt[0:3, 3] = np.array([x[0] for x in tvec])
             Rt[3, 3] = 1
 
-            cam_n = Camera.from_cam(cam)
-            cam_n.name = name
-            cam_n.RT = Rt
-            cams.append(cam_n)
-
+            if as_array:
+                names.append(name)
+                RTs.append(Rt)
+            if not as_array or sequence is not None:
+                cam_n = Camera.from_cam(cam)
+                cam_n.name = name
+                cam_n.RT = Rt
+            if not as_array:
+                cams.append(cam_n)
+
+            if quality is not None or sequence is not None:
+                projected, _ = cv2.projectPoints(
+                    p3d, rvec, tvec, cam.intrinsics, cam.distortion)
+                residuals = projected.reshape(-1, 2) - \
+                    charuco_corners.reshape(-1, 2)
+                frame_quality = {
+                    "num_corners": int(response),
+                    "reprojection_error": float(
+                        np.sqrt(np.mean(np.sum(residuals**2, axis=1))))}
+                if quality is not None:
+                    quality.append(frame_quality)
+                if sequence is not None:
+                    sequence.append(cam_n, **frame_quality)
+
+        if as_array:
+            # one batched inverse for the Blender matrices of all frames
+            return CameraArray.from_camera(
+                cam, np.array(RTs).reshape(-1, 4, 4), names)
         return cams
 
     def calibrate_intrinsics(self, stream: Stream) -> Camera:
@@ -244,7 +298,7 @@ class Calibration:
 
             # get targets aruco corners
             response, charuco_corners, charuco_ids, corners = \
-                get_aruco_corners(img, self._aruco_target, self._criteria)
+                self.detect_corners(img)
 
             if self.visualize:
                 # outline the aruco markers found in our query image
@@ -4,11 +4,47 @@
 :Sponsor: SpexAI GmbH
 """
 
+import io
 import numpy as np
+from pathlib import Path
 try:
     from Serializer import Serializer
 except (ModuleNotFoundError, ImportError):
     from .Serializer import Serializer
+try:
+    from Projection import project_points, unproject_pixels
+except (ModuleNotFoundError, ImportError):
+    from .Projection import project_points, unproject_pixels
+
+
+# version of the binary Camera record
+RECORD_VERSION = 1
+
+# little endian fixed layout of a Camera as stored in .npy files.
+# Attributes not set are NaN, image sizes -1 and names empty.
+CAMERA_DTYPE = np.dtype([
+    ("version", "<u2"),
+    ("name", "S64"),
+    ("f_mm", "<f8"),
+    ("sensor_size", "<f8", (2,)),
+    ("image_size", "<i8", (2,)),
+    ("intrinsics", "<f8", (3, 3)),
+    ("distortion", "<f8", (1, 5)),
+    ("RT", "<f8", (4, 4)),
+    ("RTb", "<f8", (4, 4))])
+
+_NUMPY_MAGIC = b"\x93NUMPY"
+
+
+def _record_header() -> bytes:
+    # .npy header of a single record, parsing it is the bulk of the
+    # load time, thus files starting with it are read directly
+    buffer = io.BytesIO()
+    np.save(buffer, np.zeros((), dtype=CAMERA_DTYPE))
+    return buffer.getvalue()[:-CAMERA_DTYPE.itemsize]
+
+
+_RECORD_HEADER = _record_header()
 
 
 class Camera(Serializer):
@@ -297,8 +333,52 @@ class Camera(Serializer):
         Rt = np.zeros((4, 4), dtype=np.float32)
         Rt[0:3, 0:3] = rot_3x3
         Rt[0:3, 3] = translation.ravel()
+        Rt[3, 3] = 1
         self.RT = Rt
 
+    def project_points(
+            self,
+            points: np.ndarray,
+            blender_conform: bool = False) -> tuple:
+        """Projects world points into the camera using RT, the
+        intrinsics and the distortion, see Projection.project_points
+
+        :param points: world points of shape (M, 3)
+        :type points: np.ndarray
+        :param blender_conform: the points are in Blender conform world
+            coordinates, defaults to False
+        :type blender_conform: bool, optional
+        :return: pixels (u, v) of shape (M, 2), depths of shape (M,) and
+            the visibility mask of shape (M,)
+        :rtype: tuple
+        """
+        pixels, depth, visible = project_points(
+            points, self.RT, self.intrinsics, self.distortion,
+            image_size=self.image_size, blender_conform=blender_conform)
+        return pixels[0], depth[0], visible[0]
+
+    def unproject_pixels(
+            self,
+            pixels: np.ndarray,
+            depth: np.ndarray,
+            blender_conform: bool = False) -> np.ndarray:
+        """Lifts pixels with depths along the optical axis to world
+        points, see Projection.unproject_pixels
+
+        :param pixels: pixels (u, v) of shape (M, 2)
+        :type pixels: np.ndarray
+        :param depth: depths of shape (M,)
+        :type depth: np.ndarray
+        :param blender_conform: return Blender conform world
+            coordinates, defaults to False
+        :type blender_conform: bool, optional
+        :return: world points of shape (M, 3)
+        :rtype: np.ndarray
+        """
+        return unproject_pixels(
+            pixels, depth, self.RT, self.intrinsics, self.distortion,
+            blender_conform=blender_conform)[0]
+
     def compute_f_mm(self):
         """ Compute focal length in mm if image
             size and sensor size are available
@@ -306,3 +386,104 @@ class Camera(Serializer):
         if self.image_size is None or self.sensor_size_mm is None:
             return
         self.f_mm = self.f_px / self.image_size[1] * self.sensor_size_mm[1]
+
+    def to_record(self) -> np.ndarray:
+        """Camera as fixed layout binary record, see CAMERA_DTYPE
+
+        :raises ValueError: if the utf-8 encoded name exceeds 64 bytes
+        :return: record array of shape ()
+        :rtype: np.ndarray
+        """
+        record = np.zeros((), dtype=CAMERA_DTYPE)
+        record["version"] = RECORD_VERSION
+        if self._name is not None:
+            name = self._name.encode("utf-8")
+            if len(name) > CAMERA_DTYPE["name"].itemsize:
+                raise ValueError(f"Camera name {self._name} is too long")
+            record["name"] = name
+        record["image_size"] = -1
+        if self._image_size is not None:
+            record["image_size"] = self._image_size
+        for key in ["f_mm", "sensor_size", "intrinsics", "distortion",
+                    "RT", "RTb"]:
+            value = getattr(self, "_" + key)
+            record[key] = np.nan if value is None else value
+        return record
+
+    def from_record(self, record: np.ndarray):
+        """Load attributes from a binary record, see to_record
+
+        :param record: record of CAMERA_DTYPE
+        :type record: np.ndarray
+        :raises IOError: if the record version is not supported
+        """
+        if record.dtype != CAMERA_DTYPE or \
+                int(record["version"]) != RECORD_VERSION:
+            raise IOError("Unsupported camera record")
+        _, name, f_mm, sensor_size, image_size, *matrices = record.item()
+        name = name.decode("utf-8")
+        # attributes not set are entirely NaN, or -1 for image sizes
+        self._name = name if len(name) > 0 else None
+        self._f_mm = None if f_mm != f_mm else f_mm
+        self._sensor_size = None if sensor_size[0] != sensor_size[0] \
+            else tuple(sensor_size.tolist())
+        self._image_size = None if image_size[0] < 0 \
+            else tuple(image_size.tolist())
+        # copies, the record may be a read only view of a file buffer
+        for key, value in zip(
+                ["intrinsics", "distortion", "RT", "RTb"], matrices):
+            setattr(self, "_" + key,
+                    None if value.flat[0] != value.flat[0]
+                    else np.array(value))
+
+    def _write_npy(self, filename: Path, data: dict):
+        """Write the camera as binary record to a NumPy .npy file,
+        which can be loaded without pickle
+
+        :param filename: Filename
+        :type filename: Path
+        :param data: input data dict, unused, the record holds all
+            Camera attributes
+        :type data: dict
+        """
+        with filename.open(mode="wb") as f:
+            np.save(f, self.to_record())
+
+    def load(self, filename: str, allow_pickle: bool = False):
+        """Load the camera from file, see Serializer.load. Pickled .npy
+        files of former versions are only loaded with allow_pickle,
+        load and serialize them once to migrate them to records.
+
+        :param filename: filename
+        :type filename: str
+        :param allow_pickle: allow loading pickled .npy files, which can
+            execute arbitrary code, defaults to False
+        :type allow_pickle: bool, optional
+        :raises IOError: if the file is pickled and allow_pickle is False
+        """
+        super().load(filename, allow_pickle)
+
+    def _load_npy(self, filename: Path, allow_pickle: bool = False):
+        """Load a binary record .npy file or, with allow_pickle, a
+        pickled .npy file written by former versions
+
+        :param filename: dump file filename
+        :type filename: Path
+        :param allow_pickle: allow unpickling files without the NumPy
+            magic, defaults to False
+        :type allow_pickle: bool, optional
+        :raises IOError: if the file is pickled and allow_pickle is False
+        """
+        with filename.open(mode="rb") as f:
+            data = f.read()
+        if not data.startswith(_NUMPY_MAGIC):
+            super()._load_npy(filename, allow_pickle)
+            return
+        if data.startswith(_RECORD_HEADER) and \
+                len(data) == len(_RECORD_HEADER) + CAMERA_DTYPE.itemsize:
+            record = np.frombuffer(
+                data, dtype=CAMERA_DTYPE, offset=len(_RECORD_HEADER))
+            record = record.reshape(())
+        else:
+            record = np.load(io.BytesIO(data), allow_pickle=False)
+        self.from_record(record)
@@ -0,0 +1,338 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import io
+import numpy as np
+from pathlib import Path
+from calibpy.Serializer import Serializer
+from calibpy.Camera import Camera, CAMERA_DTYPE, RECORD_VERSION
+from calibpy.Projection import project_points, unproject_pixels
+
+
+# from opencv to blender convention
+_T1 = np.diag([1.0, -1.0, -1.0, 1.0])
+
+
+def blender_extrinsics(RT: np.ndarray) -> np.ndarray:
+    """Blender matrix_world of a stack of OpenCV extrinsics, the
+    batched equivalent of Camera.RTb
+
+    :param RT: extrinsics of shape (F, 4, 4)
+    :type RT: np.ndarray
+    :return: Blender matrices of shape (F, 4, 4)
+    :rtype: np.ndarray
+    """
+    return np.linalg.inv(np.asarray(RT, dtype=np.float64) @ _T1) @ _T1
+
+
+class CameraArray(Serializer):
+    """
+    Structure of arrays of many cameras, e.g. the extrinsics of a
+    sequence. Intrinsics (N, 3, 3), distortion (N, 5), RT and RTb
+    (N, 4, 4), image and sensor sizes (N, 2), f_mm (N,) and names are
+    contiguous arrays, RTb is derived from RT with one batched
+    inverse. Indexing with an integer returns a Camera, slices, masks
+    and index arrays return a CameraArray. Attributes not set are NaN,
+    image sizes -1.
+
+    It inherits from class Serializer, the .npy format is an array of
+    Camera records, see CAMERA_DTYPE.
+
+    :inherit Serializer: Serializer base class enables serialization
+    """
+
+    def __init__(self, num_cameras: int = 0):
+        """
+        :param num_cameras: number of cameras, defaults to 0
+        :type num_cameras: int, optional
+        """
+        super().__init__()
+        n = num_cameras
+        self._names = [""] * n
+        self._f_mm = np.full(n, np.nan)
+        self._sensor_size = np.full((n, 2), np.nan)
+        self._image_size = np.full((n, 2), -1, dtype=np.int64)
+        self._intrinsics = np.full((n, 3, 3), np.nan)
+        self._distortion = np.full((n, 5), np.nan)
+        self._RT = np.full((n, 4, 4), np.nan)
+        self._RTb = np.full((n, 4, 4), np.nan)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        """Camera at an integer index or CameraArray of a slice, mask
+        or index array
+
+        :param index: index
+        :type index: int, slice or np.ndarray
+        :return: Camera or CameraArray
+        :rtype: Camera
+        """
+        if isinstance(index, (int, np.integer)):
+            return self._camera(int(index))
+        out = CameraArray()
+        out._names = np.array(self._names, dtype=object)[index].tolist()
+        for key in ["f_mm", "sensor_size", "image_size", "intrinsics",
+                    "distortion", "RT", "RTb"]:
+            setattr(out, "_" + key, getattr(self, "_" + key)[index])
+        return out
+
+    def _camera(self, i: int) -> Camera:
+        cam = Camera()
+        cam._name = self._names[i] if len(self._names[i]) > 0 else None
+        if not np.isnan(self._f_mm[i]):
+            cam._f_mm = float(self._f_mm[i])
+        if not np.any(np.isnan(self._sensor_size[i])):
+            cam._sensor_size = tuple(self._sensor_size[i].tolist())
+        if np.all(self._image_size[i] >= 0):
+            cam._image_size = tuple(self._image_size[i].tolist())
+        if not np.any(np.isnan(self._intrinsics[i])):
+            cam._intrinsics = self._intrinsics[i].copy()
+        if not np.any(np.isnan(self._distortion[i])):
+            cam._distortion = self._distortion[i].reshape(1, 5).copy()
+        # RTb is known, no need to invert RT again
+        if not np.any(np.isnan(self._RT[i])):
+            cam._RT = self._RT[i].copy()
+            cam._RTb = self._RTb[i].copy()
+        return cam
+
+    @staticmethod
+    def from_cameras(cameras: list) -> "CameraArray":
+        """Stack Camera objects
+
+        :param cameras: Camera instances
+        :type cameras: list
+        :return: CameraArray instance
+        :rtype: CameraArray
+        """
+        return CameraArray.from_records(
+            np.stack([cam.to_record() for cam in cameras])
+            if len(cameras) > 0 else np.zeros(0, dtype=CAMERA_DTYPE))
+
+    @staticmethod
+    def from_camera(
+            camera: Camera,
+            RT: np.ndarray,
+            names: list = None) -> "CameraArray":
+        """Cameras sharing the intrinsics of a camera with a stack of
+        extrinsics
+
+        :param camera: Camera instance with intrinsics
+        :type camera: Camera
+        :param RT: OpenCV extrinsics of shape (N, 4, 4)
+        :type RT: np.ndarray
+        :param names: camera names, defaults to None
+        :type names: list, optional
+        :return: CameraArray instance
+        :rtype: CameraArray
+        """
+        RT = np.asarray(RT, dtype=np.float64).reshape(-1, 4, 4)
+        record = camera.to_record()
+        out = CameraArray.from_records(np.repeat(record[None], len(RT)))
+        out.RT = RT
+        if names is not None:
+            out.names = names
+        return out
+
+    @staticmethod
+    def from_records(records: np.ndarray) -> "CameraArray":
+        """Cameras of an array of Camera records, see CAMERA_DTYPE
+
+        :param records: records of shape (N,)
+        :type records: np.ndarray
+        :raises IOError: if the record version is not supported
+        :return: CameraArray instance
+        :rtype: CameraArray
+        """
+        if records.dtype != CAMERA_DTYPE or \
+                np.any(records["version"] != RECORD_VERSION):
+            raise IOError("Unsupported camera records")
+        out = CameraArray()
+        out._names = [x.decode("utf-8") for x in records["name"]]
+        for key in ["f_mm", "sensor_size", "image_size", "intrinsics",
+                    "RT", "RTb"]:
+            setattr(out, "_" + key, np.array(records[key]))
+        out._distortion = np.array(records["distortion"]).reshape(-1, 5)
+        return out
+
+    def to_records(self) -> np.ndarray:
+        """Cameras as array of Camera records, see CAMERA_DTYPE
+
+        :raises ValueError: if a utf-8 encoded name exceeds 64 bytes
+        :return: records of shape (N,)
+        :rtype: np.ndarray
+        """
+        records = np.zeros(len(self), dtype=CAMERA_DTYPE)
+        records["version"] = RECORD_VERSION
+        names = [x.encode("utf-8") for x in self._names]
+        if any(len(x) > CAMERA_DTYPE["name"].itemsize for x in names):
+            raise ValueError("Camera names are too long")
+        records["name"] = names
+        for key in ["f_mm", "sensor_size", "image_size", "intrinsics",
+                    "RT", "RTb"]:
+            records[key] = getattr(self, "_" + key)
+        records["distortion"] = self._distortion.reshape(-1, 1, 5)
+        return records
+
+    @property
+    def names(self):
+        return self._names
+
+    @names.setter
+    def names(self, value: list):
+        assert len(value) == len(self)
+        self._names = [str(x) for x in value]
+
+    @property
+    def f_mm(self):
+        return self._f_mm
+
+    @property
+    def sensor_size_mm(self):
+        return self._sensor_size
+
+    @property
+    def image_size(self):
+        return self._image_size
+
+    @property
+    def intrinsics(self):
+        return self._intrinsics
+
+    @intrinsics.setter
+    def intrinsics(self, value: np.ndarray):
+        assert value.shape == (len(self), 3, 3)
+        self._intrinsics = np.asarray(value, dtype=np.float64)
+
+    @property
+    def fx(self):
+        return self._intrinsics[:, 0, 0]
+
+    @property
+    def fy(self):
+        return self._intrinsics[:, 1, 1]
+
+    @property
+    def cx(self):
+        return self._intrinsics[:, 0, 2]
+
+    @property
+    def cy(self):
+        return self._intrinsics[:, 1, 2]
+
+    @property
+    def distortion(self):
+        return self._distortion
+
+    @distortion.setter
+    def distortion(self, value: np.ndarray):
+        value = np.asarray(value, dtype=np.float64).reshape(-1, 5)
+        assert len(value) == len(self)
+        self._distortion = value
+
+    @property
+    def RT(self):
+        return self._RT
+
+    @RT.setter
+    def RT(self, value: np.ndarray):
+        assert value.shape == (len(self), 4, 4)
+        self._RT = np.asarray(value, dtype=np.float64)
+        self._RTb = blender_extrinsics(self._RT)
+
+    @property
+    def RTb(self):
+        return self._RTb
+
+    def project_points(
+            self,
+            points: np.ndarray,
+            blender_conform: bool = False) -> tuple:
+        """Projects world points into all cameras at once, see
+        Projection.project_points
+
+        :param points: world points of shape (M, 3) or (N, M, 3)
+        :type points: np.ndarray
+        :param blender_conform: the points are in Blender conform world
+            coordinates, defaults to False
+        :type blender_conform: bool, optional
+        :return: pixels (u, v) of shape (N, M, 2), depths of shape
+            (N, M) and the visibility masks of shape (N, M)
+        :rtype: tuple
+        """
+        return project_points(
+            points, self._RT, self._intrinsics, self._distortion,
+            image_size=self._image_size, blender_conform=blender_conform)
+
+    def unproject_pixels(
+            self,
+            pixels: np.ndarray,
+            depth: np.ndarray,
+            blender_conform: bool = False) -> np.ndarray:
+        """Lifts pixels with depths along the optical axes to world
+        points in all cameras at once, see Projection.unproject_pixels
+
+        :param pixels: pixels (u, v) of shape (M, 2) or (N, M, 2)
+        :type pixels: np.ndarray
+        :param depth: depths of shape (M,) or (N, M)
+        :type depth: np.ndarray
+        :param blender_conform: return Blender conform world
+            coordinates, defaults to False
+        :type blender_conform: bool, optional
+        :return: world points of shape (N, M, 3)
+        :rtype: np.ndarray
+        """
+        return unproject_pixels(
+            pixels, depth, self._RT, self._intrinsics, self._distortion,
+            blender_conform=blender_conform)
+
+    def _write_npy(self, filename: Path, data: dict):
+        """Write the cameras as array of Camera records to a NumPy .npy
+        file, which can be loaded without pickle
+
+        :param filename: Filename
+        :type filename: Path
+        :param data: input data dict, unused
+        :type data: dict
+        """
+        with filename.open(mode="wb") as f:
+            np.save(f, self.to_records())
+
+    def load(self, filename: str, allow_pickle: bool = False):
+        """Load the cameras from file, see Serializer.load
+
+        :param filename: filename
+        :type filename: str
+        :param allow_pickle: allow loading pickled .npy files, which can
+            execute arbitrary code, defaults to False
+        :type allow_pickle: bool, optional
+        :raises IOError: if the file is pickled and allow_pickle is False
+        """
+        super().load(filename, allow_pickle)
+
+    def _load_npy(self, filename: Path, allow_pickle: bool = False):
+        """Load an array of Camera records or, with allow_pickle, a
+        pickled .npy file
+
+        :param filename: dump file filename
+        :type filename: Path
+        :param allow_pickle: allow unpickling files without the NumPy
+            magic, defaults to False
+        :type allow_pickle: bool, optional
+        :raises IOError: if the file is pickled and allow_pickle is False
+        """
+        with filename.open(mode="rb") as f:
+            data = f.read()
+        if not data.startswith(b"\x93NUMPY"):
+            super()._load_npy(filename, allow_pickle)
+            return
+        records = np.load(io.BytesIO(data), allow_pickle=False)
+        self.from_dict(CameraArray.from_records(records).serialize())
@@ -0,0 +1,303 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import os
+import json
+import struct
+import numpy as np
+from pathlib import Path
+from calibpy.Camera import Camera, CAMERA_DTYPE
+from calibpy.CameraArray import CameraArray
+
+
+# record of a single frame, frames without quality measures have
+# num_corners -1 and a NaN reprojection_error
+FRAME_DTYPE = np.dtype([
+    ("name", "S64"),
+    ("RT", "<f8", (4, 4)),
+    ("RTb", "<f8", (4, 4)),
+    ("num_corners", "<i4"),
+    ("reprojection_error", "<f8")])
+
+_MAGIC = b"CALIBSEQ"
+_VERSION = 1
+# magic, version, data offset, length of the JSON dtype description
+_PREFIX = struct.Struct("<8sIII")
+_ALIGNMENT = 64
+# Camera record fields of the intrinsics shared by all frames
+_INTRINSICS_FIELDS = [
+    "f_mm", "sensor_size", "image_size", "intrinsics", "distortion"]
+
+
+def _dtype_to_json(dtype: np.dtype) -> list:
+    return [[name, dtype.fields[name][0].base.str,
+             list(dtype.fields[name][0].shape)] for name in dtype.names]
+
+
+def _dtype_from_json(descr: list) -> np.dtype:
+    return np.dtype([(name, fmt, tuple(shape))
+                     for name, fmt, shape in descr])
+
+
+class CameraSequence:
+    """Single file store of the extrinsics of a frame sequence. The
+    file starts with a header holding the intrinsics camera shared by
+    all frames, followed by fixed size frame records (FRAME_DTYPE) with
+    the frame name, RT, RTb and quality measures. Frames are appended
+    as they are calibrated. A trailing partial record, e.g. of an
+    interrupted write, is truncated when the file is opened for
+    appending. The frames are memory-mapped, so RT and RTb
+    are (N, 4, 4) array views and single frames or slices are read
+    without loading the whole file. The record layout is described in
+    the header, so files can be read with plain NumPy.
+
+    Usage::
+
+        with CameraSequence("extrinsics.camseq", intrinsics, "w") as seq:
+            for cam in cams:
+                seq.append(cam)
+        seq = CameraSequence("extrinsics.camseq")
+        RTb = seq.RTb[100:200]
+    """
+
+    SUFFIX = ".camseq"
+
+    def __init__(
+            self,
+            filename: str,
+            camera: Camera = None,
+            mode: str = "r"):
+        """
+        :param filename: sequence filename
+        :type filename: str
+        :param camera: intrinsics camera shared by all frames, needed
+            to create a file, has to match the stored intrinsics when
+            appending to an existing file, defaults to None
+        :type camera: Camera, optional
+        :param mode: "r" read only, "w" create or truncate, "a" append
+            to an existing file or create it, defaults to "r"
+        :type mode: str, optional
+        :raises IOError: if the file is no supported sequence
+        """
+        assert mode in ["r", "w", "a"]
+        self._filename = Path(filename)
+        self._mode = mode
+        self._file = None
+        self._frames = None
+        if mode == "w" or (mode == "a" and not self._filename.exists()):
+            assert camera is not None, "Missing intrinsics camera"
+            self._create(camera)
+        self._read_header()
+        if mode == "a":
+            if camera is not None:
+                assert self._same_intrinsics(camera), \
+                    f"Intrinsics differ from the ones of {self._filename}"
+            self._truncate()
+        if mode != "r":
+            self._file = self._filename.open(mode="ab")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        self.flush()
+        size = self._filename.stat().st_size
+        return max(size - self._offset, 0) // FRAME_DTYPE.itemsize
+
+    def _create(self, camera: Camera):
+        intrinsics = Camera.from_cam(camera)
+        intrinsics._RT = None
+        intrinsics._RTb = None
+        descr = json.dumps({
+            "camera_dtype": _dtype_to_json(CAMERA_DTYPE),
+            "frame_dtype": _dtype_to_json(FRAME_DTYPE)}).encode("utf-8")
+        header_size = _PREFIX.size + len(descr) + CAMERA_DTYPE.itemsize
+        offset = -(-header_size // _ALIGNMENT) * _ALIGNMENT
+        with self._filename.open(mode="wb") as f:
+            f.write(_PREFIX.pack(_MAGIC, _VERSION, offset, len(descr)))
+            f.write(descr)
+            f.write(intrinsics.to_record().tobytes())
+            f.write(b"\0" * (offset - header_size))
+
+    def _read_header(self):
+        with self._filename.open(mode="rb") as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                raise IOError(f"{self._filename} is no camera sequence")
+            magic, version, offset, descr_size = _PREFIX.unpack(prefix)
+            if magic != _MAGIC:
+                raise IOError(f"{self._filename} is no camera sequence")
+            if version != _VERSION:
+                raise IOError(
+                    f"Unsupported camera sequence version {version}")
+            descr = json.loads(f.read(descr_size).decode("utf-8"))
+            if _dtype_from_json(descr["frame_dtype"]) != FRAME_DTYPE or \
+                    _dtype_from_json(descr["camera_dtype"]) != CAMERA_DTYPE:
+                raise IOError("Unsupported camera sequence layout")
+            record = np.frombuffer(
+                f.read(CAMERA_DTYPE.itemsize), dtype=CAMERA_DTYPE)
+        self._offset = offset
+        self._camera = Camera()
+        self._camera.from_record(record.reshape(()))
+
+    def _same_intrinsics(self, camera: Camera) -> bool:
+        a = camera.to_record()
+        b = self._camera.to_record()
+        return all(np.array_equal(a[key], b[key], equal_nan=True)
+                   for key in _INTRINSICS_FIELDS)
+
+    def _truncate(self):
+        size = self._filename.stat().st_size
+        frames = max(size - self._offset, 0) // FRAME_DTYPE.itemsize
+        end = self._offset + frames * FRAME_DTYPE.itemsize
+        if size > end:
+            print(f"Truncated a partial frame record of {self._filename}")
+            os.truncate(self._filename, end)
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def camera(self):
+        return self._camera
+
+    @property
+    def frames(self) -> np.ndarray:
+        """Memory-mapped frame records, the mapping is renewed if frames
+        were appended since the last access
+
+        :return: read only records of FRAME_DTYPE
+        :rtype: np.ndarray
+        """
+        n = len(self)
+        if self._frames is None or len(self._frames) != n:
+            if n == 0:
+                self._frames = np.zeros(0, dtype=FRAME_DTYPE)
+            else:
+                self._frames = np.memmap(
+                    self._filename, dtype=FRAME_DTYPE, mode="r",
+                    offset=self._offset, shape=(n,))
+        return self._frames
+
+    @property
+    def RT(self):
+        return self.frames["RT"]
+
+    @property
+    def RTb(self):
+        return self.frames["RTb"]
+
+    @property
+    def names(self):
+        return [x.decode("utf-8") for x in self.frames["name"]]
+
+    @property
+    def num_corners(self):
+        return self.frames["num_corners"]
+
+    @property
+    def reprojection_error(self):
+        return self.frames["reprojection_error"]
+
+    def _to_camera(self, frame: np.ndarray) -> Camera:
+        cam = Camera.from_cam(self._camera)
+        name = bytes(frame["name"]).decode("utf-8")
+        cam._name = name if len(name) > 0 else None
+        # RTb is stored, no need to invert RT again
+        cam._RT = np.array(frame["RT"])
+        cam._RTb = np.array(frame["RTb"])
+        return cam
+
+    def __getitem__(self, index):
+        """Camera of a frame or list of Cameras of a slice
+
+        :param index: frame index or slice
+        :type index: int or slice
+        :return: Camera or list of Cameras
+        :rtype: Camera
+        """
+        frames = self.frames
+        if isinstance(index, slice):
+            return [self._to_camera(x) for x in frames[index]]
+        return self._to_camera(frames[index])
+
+    def to_array(self) -> CameraArray:
+        """All frames as CameraArray sharing the intrinsics camera
+
+        :return: CameraArray instance
+        :rtype: CameraArray
+        """
+        frames = self.frames
+        record = self._camera.to_record()
+        cams = CameraArray.from_records(np.repeat(record[None], len(frames)))
+        # RTb is stored, no need to invert RT again
+        cams._RT = np.array(frames["RT"])
+        cams._RTb = np.array(frames["RTb"])
+        cams.names = self.names
+        return cams
+
+    def append(
+            self,
+            camera: Camera,
+            num_corners: int = -1,
+            reprojection_error: float = np.nan):
+        """Append the extrinsics of a frame
+
+        :param camera: Camera with extrinsics
+        :type camera: Camera
+        :param num_corners: number of detected corners, defaults to -1
+        :type num_corners: int, optional
+        :param reprojection_error: RMS reprojection error in px,
+            defaults to NaN
+        :type reprojection_error: float, optional
+        :raises ValueError: if the utf-8 encoded name exceeds 64 bytes
+        """
+        assert self._file is not None, "Sequence is read only"
+        assert camera.RT is not None
+        record = np.zeros((), dtype=FRAME_DTYPE)
+        if camera.name is not None:
+            name = camera.name.encode("utf-8")
+            if len(name) > FRAME_DTYPE["name"].itemsize:
+                raise ValueError(f"Camera name {camera.name} is too long")
+            record["name"] = name
+        record["RT"] = camera.RT
+        record["RTb"] = camera.RTb
+        record["num_corners"] = num_corners
+        record["reprojection_error"] = reprojection_error
+        self._file.write(record.tobytes())
+
+    def extend(self, cameras: list, quality: list = None):
+        """Append the extrinsics of several frames
+
+        :param cameras: Cameras with extrinsics
+        :type cameras: list
+        :param quality: dicts with num_corners and reprojection_error of
+            each frame, see Calibration.calibrate_extrinsics,
+            defaults to None
+        :type quality: list, optional
+        """
+        if quality is None:
+            quality = [{}] * len(cameras)
+        assert len(quality) == len(cameras)
+        for cam, q in zip(cameras, quality):
+            self.append(cam, **q)
+
+    def flush(self):
+        """Flush appended frames to disk
+        """
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        """Close the file, memory-mapped arrays stay valid
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,243 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+
+
+STREAM_FILETYPES = ["png", "jpg", "jpeg", "tif", "tiff", "exr"]
+
+# supported naming conventions: 000x, prefix_000x, 000x_suffix
+# and prefix_000x_suffix. The leading prefix group is optional, so
+# 000x_suffix is matched after backtracking.
+_NAME_PATTERN = re.compile(
+    r"^(?:(?P<prefix>[^_]+)_)?(?P<frame>\d+)(?:_(?P<suffix>[^_]+))?$")
+
+
+def parse_frame_name(name: str) -> tuple:
+    """Parse a frame filename or name stem into prefix, frame number
+    and suffix. Everything after the first dot is ignored. If the name
+    does not follow one of the naming conventions 000x, prefix_000x,
+    000x_suffix or prefix_000x_suffix, the frame number is None.
+
+    :param name: filename or stem
+    :type name: str
+    :return: prefix, frame number, suffix
+    :rtype: tuple
+    """
+    stem = Path(name).name.split(".")[0]
+    match = _NAME_PATTERN.match(stem)
+    if match is None:
+        split = stem.split("_")
+        if len(split) > 1:
+            return split[0], None, split[-1]
+        return None, None, None
+    return match.group("prefix"), int(match.group("frame")), \
+        match.group("suffix")
+
+
+class FrameIndex:
+    """Index of all stream files of a directory. The directory is
+    scanned once using os.scandir, each filename is parsed once and
+    the result is persisted as sidecar index file inside the directory,
+    or in sidecar_directory for read-only or shared data directories.
+    The sidecar is reused as long as the modification time of the
+    directory does not change, so repeated stream initializations on
+    large (network) directories don't need to touch each file again.
+    The sidecar is not written if its directory is not writable.
+    """
+
+    INDEX_FILENAME = ".calibpy_index.json"
+    INDEX_VERSION = 1
+    # default sidecar location of all indices, None for the frame
+    # directory itself
+    SIDECAR_DIRECTORY = None
+
+    def __init__(
+            self,
+            directory: str,
+            use_sidecar: bool = True,
+            sidecar_directory: str = None):
+        """
+        :param directory: frame directory
+        :type directory: str
+        :param use_sidecar: read/write the sidecar index, defaults to True
+        :type use_sidecar: bool, optional
+        :param sidecar_directory: directory of the sidecar index,
+            defaults to None (FrameIndex.SIDECAR_DIRECTORY)
+        :type sidecar_directory: str, optional
+        """
+        if isinstance(directory, Path):
+            directory = str(directory)
+        assert isinstance(directory, str)
+        assert Path(directory).is_dir(), f"{directory} is not a directory"
+        self._directory = directory
+        self._use_sidecar = use_sidecar
+        if sidecar_directory is None:
+            sidecar_directory = FrameIndex.SIDECAR_DIRECTORY
+        self._sidecar_directory = None if sidecar_directory is None \
+            else str(sidecar_directory)
+        # (name, frame, prefix, suffix, size, mtime)
+        self._entries = []
+        self._lookups = {}          # (prefix, suffix) -> {frame: filename}
+        self._from_sidecar = False  # True if loaded from a valid sidecar
+
+        if not (use_sidecar and self._load_sidecar()):
+            self.scan()
+            if use_sidecar:
+                self._write_sidecar()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def entries(self):
+        return self._entries
+
+    @property
+    def from_sidecar(self):
+        return self._from_sidecar
+
+    @property
+    def sidecar_filename(self):
+        if self._sidecar_directory is None:
+            return os.path.join(self._directory, FrameIndex.INDEX_FILENAME)
+        # indices of several directories share the sidecar directory
+        key = hashlib.sha1(
+            os.path.abspath(self._directory).encode("utf-8")).hexdigest()
+        stem, ext = os.path.splitext(FrameIndex.INDEX_FILENAME)
+        return os.path.join(
+            self._sidecar_directory, f"{stem}_{key[:16]}{ext}")
+
+    def scan(self):
+        """Scan the directory and parse all stream filenames
+        """
+        entries = []
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                name = entry.name
+                if name.split(".")[-1].lower() not in STREAM_FILETYPES:
+                    continue
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                prefix, frame, suffix = parse_frame_name(name)
+                entries.append(
+                    (name, frame, prefix, suffix,
+                     stat.st_size, stat.st_mtime_ns))
+        self._entries = entries
+        self._lookups = {}
+        self._from_sidecar = False
+
+    def _load_sidecar(self) -> bool:
+        fname = self.sidecar_filename
+        try:
+            dir_mtime = os.stat(self._directory).st_mtime_ns
+            with open(fname, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != FrameIndex.INDEX_VERSION or \
+                data.get("dir_mtime") != dir_mtime:
+            return False
+        self._entries = [tuple(x) for x in data["entries"]]
+        self._lookups = {}
+        self._from_sidecar = True
+        return True
+
+    def _write_sidecar(self):
+        fname = self.sidecar_filename
+        if not os.access(os.path.dirname(fname), os.W_OK):
+            return
+        try:
+            # Creating the sidecar changes the directory mtime, thus the
+            # file is created first and the directory mtime is read
+            # afterwards. Rewriting an existing file keeps it unchanged.
+            Path(fname).touch(exist_ok=True)
+            data = {
+                "version": FrameIndex.INDEX_VERSION,
+                "dir_mtime": os.stat(self._directory).st_mtime_ns,
+                "entries": self._entries
+            }
+            with open(fname, "w") as f:
+                json.dump(data, f)
+        except OSError as e:
+            print(f"Could not write frame index {fname}: {e}")
+
+    def _select(self, prefix: str = None, suffix: str = None) -> list:
+        if prefix is None and suffix is None:
+            return self._entries
+        if prefix is not None and suffix is not None:
+            return [x for x in self._entries
+                    if x[2] == prefix and x[3] == suffix]
+        if suffix is not None:
+            return [x for x in self._entries if x[3] == suffix]
+        return [x for x in self._entries if x[2] == prefix]
+
+    def filenames(self, prefix: str = None, suffix: str = None) -> list:
+        """Returns the filenames matching prefix and suffix
+        sorted by frame number.
+
+        :param prefix: filename prefix, defaults to None
+        :type prefix: str, optional
+        :param suffix: filename suffix, defaults to None
+        :type suffix: str, optional
+        :raises IOError: if a filename doesn't follow the naming convention
+        :return: sorted filenames
+        :rtype: list
+        """
+        entries = self._select(prefix, suffix)
+        for x in entries:
+            if x[1] is None:
+                raise IOError(
+                    f"Unknown naming convention {x[0]}! Expecting: 000x, "
+                    "prefix_000x, 000x_suffix or prefix_000x_suffix")
+        entries = sorted(entries, key=lambda x: x[1])
+        return [os.path.join(self._directory, x[0]) for x in entries]
+
+    def frames(self, prefix: str = None, suffix: str = None) -> list:
+        """Returns the sorted frame numbers matching prefix and suffix
+
+        :param prefix: filename prefix, defaults to None
+        :type prefix: str, optional
+        :param suffix: filename suffix, defaults to None
+        :type suffix: str, optional
+        :return: sorted frame numbers
+        :rtype: list
+        """
+        return sorted(x[1] for x in self._select(prefix, suffix)
+                      if x[1] is not None)
+
+    def filename_of(
+            self,
+            frame: int,
+            prefix: str = None,
+            suffix: str = None) -> str:
+        """Look up the filename of a frame number. The lookup table
+        of a prefix/suffix combination is built on first access.
+
+        :param frame: frame number
+        :type frame: int
+        :param prefix: filename prefix, defaults to None
+        :type prefix: str, optional
+        :param suffix: filename suffix, defaults to None
+        :type suffix: str, optional
+        :return: filename or None if the frame does not exist
+        :rtype: str
+        """
+        key = (prefix, suffix)
+        if key not in self._lookups:
+            self._lookups[key] = {
+                x[1]: os.path.join(self._directory, x[0])
+                for x in self._select(prefix, suffix) if x[1] is not None}
+        return self._lookups[key].get(frame)
@@ -0,0 +1,354 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import numpy as np
+import open3d as o3d
+from calibpy.Camera import Camera
+from calibpy.Registration import valid_depth_mask, undistort_color
+
+
+class VoxelFusion:
+    """Incremental fusion of registered point clouds into a sparse
+    voxel hash. Each occupied voxel keeps the sum of the positions and
+    colors of all points that fell into it and their count, so the
+    fused cloud holds one averaged point per voxel. Memory is bounded
+    by the number of occupied voxels, i.e. the scene volume, and not by
+    the number of frames added. Normals are optionally averaged the
+    same way, they have to be oriented consistently, e.g. towards the
+    camera.
+
+    The voxel keys are the voxel coordinates packed into a single int64
+    (21 bit per axis), kept sorted to merge new frames by binary search.
+    Voxels a frame newly occupies are merged in a single pass, so adding
+    a frame costs one copy of the hash.
+    """
+
+    _BITS = 21
+    _OFFSET = 1 << (_BITS - 1)
+    _MASK = (1 << _BITS) - 1
+
+    def __init__(self, voxel_size: float):
+        """
+        :param voxel_size: voxel edge length in world units
+        :type voxel_size: float
+        """
+        assert voxel_size > 0
+        self._voxel_size = voxel_size
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._position_sums = np.zeros((0, 3), dtype=np.float64)
+        self._color_sums = np.zeros((0, 3), dtype=np.float64)
+        self._normal_sums = np.zeros((0, 3), dtype=np.float64)
+        self._has_normals = False
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._num_frames = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def voxel_size(self):
+        return self._voxel_size
+
+    @property
+    def num_frames(self):
+        return self._num_frames
+
+    @property
+    def counts(self):
+        return self._counts
+
+    def _voxel_keys(self, points: np.ndarray) -> np.ndarray:
+        voxels = np.floor(points / self._voxel_size).astype(np.int64)
+        voxels += VoxelFusion._OFFSET
+        if np.any(voxels < 0) or np.any(voxels > VoxelFusion._MASK):
+            raise ValueError(
+                "Points exceed the addressable volume of "
+                f"{2**VoxelFusion._BITS} voxels per axis")
+        return (voxels[:, 0] << (2 * VoxelFusion._BITS)) | \
+            (voxels[:, 1] << VoxelFusion._BITS) | voxels[:, 2]
+
+    def add(self, points: np.ndarray, colors: np.ndarray = None,
+            normals: np.ndarray = None):
+        """Merge the points of a registered frame into the voxel hash
+
+        :param points: world points of shape (N, 3)
+        :type points: np.ndarray
+        :param colors: uint8 colors or float colors in [0, 1] of shape
+            (N, 3), defaults to None (gray)
+        :type colors: np.ndarray, optional
+        :param normals: oriented unit normals of shape (N, 3),
+            defaults to None (no normals)
+        :type normals: np.ndarray, optional
+        """
+        if len(points) == 0:
+            self._num_frames += 1
+            return
+        keys, inverse = np.unique(
+            self._voxel_keys(points), return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, minlength=len(keys))
+        position_sums = np.empty((len(keys), 3), dtype=np.float64)
+        color_sums = np.empty((len(keys), 3), dtype=np.float64)
+        normal_sums = np.zeros((len(keys), 3), dtype=np.float64)
+        if colors is None:
+            colors = np.full((len(points), 3), 200, dtype=np.uint8)
+        color_scale = 1 / 255 if colors.dtype == np.uint8 else 1
+        for i in range(3):
+            position_sums[:, i] = np.bincount(
+                inverse, weights=points[:, i], minlength=len(keys))
+            color_sums[:, i] = np.bincount(
+                inverse, weights=colors[:, i], minlength=len(keys))
+            if normals is not None:
+                normal_sums[:, i] = np.bincount(
+                    inverse, weights=normals[:, i], minlength=len(keys))
+        color_sums *= color_scale
+        self._has_normals |= normals is not None
+
+        # accumulate voxels already occupied, insert the others
+        pos = np.searchsorted(self._keys, keys)
+        found = pos < len(self._keys)
+        found[found] = self._keys[pos[found]] == keys[found]
+        self._position_sums[pos[found]] += position_sums[found]
+        self._color_sums[pos[found]] += color_sums[found]
+        self._normal_sums[pos[found]] += normal_sums[found]
+        self._counts[pos[found]] += counts[found]
+        new = ~found
+        if np.any(new):
+            # slots of the new voxels in the merged arrays, all other
+            # slots take the already occupied voxels in order
+            slots = pos[new] + np.arange(np.count_nonzero(new))
+            occupied = np.ones(len(self._keys) + len(slots), dtype=bool)
+            occupied[slots] = False
+            self._keys = self._merge(
+                self._keys, keys[new], slots, occupied)
+            self._position_sums = self._merge(
+                self._position_sums, position_sums[new], slots, occupied)
+            self._color_sums = self._merge(
+                self._color_sums, color_sums[new], slots, occupied)
+            self._normal_sums = self._merge(
+                self._normal_sums, normal_sums[new], slots, occupied)
+            self._counts = self._merge(
+                self._counts, counts[new], slots, occupied)
+        self._num_frames += 1
+
+    @staticmethod
+    def _merge(values: np.ndarray, new_values: np.ndarray,
+               slots: np.ndarray, occupied: np.ndarray) -> np.ndarray:
+        merged = np.empty((len(occupied),) + values.shape[1:],
+                          dtype=values.dtype)
+        merged[occupied] = values
+        merged[slots] = new_values
+        return merged
+
+    def add_pointcloud(self, pcd: o3d.geometry.PointCloud):
+        """Merge an Open3D point cloud into the voxel hash
+
+        :param pcd: registered point cloud
+        :type pcd: o3d.geometry.PointCloud
+        """
+        colors = None
+        if pcd.has_colors():
+            colors = np.asarray(pcd.colors)
+        normals = None
+        if pcd.has_normals():
+            normals = np.asarray(pcd.normals)
+        self.add(np.asarray(pcd.points), colors, normals)
+
+    def points(self) -> np.ndarray:
+        """Averaged point of each occupied voxel
+
+        :return: float32 points of shape (M, 3)
+        :rtype: np.ndarray
+        """
+        return (self._position_sums /
+                self._counts[:, None]).astype(np.float32)
+
+    def colors(self) -> np.ndarray:
+        """Averaged color of each occupied voxel
+
+        :return: uint8 colors of shape (M, 3)
+        :rtype: np.ndarray
+        """
+        colors = self._color_sums / self._counts[:, None] * 255
+        return np.clip(np.round(colors), 0, 255).astype(np.uint8)
+
+    def normals(self) -> np.ndarray:
+        """Averaged unit normal of each occupied voxel, zero if the
+        normals of a voxel cancel out or none were added
+
+        :return: float64 normals of shape (M, 3)
+        :rtype: np.ndarray
+        """
+        norm = np.linalg.norm(self._normal_sums, axis=1, keepdims=True)
+        return np.divide(self._normal_sums, norm,
+                         out=np.zeros_like(self._normal_sums),
+                         where=norm > 0)
+
+    def to_pointcloud(self) -> o3d.geometry.PointCloud:
+        """Export the fused point cloud
+
+        :return: point cloud with one averaged point per voxel, with
+            normals if any frame was added with normals
+        :rtype: o3d.geometry.PointCloud
+        """
+        pcd = o3d.geometry.PointCloud()
+        pcd.points = o3d.utility.Vector3dVector(
+            self._position_sums / self._counts[:, None])
+        pcd.colors = o3d.utility.Vector3dVector(
+            self._color_sums / self._counts[:, None])
+        if self._has_normals:
+            pcd.normals = o3d.utility.Vector3dVector(self.normals())
+        return pcd
+
+
+class TSDFFusion:
+    """Dense surface reconstruction by integrating depth maps with
+    their calibrated cameras into an Open3D ScalableTSDFVolume on the
+    CPU. Frames are integrated one by one, so a stream never has to be
+    kept in memory. Surfaces can be extracted as mesh or point cloud
+    at any time.
+    """
+
+    # from opencv to blender convention
+    _T1 = np.array([[1, 0, 0, 0],
+                    [0, -1, 0, 0],
+                    [0, 0, -1, 0],
+                    [0, 0, 0, 1]], dtype=np.float64)
+
+    def __init__(
+            self,
+            voxel_size: float,
+            sdf_trunc: float = None,
+            depth_near: float = 0.0,
+            depth_far: float = np.inf,
+            blender_conform: bool = True,
+            with_color: bool = True,
+            depth_scale: float = 1.0):
+        """
+        :param voxel_size: voxel edge length in world units
+        :type voxel_size: float
+        :param sdf_trunc: truncation distance of the signed distance
+            function, defaults to None (4 * voxel_size)
+        :type sdf_trunc: float, optional
+        :param depth_near: depths <= depth_near are ignored, defaults to 0.0
+        :type depth_near: float, optional
+        :param depth_far: depths > depth_far are ignored, defaults to inf
+        :type depth_far: float, optional
+        :param blender_conform: integrate in the Blender world conventions
+            as register_depthmap_to_world does, defaults to True
+        :type blender_conform: bool, optional
+        :param with_color: integrate colors, defaults to True
+        :type with_color: bool, optional
+        :param depth_scale: meters per depth unit, e.g. 0.001 for 16 bit
+            millimeter depth maps, defaults to 1.0
+        :type depth_scale: float, optional
+        """
+        assert voxel_size > 0
+        if sdf_trunc is None:
+            sdf_trunc = 4 * voxel_size
+        self._voxel_size = voxel_size
+        self._sdf_trunc = sdf_trunc
+        self._depth_near = depth_near
+        self._depth_far = depth_far
+        self._blender_conform = blender_conform
+        self._with_color = with_color
+        self._depth_scale = depth_scale
+        color_type = o3d.pipelines.integration.TSDFVolumeColorType.NoColor
+        if with_color:
+            color_type = o3d.pipelines.integration.TSDFVolumeColorType.RGB8
+        self._volume = o3d.pipelines.integration.ScalableTSDFVolume(
+            voxel_length=voxel_size,
+            sdf_trunc=sdf_trunc,
+            color_type=color_type)
+        self._num_frames = 0
+
+    @property
+    def voxel_size(self):
+        return self._voxel_size
+
+    @property
+    def sdf_trunc(self):
+        return self._sdf_trunc
+
+    @property
+    def num_frames(self):
+        return self._num_frames
+
+    def _extrinsic(self, camera: Camera) -> np.ndarray:
+        RT = np.asarray(camera.RT, dtype=np.float64)
+        if self._blender_conform:
+            return RT @ TSDFFusion._T1
+        return RT
+
+    def _rgbd(self, camera, depth_map, color_img):
+        valid = valid_depth_mask(
+            depth_map, near=self._depth_near, far=self._depth_far,
+            depth_scale=self._depth_scale)
+        depth = np.where(valid.reshape(depth_map.shape), depth_map, 0)
+        # Open3D supports uint16 and float32 depth images only
+        if depth.dtype != np.uint16:
+            depth = depth.astype(np.float32, copy=False)
+        if color_img is None:
+            color_img = np.full(
+                list(depth_map.shape) + [3], 200, dtype=np.uint8)
+        else:
+            color_img = undistort_color(color_img, camera)
+        if color_img.ndim == 2:
+            color_img = np.stack([color_img] * 3, axis=-1)
+        color_img = np.ascontiguousarray(
+            color_img[:, :, :3], dtype=np.uint8)
+        return o3d.geometry.RGBDImage.create_from_color_and_depth(
+            o3d.geometry.Image(color_img),
+            o3d.geometry.Image(depth),
+            depth_scale=1 / self._depth_scale,
+            depth_trunc=self._depth_far,
+            convert_rgb_to_intensity=False)
+
+    def integrate(
+            self,
+            camera: Camera,
+            depth_map: np.ndarray,
+            color_img: np.ndarray = None):
+        """Integrate a single depth map and its color image
+
+        :param camera: Camera instance with intrinsics and extrinsics
+        :type camera: Camera
+        :param depth_map: depth map
+        :type depth_map: np.ndarray
+        :param color_img: color or grayscale image, defaults to None
+        :type color_img: np.ndarray, optional
+        """
+        h, w = depth_map.shape[:2]
+        intrinsic = o3d.camera.PinholeCameraIntrinsic(
+            width=w,
+            height=h,
+            fx=camera.fx,
+            fy=camera.fy,
+            cx=camera.cx,
+            cy=camera.cy)
+        self._volume.integrate(
+            self._rgbd(camera, depth_map, color_img),
+            intrinsic,
+            self._extrinsic(camera))
+        self._num_frames += 1
+
+    def extract_mesh(self) -> o3d.geometry.TriangleMesh:
+        """Extract the surface as triangle mesh
+
+        :return: mesh with vertex normals
+        :rtype: o3d.geometry.TriangleMesh
+        """
+        mesh = self._volume.extract_triangle_mesh()
+        mesh.compute_vertex_normals()
+        return mesh
+
+    def extract_pointcloud(self) -> o3d.geometry.PointCloud:
+        """Extract the surface as point cloud
+
+        :return: point cloud
+        :rtype: o3d.geometry.PointCloud
+        """
+        return self._volume.extract_point_cloud()
@@ -0,0 +1,367 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+
+
+# record layout of the node files
+POINT_DTYPE = np.dtype([
+    ("x", "<f4"), ("y", "<f4"), ("z", "<f4"),
+    ("red", "u1"), ("green", "u1"), ("blue", "u1")])
+
+_BITS = 21
+
+
+def _cell_keys(cells: np.ndarray) -> np.ndarray:
+    return (cells[:, 0] << (2 * _BITS)) | (cells[:, 1] << _BITS) | \
+        cells[:, 2]
+
+
+def node_name(cell: tuple, level: int) -> str:
+    """Potree like name of the node of an octree level, r for the root
+    followed by the child index (4 * x + 2 * y + z) of each level
+
+    :param cell: integer node coordinates at the level
+    :type cell: tuple
+    :param level: octree level
+    :type level: int
+    :return: node name
+    :rtype: str
+    """
+    name = "r"
+    for bit in range(level - 1, -1, -1):
+        name += str(((cell[0] >> bit) & 1) << 2 |
+                    ((cell[1] >> bit) & 1) << 1 |
+                    ((cell[2] >> bit) & 1))
+    return name
+
+
+def node_cell(name: str) -> tuple:
+    """Inverse of node_name
+
+    :param name: node name
+    :type name: str
+    :return: integer node coordinates, level
+    :rtype: tuple
+    """
+    assert name.startswith("r")
+    cell = [0, 0, 0]
+    for child in name[1:]:
+        child = int(child)
+        cell = [2 * cell[0] + (child >> 2),
+                2 * cell[1] + ((child >> 1) & 1),
+                2 * cell[2] + (child & 1)]
+    return tuple(cell), len(name) - 1
+
+
+class OctreeWriter:
+    """Incremental on-disk level of detail octree, similar to the
+    Potree layout. The cube bbox_min, bbox_min + size is split into
+    nodes down to max_depth. Each level subsamples the points on a grid
+    of grid_size ** 3 cells per node: a point is stored at the
+    shallowest level whose grid cell is still empty, the deepest level
+    keeps all remaining points. Thus loading all nodes up to a level
+    gives an evenly spaced preview of the cloud.
+
+    Points are appended to <directory>/<level>/<name>.bin as float32
+    positions and uint8 colors (POINT_DTYPE) as frames are added, the
+    node index is stored in <directory>/metadata.json on flush and close.
+    The node files and metadata of an octree previously written to the
+    directory are removed on construction, other files are kept.
+    """
+
+    METADATA_FILENAME = "metadata.json"
+    VERSION = 1
+
+    def __init__(
+            self,
+            directory: str,
+            bbox_min: np.ndarray,
+            size: float,
+            max_depth: int = 5,
+            grid_size: int = 64):
+        """
+        :param directory: output directory
+        :type directory: str
+        :param bbox_min: minimum corner of the octree cube
+        :type bbox_min: np.ndarray
+        :param size: edge length of the octree cube
+        :type size: float
+        :param max_depth: deepest level, defaults to 5
+        :type max_depth: int, optional
+        :param grid_size: subsampling cells per node and axis,
+            defaults to 64
+        :type grid_size: int, optional
+        """
+        assert size > 0
+        assert max_depth >= 0
+        assert grid_size >= 1
+        assert grid_size * 2 ** max_depth <= 2 ** _BITS
+        self._directory = Path(directory)
+        self._bbox_min = np.asarray(bbox_min, dtype=np.float64)
+        assert self._bbox_min.shape == (3,)
+        self._size = float(size)
+        self._max_depth = max_depth
+        self._grid_size = grid_size
+        self._nodes = {}            # name -> number of points
+        self._occupied = [np.zeros(0, dtype=np.int64)
+                          for _ in range(max_depth)]
+        self._num_points = 0
+        self._num_dropped = 0
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._clear()
+
+    def _clear(self):
+        # the node files are opened for appending, remove the ones of
+        # a previous octree so its points don't leak into this one
+        metadata = self._directory / OctreeWriter.METADATA_FILENAME
+        if metadata.is_file():
+            metadata.unlink()
+        for level_dir in self._directory.iterdir():
+            if not level_dir.is_dir() or not level_dir.name.isdigit():
+                continue
+            for fname in level_dir.glob("r*.bin"):
+                fname.unlink()
+            if not any(level_dir.iterdir()):
+                level_dir.rmdir()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    @property
+    def num_points(self):
+        return self._num_points
+
+    @property
+    def num_dropped(self):
+        return self._num_dropped
+
+    def _cells(self, points: np.ndarray, resolution: int) -> np.ndarray:
+        cells = np.floor(
+            (points - self._bbox_min) * (resolution / self._size))
+        return np.clip(cells, 0, resolution - 1).astype(np.int64)
+
+    def _append(self, level: int, points: np.ndarray, colors: np.ndarray):
+        cells = self._cells(points, 2 ** level)
+        keys, inverse = np.unique(_cell_keys(cells), return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        level_dir = self._directory / str(level)
+        level_dir.mkdir(exist_ok=True)
+        for n in range(len(keys)):
+            indices = order[bounds[n]:bounds[n + 1]]
+            name = node_name(cells[indices[0]], level)
+            records = np.empty(len(indices), dtype=POINT_DTYPE)
+            for i, axis in enumerate(["x", "y", "z"]):
+                records[axis] = points[indices, i]
+            for i, channel in enumerate(["red", "green", "blue"]):
+                records[channel] = colors[indices, i]
+            with open(level_dir / f"{name}.bin", "ab") as f:
+                records.tofile(f)
+            self._nodes[name] = self._nodes.get(name, 0) + len(indices)
+
+    def add(self, points: np.ndarray, colors: np.ndarray = None):
+        """Distribute the points of a frame to the octree nodes and
+        append them to the node files. Points outside of the octree
+        cube are dropped.
+
+        :param points: points of shape (N, 3)
+        :type points: np.ndarray
+        :param colors: uint8 colors or float colors in [0, 1] of shape
+            (N, 3), defaults to None (gray)
+        :type colors: np.ndarray, optional
+        """
+        points = np.asarray(points)
+        if colors is None:
+            colors = np.full((len(points), 3), 200, dtype=np.uint8)
+        colors = np.asarray(colors)
+        if colors.dtype != np.uint8:
+            colors = np.clip(np.rint(colors * 255), 0, 255).astype(np.uint8)
+        inside = np.all(
+            (points >= self._bbox_min) &
+            (points < self._bbox_min + self._size), axis=1)
+        self._num_dropped += len(points) - np.count_nonzero(inside)
+        points = points[inside]
+        colors = colors[inside]
+        self._num_points += len(points)
+
+        for level in range(self._max_depth + 1):
+            if len(points) == 0:
+                break
+            if level == self._max_depth:
+                self._append(level, points, colors)
+                break
+            # keep the first point of each grid cell not yet occupied
+            keys = _cell_keys(self._cells(
+                points, self._grid_size * 2 ** level))
+            keys, first = np.unique(keys, return_index=True)
+            occupied = self._occupied[level]
+            free = ~np.isin(keys, occupied, assume_unique=True)
+            self._occupied[level] = np.union1d(occupied, keys[free])
+            keep = np.zeros(len(points), dtype=bool)
+            keep[first[free]] = True
+            self._append(level, points[keep], colors[keep])
+            points = points[~keep]
+            colors = colors[~keep]
+
+    def add_pointcloud(self, pcd):
+        """Add an Open3D point cloud
+
+        :param pcd: point cloud
+        :type pcd: o3d.geometry.PointCloud
+        """
+        colors = None
+        if pcd.has_colors():
+            colors = np.asarray(pcd.colors)
+        self.add(np.asarray(pcd.points), colors)
+
+    def flush(self):
+        """Write the node index to metadata.json
+        """
+        metadata = {
+            "version": OctreeWriter.VERSION,
+            "bbox_min": self._bbox_min.tolist(),
+            "size": self._size,
+            "max_depth": self._max_depth,
+            "grid_size": self._grid_size,
+            "num_points": self._num_points,
+            "nodes": self._nodes
+        }
+        with open(self._directory / OctreeWriter.METADATA_FILENAME,
+                  "w") as f:
+            json.dump(metadata, f, indent=2)
+
+    def close(self):
+        """Write the node index, the writer can't be used afterwards
+        """
+        self.flush()
+        self._occupied = None
+
+
+class OctreeReader:
+    """Reader of octrees written by OctreeWriter. Only the node files
+    intersecting a query box are accessed, they are memory-mapped.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: octree directory
+        :type directory: str
+        :raises IOError: if the metadata is missing or unsupported
+        """
+        self._directory = Path(directory)
+        fname = self._directory / OctreeWriter.METADATA_FILENAME
+        if not fname.is_file():
+            raise IOError(f"No octree found at {directory}")
+        with open(fname, "r") as f:
+            metadata = json.load(f)
+        if metadata.get("version") != OctreeWriter.VERSION:
+            raise IOError(
+                f"Unsupported octree version {metadata.get('version')}")
+        self._bbox_min = np.array(metadata["bbox_min"], dtype=np.float64)
+        self._size = metadata["size"]
+        self._max_depth = metadata["max_depth"]
+        self._num_points = metadata["num_points"]
+        self._nodes = metadata["nodes"]
+
+    @property
+    def max_depth(self):
+        return self._max_depth
+
+    @property
+    def num_points(self):
+        return self._num_points
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    def node_bounds(self, name: str) -> tuple:
+        """Cube of a node
+
+        :param name: node name
+        :type name: str
+        :return: minimum and maximum corner
+        :rtype: tuple
+        """
+        cell, level = node_cell(name)
+        edge = self._size / 2 ** level
+        lo = self._bbox_min + np.array(cell) * edge
+        return lo, lo + edge
+
+    def read_node(self, name: str) -> np.ndarray:
+        """Memory-mapped records of a node
+
+        :param name: node name
+        :type name: str
+        :return: read only POINT_DTYPE records
+        :rtype: np.ndarray
+        """
+        count = self._nodes.get(name, 0)
+        if count == 0:
+            return np.zeros(0, dtype=POINT_DTYPE)
+        level = len(name) - 1
+        return np.memmap(
+            self._directory / str(level) / f"{name}.bin",
+            dtype=POINT_DTYPE, mode="r", shape=(count,))
+
+    def query(
+            self,
+            bbox_min: np.ndarray = None,
+            bbox_max: np.ndarray = None,
+            lod: int = None) -> tuple:
+        """Points inside a box up to a level of detail
+
+        :param bbox_min: minimum corner, defaults to None (unbounded)
+        :type bbox_min: np.ndarray, optional
+        :param bbox_max: maximum corner, defaults to None (unbounded)
+        :type bbox_max: np.ndarray, optional
+        :param lod: deepest level to load, defaults to None (max_depth)
+        :type lod: int, optional
+        :return: float32 points of shape (N, 3), uint8 colors of
+            shape (N, 3)
+        :rtype: tuple
+        """
+        if lod is None:
+            lod = self._max_depth
+        lo = np.full(3, -np.inf) if bbox_min is None else \
+            np.asarray(bbox_min, dtype=np.float64)
+        hi = np.full(3, np.inf) if bbox_max is None else \
+            np.asarray(bbox_max, dtype=np.float64)
+        points = []
+        colors = []
+        for name in sorted(self._nodes.keys(), key=len):
+            if len(name) - 1 > lod:
+                break
+            node_lo, node_hi = self.node_bounds(name)
+            if np.any(node_hi < lo) or np.any(node_lo > hi):
+                continue
+            records = self.read_node(name)
+            xyz = np.stack(
+                [records["x"], records["y"], records["z"]], axis=1)
+            inside = np.all((xyz >= lo) & (xyz <= hi), axis=1)
+            points.append(xyz[inside])
+            colors.append(np.stack(
+                [records["red"], records["green"], records["blue"]],
+                axis=1)[inside])
+        if len(points) == 0:
+            return np.zeros((0, 3), dtype=np.float32), \
+                np.zeros((0, 3), dtype=np.uint8)
+        return np.concatenate(points), np.concatenate(colors)
@@ -0,0 +1,294 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import numpy as np
+import open3d as o3d
+from pathlib import Path
+
+
+# ply:         Open3D's default PLY writer, float64 positions
+# ply_float32: binary PLY, float32 positions, uint8 colors
+# ply_int16:   binary PLY, int16 positions quantized relative to a per
+#              file origin and scale stored as header comments, uint8
+#              colors
+# npz:         compressed NumPy archive of the columns points (float32)
+#              and colors (uint8)
+POINTCLOUD_FORMATS = ["ply", "ply_float32", "ply_int16", "npz"]
+
+_PLY_TYPES = {
+    "char": "i1", "uchar": "u1", "short": "i2", "ushort": "u2",
+    "int": "i4", "uint": "u4", "float": "f4", "double": "f8",
+    "int8": "i1", "uint8": "u1", "int16": "i2", "uint16": "u2",
+    "int32": "i4", "uint32": "u4", "float32": "f4", "float64": "f8"}
+
+_INT16_RANGE = 32767
+
+
+def format_suffix(fmt: str) -> str:
+    """File suffix of a point cloud format
+
+    :param fmt: format, see POINTCLOUD_FORMATS
+    :type fmt: str
+    :return: suffix without dot
+    :rtype: str
+    """
+    if fmt not in POINTCLOUD_FORMATS:
+        raise ValueError(
+            f"Unknown point cloud format {fmt}, "
+            f"supported are {POINTCLOUD_FORMATS}")
+    return "npz" if fmt == "npz" else "ply"
+
+
+def quantize_points(points: np.ndarray, scale: float = None) -> tuple:
+    """Quantize points to int16 relative to the center of their
+    bounding box. If no scale is passed, the largest extent is mapped
+    to the int16 range, so the maximum error is half a scale step.
+
+    :param points: points of shape (N, 3)
+    :type points: np.ndarray
+    :param scale: quantization step, defaults to None (automatic)
+    :type scale: float, optional
+    :raises ValueError: if the points exceed the range of the scale
+    :return: int16 points, origin, scale
+    :rtype: tuple
+    """
+    if len(points) == 0:
+        return np.zeros((0, 3), dtype=np.int16), np.zeros(3), 1.0
+    lo = np.min(points, axis=0).astype(np.float64)
+    hi = np.max(points, axis=0).astype(np.float64)
+    origin = (lo + hi) / 2
+    half_extent = float(np.max(hi - lo)) / 2
+    if scale is None:
+        scale = half_extent / _INT16_RANGE if half_extent > 0 else 1.0
+    elif half_extent / scale > _INT16_RANGE:
+        raise ValueError(
+            f"Extent {2 * half_extent} exceeds the int16 range of "
+            f"scale {scale}")
+    quantized = np.subtract(points, origin, dtype=np.float64)
+    quantized *= 1 / scale
+    np.rint(quantized, out=quantized)
+    np.clip(quantized, -_INT16_RANGE, _INT16_RANGE, out=quantized)
+    return quantized.astype(np.int16), origin, scale
+
+
+def _as_uint8_colors(colors: np.ndarray, n: int) -> np.ndarray:
+    if colors is None:
+        return np.full((n, 3), 200, dtype=np.uint8)
+    colors = np.asarray(colors)
+    if colors.dtype != np.uint8:
+        colors = np.clip(np.rint(colors * 255), 0, 255).astype(np.uint8)
+    return colors
+
+
+def write_points(
+        filename: str,
+        points: np.ndarray,
+        colors: np.ndarray = None,
+        fmt: str = "ply_float32",
+        scale: float = None):
+    """Write points and colors in one of the compact formats
+
+    :param filename: output filename
+    :type filename: str
+    :param points: points of shape (N, 3)
+    :type points: np.ndarray
+    :param colors: uint8 colors or float colors in [0, 1] of shape
+        (N, 3), defaults to None (gray)
+    :type colors: np.ndarray, optional
+    :param fmt: ply_float32, ply_int16 or npz, defaults to "ply_float32"
+    :type fmt: str, optional
+    :param scale: quantization step of ply_int16, defaults to None
+    :type scale: float, optional
+    """
+    points = np.asarray(points)
+    colors = _as_uint8_colors(colors, len(points))
+    assert points.ndim == 2 and points.shape[1] == 3
+    assert colors.shape == points.shape
+    if fmt == "npz":
+        np.savez_compressed(
+            filename,
+            points=points.astype(np.float32, copy=False),
+            colors=colors)
+        return
+    comments = []
+    if fmt == "ply_float32":
+        ptype, pdtype = "float", "<f4"
+        points = points.astype(np.float32, copy=False)
+    elif fmt == "ply_int16":
+        ptype, pdtype = "short", "<i2"
+        points, origin, scale = quantize_points(points, scale)
+        comments = [
+            "origin {:.17g} {:.17g} {:.17g}".format(*origin),
+            f"scale {scale:.17g}"]
+    else:
+        raise ValueError(
+            f"Unknown point cloud format {fmt}, supported are "
+            "['ply_float32', 'ply_int16', 'npz']")
+    dtype = np.dtype([
+        ("x", pdtype), ("y", pdtype), ("z", pdtype),
+        ("red", "u1"), ("green", "u1"), ("blue", "u1")])
+    records = np.empty(len(points), dtype=dtype)
+    for i, name in enumerate(["x", "y", "z"]):
+        records[name] = points[:, i]
+    for i, name in enumerate(["red", "green", "blue"]):
+        records[name] = colors[:, i]
+    header = ["ply", "format binary_little_endian 1.0"]
+    header += [f"comment {x}" for x in comments]
+    header += [f"element vertex {len(points)}"]
+    header += [f"property {ptype} {x}" for x in ["x", "y", "z"]]
+    header += [f"property uchar {x}" for x in ["red", "green", "blue"]]
+    header += ["end_header"]
+    with open(filename, "wb") as f:
+        f.write(("\n".join(header) + "\n").encode("ascii"))
+        records.tofile(f)
+
+
+def write_pointcloud(
+        filename: str,
+        pcd: o3d.geometry.PointCloud,
+        fmt: str = "ply",
+        scale: float = None):
+    """Write an Open3D point cloud in one of the POINTCLOUD_FORMATS
+
+    :param filename: output filename
+    :type filename: str
+    :param pcd: point cloud
+    :type pcd: o3d.geometry.PointCloud
+    :param fmt: format, defaults to "ply" (Open3D's writer)
+    :type fmt: str, optional
+    :param scale: quantization step of ply_int16, defaults to None
+    :type scale: float, optional
+    :raises IOError: if Open3D fails to write the file
+    """
+    filename = str(filename)
+    if fmt == "ply":
+        if not o3d.io.write_point_cloud(filename, pcd):
+            raise IOError(f"Failed to write {filename}")
+        return
+    colors = None
+    if pcd.has_colors():
+        colors = np.asarray(pcd.colors)
+    write_points(filename, np.asarray(pcd.points), colors, fmt, scale)
+
+
+def read_ply_header(filename: str) -> dict:
+    """Parse the header of a binary little endian PLY file with a
+    single vertex element
+
+    :param filename: PLY filename
+    :type filename: str
+    :raises IOError: on unsupported PLY files
+    :return: num_points, dtype of the vertex records, header_size in
+        bytes, origin and scale (None if not quantized)
+    :rtype: dict
+    """
+    header = {"origin": None, "scale": None}
+    fields = []
+    with open(filename, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise IOError(f"{filename} is no PLY file")
+        while True:
+            line = f.readline()
+            if len(line) == 0:
+                raise IOError(f"{filename} has no end_header")
+            tokens = line.decode("ascii").split()
+            if len(tokens) == 0:
+                continue
+            if tokens[0] == "end_header":
+                break
+            if tokens[0] == "format" and \
+                    tokens[1] != "binary_little_endian":
+                raise IOError(f"Unsupported PLY format {tokens[1]}")
+            elif tokens[0] == "comment" and len(tokens) > 1:
+                if tokens[1] == "origin":
+                    header["origin"] = np.array(
+                        tokens[2:5], dtype=np.float64)
+                elif tokens[1] == "scale":
+                    header["scale"] = float(tokens[2])
+            elif tokens[0] == "element":
+                if tokens[1] != "vertex" or "num_points" in header:
+                    raise IOError(
+                        f"Unsupported PLY element {tokens[1]}")
+                header["num_points"] = int(tokens[2])
+            elif tokens[0] == "property":
+                if tokens[1] == "list":
+                    raise IOError("PLY list properties are not supported")
+                fields.append((tokens[2], "<" + _PLY_TYPES[tokens[1]]))
+        header["header_size"] = f.tell()
+    header["dtype"] = np.dtype(fields)
+    return header
+
+
+def _column_view(records: np.ndarray, names: list) -> np.ndarray:
+    # (N, len(names)) view of consecutive fields of the same type
+    dtype = records.dtype.fields[names[0]][0]
+    offset = records.dtype.fields[names[0]][1]
+    for i, name in enumerate(names):
+        assert records.dtype.fields[name] == \
+            (dtype, offset + i * dtype.itemsize)
+    if len(records) == 0:
+        return np.zeros((0, len(names)), dtype=dtype)
+    return np.ndarray(
+        (len(records), len(names)),
+        dtype=dtype,
+        buffer=records,
+        offset=offset,
+        strides=(records.dtype.itemsize, dtype.itemsize))
+
+
+def read_points(filename: str, dequantize: bool = True) -> tuple:
+    """Read points and colors written by write_points or Open3D's
+    binary PLY writer. Uncompressed PLY files are memory-mapped, the
+    returned arrays are read only views into the file unless
+    quantized points are dequantized.
+
+    :param filename: PLY or NPZ filename
+    :type filename: str
+    :param dequantize: convert int16 points to float64 world points,
+        defaults to True
+    :type dequantize: bool, optional
+    :return: points of shape (N, 3) and uint8 colors of shape (N, 3)
+        or None if the file has no colors
+    :rtype: tuple
+    """
+    if Path(filename).suffix.lower() == ".npz":
+        with np.load(filename, allow_pickle=False) as data:
+            return data["points"], data["colors"]
+    header = read_ply_header(filename)
+    if header["num_points"] == 0:
+        # empty files can't be memory-mapped
+        records = np.zeros(0, dtype=header["dtype"])
+    else:
+        records = np.memmap(
+            filename,
+            dtype=header["dtype"],
+            mode="r",
+            offset=header["header_size"],
+            shape=(header["num_points"],))
+    points = _column_view(records, ["x", "y", "z"])
+    colors = None
+    if "red" in header["dtype"].names:
+        colors = _column_view(records, ["red", "green", "blue"])
+    if header["scale"] is not None and dequantize:
+        points = points * header["scale"] + header["origin"]
+    return points, colors
+
+
+def read_pointcloud(filename: str) -> o3d.geometry.PointCloud:
+    """Read a file of any of the POINTCLOUD_FORMATS as Open3D point cloud
+
+    :param filename: PLY or NPZ filename
+    :type filename: str
+    :return: point cloud
+    :rtype: o3d.geometry.PointCloud
+    """
+    points, colors = read_points(filename)
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(
+        np.asarray(points, dtype=np.float64))
+    if colors is not None:
+        pcd.colors = o3d.utility.Vector3dVector(colors / 255)
+    return pcd
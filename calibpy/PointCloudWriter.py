@@ -0,0 +1,119 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import queue
+import threading
+import open3d as o3d
+from calibpy.PointCloudIO import write_pointcloud, format_suffix
+
+
+class PointCloudWriter:
+    """Writes point clouds to disk in a background thread, so the
+    producer never waits on disk I/O. The number of queued clouds is
+    bounded by max_queued; write blocks only if the queue is full.
+    Errors of the writer thread are raised on the next write, flush
+    or close.
+
+    Usage::
+
+        with PointCloudWriter() as writer:
+            for i, pcd in enumerate(pcds):
+                writer.write(f"pcl_{i:06d}.ply", pcd)
+    """
+
+    def __init__(
+            self,
+            max_queued: int = 8,
+            fmt: str = "ply",
+            scale: float = None):
+        """
+        :param max_queued: maximum number of queued point clouds,
+            defaults to 8
+        :type max_queued: int, optional
+        :param fmt: output format, see POINTCLOUD_FORMATS,
+            defaults to "ply"
+        :type fmt: str, optional
+        :param scale: quantization step of ply_int16, defaults to None
+        :type scale: float, optional
+        """
+        assert max_queued >= 1
+        format_suffix(fmt)
+        self._fmt = fmt
+        self._scale = scale
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._error = None
+        self._num_written = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def fmt(self):
+        return self._fmt
+
+    @property
+    def suffix(self):
+        return format_suffix(self._fmt)
+
+    @property
+    def num_written(self):
+        return self._num_written
+
+    @property
+    def is_closed(self):
+        return not self._thread.is_alive()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                filename, pcd = item
+                if self._error is None:
+                    write_pointcloud(filename, pcd, self._fmt, self._scale)
+                    self._num_written += 1
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+    def write(self, filename: str, pcd: o3d.geometry.PointCloud):
+        """Queue a point cloud for writing
+
+        :param filename: output filename
+        :type filename: str
+        :param pcd: point cloud
+        :type pcd: o3d.geometry.PointCloud
+        """
+        assert not self.is_closed
+        self._raise_error()
+        self._queue.put((str(filename), pcd))
+
+    def flush(self):
+        """Block until all queued point clouds are written
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Write all queued point clouds and stop the writer thread
+        """
+        if not self.is_closed:
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
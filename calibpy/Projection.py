@@ -0,0 +1,199 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import numpy as np
+
+
+# from opencv to blender world coordinates and back
+_FLIP = np.array([1, -1, -1])
+
+
+def _batch(
+        RT: np.ndarray,
+        intrinsics: np.ndarray,
+        distortion: np.ndarray,
+        dtype: np.dtype) -> tuple:
+    RT = np.asarray(RT, dtype=dtype).reshape(-1, 4, 4)
+    K = np.asarray(intrinsics, dtype=dtype).reshape(-1, 3, 3)
+    if distortion is None:
+        d = np.zeros((1, 5), dtype=dtype)
+    else:
+        # distortion not set (NaN) is no distortion
+        d = np.nan_to_num(np.asarray(distortion, dtype=dtype).reshape(-1, 5))
+    return RT, K, d
+
+
+def _coefficients(d: np.ndarray) -> tuple:
+    # k1, k2, p1, p2, k3 of shape (C, 1) broadcasting over the points
+    return tuple(d[:, i:i + 1] for i in range(5))
+
+
+def distort_points(x: np.ndarray, y: np.ndarray, distortion: np.ndarray):
+    """Applies the OpenCV 5 parameter distortion model (k1, k2, p1, p2,
+    k3) to normalized image coordinates
+
+    :param x: normalized x coordinates of shape (C, M)
+    :type x: np.ndarray
+    :param y: normalized y coordinates of shape (C, M)
+    :type y: np.ndarray
+    :param distortion: coefficients of shape (C, 5)
+    :type distortion: np.ndarray
+    :return: distorted x, y and the radial factor, which is not
+        positive where the model folds back
+    :rtype: tuple
+    """
+    k1, k2, p1, p2, k3 = _coefficients(distortion)
+    xy = x * y
+    r2 = x * x + y * y
+    radial = 1 + r2 * (k1 + r2 * (k2 + r2 * k3))
+    xd = x * radial + 2 * p1 * xy + p2 * (r2 + 2 * x * x)
+    yd = y * radial + p1 * (r2 + 2 * y * y) + 2 * p2 * xy
+    return xd, yd, radial
+
+
+def undistort_points(
+        xd: np.ndarray,
+        yd: np.ndarray,
+        distortion: np.ndarray,
+        iterations: int = 10) -> tuple:
+    """Inverts distort_points by fixed point iteration like
+    cv2.undistortPoints
+
+    :param xd: distorted normalized x coordinates of shape (C, M)
+    :type xd: np.ndarray
+    :param yd: distorted normalized y coordinates of shape (C, M)
+    :type yd: np.ndarray
+    :param distortion: coefficients of shape (C, 5)
+    :type distortion: np.ndarray
+    :param iterations: number of iterations, defaults to 10
+    :type iterations: int, optional
+    :return: undistorted x, y
+    :rtype: tuple
+    """
+    if not np.any(distortion):
+        return xd, yd
+    k1, k2, p1, p2, k3 = _coefficients(distortion)
+    x, y = xd, yd
+    for _ in range(iterations):
+        xy = x * y
+        r2 = x * x + y * y
+        icdist = 1 / (1 + r2 * (k1 + r2 * (k2 + r2 * k3)))
+        x = (xd - 2 * p1 * xy - p2 * (r2 + 2 * x * x)) * icdist
+        y = (yd - p1 * (r2 + 2 * y * y) - 2 * p2 * xy) * icdist
+    return x, y
+
+
+def project_points(
+        points: np.ndarray,
+        RT: np.ndarray,
+        intrinsics: np.ndarray,
+        distortion: np.ndarray = None,
+        image_size: np.ndarray = None,
+        blender_conform: bool = False) -> tuple:
+    """Projects world points into one or many cameras, the batched
+    equivalent of cv2.projectPoints. All points are projected into all
+    cameras at once. A point is visible in a camera if it is in front
+    of it, the distortion model does not fold back and, if the image
+    size is known, its nearest pixel is inside the image. Pixels of
+    points behind a camera are undefined. The computation is done in
+    float32 for float32 points, otherwise in float64.
+
+    :param points: world points of shape (M, 3) or (C, M, 3)
+    :type points: np.ndarray
+    :param RT: OpenCV extrinsics of shape (4, 4) or (C, 4, 4)
+    :type RT: np.ndarray
+    :param intrinsics: intrinsics of shape (3, 3) or (C, 3, 3)
+    :type intrinsics: np.ndarray
+    :param distortion: coefficients (k1, k2, p1, p2, k3) of shape
+        (1, 5) or (C, 5), defaults to None
+    :type distortion: np.ndarray, optional
+    :param image_size: (height, width) of shape (2,) or (C, 2),
+        negative sizes are unknown, defaults to None
+    :type image_size: np.ndarray, optional
+    :param blender_conform: the points are in Blender conform world
+        coordinates, see Registration, defaults to False
+    :type blender_conform: bool, optional
+    :return: pixels (u, v) of shape (C, M, 2), depths along the optical
+        axes of shape (C, M) and the visibility mask of shape (C, M)
+    :rtype: tuple
+    """
+    points = np.asarray(points)
+    dtype = np.result_type(points.dtype, np.float32)
+    RT, K, d = _batch(RT, intrinsics, distortion, dtype)
+    points = points.astype(dtype, copy=False)
+    if blender_conform:
+        points = points * _FLIP.astype(dtype)
+    cam = np.matmul(points, RT[:, :3, :3].transpose(0, 2, 1))
+    cam += RT[:, None, :3, 3]
+    depth = cam[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = cam[..., 0] / depth
+        y = cam[..., 1] / depth
+    xd, yd, radial = distort_points(x, y, d)
+    pixels = np.empty(cam.shape[:-1] + (2,), dtype=dtype)
+    pixels[..., 0] = K[:, 0, 0:1] * xd + K[:, 0, 1:2] * yd + K[:, 0, 2:3]
+    pixels[..., 1] = K[:, 1, 1:2] * yd + K[:, 1, 2:3]
+    visible = (depth > 0) & (radial > 0)
+    if image_size is not None:
+        size = np.asarray(image_size).reshape(-1, 2)
+        h, w = size[:, 0:1], size[:, 1:2]
+        # pixel centers are at integer coordinates
+        u, v = pixels[..., 0] + 0.5, pixels[..., 1] + 0.5
+        visible &= (w < 0) | ((u >= 0) & (u < w))
+        visible &= (h < 0) | ((v >= 0) & (v < h))
+    return pixels, depth, visible
+
+
+def unproject_pixels(
+        pixels: np.ndarray,
+        depth: np.ndarray,
+        RT: np.ndarray,
+        intrinsics: np.ndarray,
+        distortion: np.ndarray = None,
+        blender_conform: bool = False,
+        iterations: int = 10) -> np.ndarray:
+    """Lifts pixels with depths along the optical axes to world points,
+    the inverse of project_points. The distortion is removed by fixed
+    point iteration, see undistort_points. The computation is done in
+    float32 for float32 pixels, otherwise in float64.
+
+    :param pixels: pixels (u, v) of shape (M, 2) or (C, M, 2)
+    :type pixels: np.ndarray
+    :param depth: depths of shape (M,) or (C, M)
+    :type depth: np.ndarray
+    :param RT: OpenCV extrinsics of shape (4, 4) or (C, 4, 4)
+    :type RT: np.ndarray
+    :param intrinsics: intrinsics of shape (3, 3) or (C, 3, 3)
+    :type intrinsics: np.ndarray
+    :param distortion: coefficients (k1, k2, p1, p2, k3) of shape
+        (1, 5) or (C, 5), defaults to None
+    :type distortion: np.ndarray, optional
+    :param blender_conform: return Blender conform world coordinates,
+        see Registration, defaults to False
+    :type blender_conform: bool, optional
+    :param iterations: undistortion iterations, defaults to 10
+    :type iterations: int, optional
+    :return: world points of shape (C, M, 3)
+    :rtype: np.ndarray
+    """
+    pixels = np.asarray(pixels)
+    dtype = np.result_type(pixels.dtype, np.float32)
+    RT, K, d = _batch(RT, intrinsics, distortion, dtype)
+    pixels = pixels.astype(dtype, copy=False)
+    depth = np.asarray(depth, dtype=dtype)
+    yd = (pixels[..., 1] - K[:, 1, 2:3]) / K[:, 1, 1:2]
+    xd = (pixels[..., 0] - K[:, 0, 2:3] - K[:, 0, 1:2] * yd) / K[:, 0, 0:1]
+    x, y = undistort_points(xd, yd, d, iterations)
+    cam = np.empty(x.shape + (3,), dtype=dtype)
+    cam[..., 0] = x * depth
+    cam[..., 1] = y * depth
+    cam[..., 2] = depth
+    # inverse of the rigid transformation, R^T (p - t)
+    cam -= RT[:, None, :3, 3]
+    points = np.matmul(cam, RT[:, :3, :3])
+    if blender_conform:
+        points *= _FLIP.astype(dtype)
+    return points
@@ -0,0 +1,250 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import time
+import numpy as np
+import open3d as o3d
+from calibpy.Camera import Camera
+from calibpy.Fusion import VoxelFusion
+
+
+class ICPRefinement:
+    """Refines the extrinsics of registered frames by aligning each
+    frame to the running model of all frames refined before with
+    coarse to fine point-to-plane ICP on the CPU. Each scale level
+    works on voxel downsampled clouds and is seeded with the result of
+    the previous level, the first level with the pose of the
+    registration, i.e. Camera.RT. The number of iterations and the
+    time spent on each level are bounded, the time budget is checked
+    between runs of a few iterations. The model is kept as voxel hash
+    of the refined frames, see VoxelFusion, and as one voxel hash of
+    oriented normals per level, the ICP targets. Accepted frames are
+    merged into them incrementally, rejected frames are not merged.
+
+    Usage::
+
+        refinement = ICPRefinement(voxel_sizes=[0.08, 0.04, 0.02])
+        for cam, pcd in zip(cams, pcds):
+            cam, pcd = refinement.refine(cam, pcd)
+    """
+
+    # from opencv to blender convention
+    _T1 = np.array([[1, 0, 0, 0],
+                    [0, -1, 0, 0],
+                    [0, 0, -1, 0],
+                    [0, 0, 0, 1]], dtype=np.float64)
+
+    # iterations between two checks of the time budget
+    _BUDGET_ITERATIONS = 5
+
+    def __init__(
+            self,
+            voxel_sizes: list,
+            max_iterations=30,
+            time_budgets=None,
+            max_correspondence_factor: float = 2.0,
+            min_fitness: float = 0.3,
+            model_voxel_size: float = None,
+            blender_conform: bool = True):
+        """
+        :param voxel_sizes: voxel size of each scale level, coarse to fine
+        :type voxel_sizes: list
+        :param max_iterations: maximum number of ICP iterations of each
+            level or of all levels, defaults to 30
+        :type max_iterations: list or int, optional
+        :param time_budgets: maximum time in seconds of each level or of
+            all levels, a level stops after the run of iterations
+            exceeding it, defaults to None (unbounded)
+        :type time_budgets: list or float, optional
+        :param max_correspondence_factor: maximum correspondence
+            distance of a level in voxel sizes, defaults to 2.0
+        :type max_correspondence_factor: float, optional
+        :param min_fitness: minimum inlier fraction of the finest level
+            to accept a refinement, defaults to 0.3
+        :type min_fitness: float, optional
+        :param model_voxel_size: voxel size of the running model,
+            defaults to None (finest voxel size)
+        :type model_voxel_size: float, optional
+        :param blender_conform: the point clouds are registered in the
+            Blender world conventions, defaults to True
+        :type blender_conform: bool, optional
+        """
+        assert len(voxel_sizes) > 0
+        num_levels = len(voxel_sizes)
+        if np.isscalar(max_iterations):
+            max_iterations = [max_iterations] * num_levels
+        if time_budgets is None or np.isscalar(time_budgets):
+            time_budgets = [time_budgets] * num_levels
+        assert len(max_iterations) == num_levels
+        assert len(time_budgets) == num_levels
+        assert all(v > 0 for v in voxel_sizes)
+        assert all(n >= 1 for n in max_iterations)
+        if model_voxel_size is None:
+            model_voxel_size = min(voxel_sizes)
+        self._voxel_sizes = list(voxel_sizes)
+        self._max_iterations = list(max_iterations)
+        self._time_budgets = list(time_budgets)
+        self._max_correspondence_factor = max_correspondence_factor
+        self._min_fitness = min_fitness
+        self._blender_conform = blender_conform
+        self._model = VoxelFusion(model_voxel_size)
+        self._targets = [VoxelFusion(v) for v in voxel_sizes]
+        self._target_clouds = [None] * num_levels
+        self._num_frames = 0
+        self._history = []
+
+    @property
+    def voxel_sizes(self):
+        return self._voxel_sizes
+
+    @property
+    def max_iterations(self):
+        return self._max_iterations
+
+    @property
+    def time_budgets(self):
+        return self._time_budgets
+
+    @property
+    def num_frames(self):
+        return self._num_frames
+
+    @property
+    def history(self):
+        return self._history
+
+    def model(self) -> o3d.geometry.PointCloud:
+        """Running model of all refined frames
+
+        :return: point cloud with one averaged point per model voxel
+        :rtype: o3d.geometry.PointCloud
+        """
+        return self._model.to_pointcloud()
+
+    def _target(self, level: int) -> o3d.geometry.PointCloud:
+        # rebuilt once after each merged frame
+        if self._target_clouds[level] is None:
+            self._target_clouds[level] = \
+                self._targets[level].to_pointcloud()
+        return self._target_clouds[level]
+
+    def _merge(self, pcd: o3d.geometry.PointCloud, center: np.ndarray):
+        self._model.add_pointcloud(pcd)
+        for level, voxel_size in enumerate(self._voxel_sizes):
+            source = pcd.voxel_down_sample(voxel_size)
+            source.estimate_normals(
+                o3d.geometry.KDTreeSearchParamHybrid(
+                    radius=2 * voxel_size, max_nn=30))
+            # consistently oriented normals can be averaged per voxel
+            source.orient_normals_towards_camera_location(center)
+            self._targets[level].add_pointcloud(source)
+            self._target_clouds[level] = None
+
+    def _icp_level(self, source, target, level, transformation):
+        voxel_size = self._voxel_sizes[level]
+        distance = self._max_correspondence_factor * voxel_size
+        estimation = o3d.pipelines.registration.\
+            TransformationEstimationPointToPlane()
+        max_iterations = self._max_iterations[level]
+        budget = self._time_budgets[level]
+        run = max_iterations if budget is None else \
+            ICPRefinement._BUDGET_ITERATIONS
+        start = time.perf_counter()
+        result = None
+        iterations = 0
+        # a single run without time budget, otherwise runs of a few
+        # iterations to check the time budget in between
+        while iterations < max_iterations:
+            n = min(run, max_iterations - iterations)
+            criteria = o3d.pipelines.registration.ICPConvergenceCriteria(
+                max_iteration=n)
+            step = o3d.pipelines.registration.registration_icp(
+                source, target, distance, transformation, estimation,
+                criteria)
+            iterations += n
+            converged = result is not None and \
+                abs(step.fitness - result.fitness) < 1e-6 and \
+                abs(step.inlier_rmse - result.inlier_rmse) < 1e-6
+            result = step
+            transformation = step.transformation
+            if converged or len(step.correspondence_set) == 0:
+                break
+            if budget is not None and \
+                    time.perf_counter() - start >= budget:
+                break
+        return result, iterations
+
+    def align(self, pcd: o3d.geometry.PointCloud) -> np.ndarray:
+        """Coarse to fine alignment of a point cloud to the running
+        model, the model is not changed
+
+        :param pcd: registered point cloud
+        :type pcd: o3d.geometry.PointCloud
+        :return: world space correction of shape (4, 4), identity if
+            the model is empty or the alignment is rejected
+        :rtype: np.ndarray
+        """
+        transformation = np.identity(4)
+        info = {"iterations": [], "fitness": 0.0, "inlier_rmse": 0.0,
+                "accepted": False}
+        self._history.append(info)
+        if len(self._model) == 0 or len(pcd.points) == 0:
+            return transformation
+        result = None
+        for level, voxel_size in enumerate(self._voxel_sizes):
+            source = pcd.voxel_down_sample(voxel_size)
+            result, iterations = self._icp_level(
+                source, self._target(level), level, transformation)
+            transformation = result.transformation
+            info["iterations"].append(iterations)
+        info["fitness"] = result.fitness
+        info["inlier_rmse"] = result.inlier_rmse
+        if result.fitness < self._min_fitness:
+            print(f"Rejected ICP refinement with fitness "
+                  f"{result.fitness:.3f}")
+            return np.identity(4)
+        info["accepted"] = True
+        return np.array(transformation)
+
+    def refine(
+            self,
+            camera: Camera,
+            pcd: o3d.geometry.PointCloud) -> tuple:
+        """Align a registered frame to the running model, correct its
+        extrinsics and add it to the model. The first frame is added
+        as is, a frame whose alignment is rejected is returned
+        unchanged and not added.
+
+        :param camera: Camera the frame was registered with
+        :type camera: Camera
+        :param pcd: registered point cloud
+        :type pcd: o3d.geometry.PointCloud
+        :return: Camera copy with refined extrinsics, refined point cloud
+        :rtype: tuple
+        """
+        reference = len(self._model) == 0
+        transformation = self.align(pcd)
+        self._num_frames += 1
+        refined = Camera.from_cam(camera)
+        if not reference and not self._history[-1]["accepted"]:
+            return refined, o3d.geometry.PointCloud(pcd)
+        # the points are inv(RT) @ p in Open3D's world or
+        # RTb @ p = T1 @ inv(RT) @ T1 @ p in Blender's world
+        if self._blender_conform:
+            correction = ICPRefinement._T1 @ transformation @ \
+                ICPRefinement._T1
+        else:
+            correction = transformation
+        refined.RT = np.asarray(camera.RT, dtype=np.float64) @ \
+            np.linalg.inv(correction)
+        pcd = o3d.geometry.PointCloud(pcd)
+        pcd.transform(transformation)
+        if self._blender_conform:
+            center = np.asarray(refined.RTb)[:3, 3]
+        else:
+            center = np.linalg.inv(refined.RT)[:3, 3]
+        self._merge(pcd, center)
+        return refined, pcd
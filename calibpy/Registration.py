@@ -4,83 +4,847 @@
 :Sponsor: SpexAI GmbH
 """
 
-from calibpy.Calibration import Calibration
+from functools import lru_cache
 from calibpy.Camera import Camera
+from calibpy.CameraArray import CameraArray, blender_extrinsics
 import open3d as o3d
 import numpy as np
+import cv2
 
 
-def project_3d_blender_conform(
+# A 4K float32 ray grid or remap table takes 100 to 200 MB, thus only
+# the tables of the last two cameras are kept, see clear_caches
+@lru_cache(maxsize=2)
+def _ray_grid(
+        fx: float,
+        fy: float,
+        cx: float,
+        cy: float,
+        height: int,
+        width: int) -> np.ndarray:
+    rays = np.empty((height, width, 3), dtype=np.float32)
+    rays[:, :, 0] = (np.arange(width, dtype=np.float32) - cx) / fx
+    rays[:, :, 1] = -(np.arange(height, dtype=np.float32)[:, None] - cy) / fy
+    rays[:, :, 2] = -1
+    rays = rays.reshape(-1, 3)
+    rays.flags.writeable = False
+    return rays
+
+
+@lru_cache(maxsize=2)
+def _distorted_ray_grid(
+        intrinsics: tuple,
+        distortion: tuple,
+        height: int,
+        width: int) -> np.ndarray:
+    u, v = np.meshgrid(
+        np.arange(width, dtype=np.float64),
+        np.arange(height, dtype=np.float64))
+    pixels = np.stack([u, v], axis=-1).reshape(-1, 1, 2)
+    normalized = cv2.undistortPoints(
+        pixels,
+        np.array(intrinsics).reshape(3, 3),
+        np.array(distortion)).reshape(-1, 2)
+    rays = np.empty((height * width, 3), dtype=np.float32)
+    rays[:, 0] = normalized[:, 0]
+    rays[:, 1] = -normalized[:, 1]
+    rays[:, 2] = -1
+    rays.flags.writeable = False
+    return rays
+
+
+def clear_caches():
+    """Release the cached ray grids and undistortion maps, e.g. after
+    a stream was registered
+    """
+    _ray_grid.cache_clear()
+    _distorted_ray_grid.cache_clear()
+    _undistortion_maps.cache_clear()
+
+
+def _camera_key(camera: Camera) -> tuple:
+    return tuple(np.asarray(camera.intrinsics, dtype=np.float64).ravel()), \
+        tuple(np.asarray(camera.distortion, dtype=np.float64).ravel())
+
+
+def camera_ray_grid(
+        camera: Camera,
+        image_shape: tuple,
+        distortion_aware: bool = False) -> np.ndarray:
+    """Blender conform camera space rays of all pixels of an image,
+    scaled such that a ray multiplied by the pixel depth is the camera
+    space point. If distortion_aware, the pixels are undistorted with
+    the lens distortion of the camera (cv2.undistortPoints), i.e. the
+    depth map is expected in the distorted image space of the sensor.
+    The grid is cached per intrinsics, distortion and image size.
+
+    :param camera: Camera instance with intrinsics
+    :type camera: Camera
+    :param image_shape: image size in px (y, x)
+    :type image_shape: tuple
+    :param distortion_aware: apply the lens distortion, defaults to False
+    :type distortion_aware: bool, optional
+    :return: read only float32 rays of shape (height * width, 3)
+    :rtype: np.ndarray
+    """
+    if distortion_aware and camera.distortion is not None and \
+            np.any(np.asarray(camera.distortion) != 0):
+        intrinsics, distortion = _camera_key(camera)
+        return _distorted_ray_grid(
+            intrinsics, distortion,
+            int(image_shape[0]), int(image_shape[1]))
+    return _ray_grid(
+        float(camera.fx), float(camera.fy),
+        float(camera.cx), float(camera.cy),
+        int(image_shape[0]), int(image_shape[1]))
+
+
+@lru_cache(maxsize=2)
+def _undistortion_maps(
+        intrinsics: tuple,
+        distortion: tuple,
+        height: int,
+        width: int) -> tuple:
+    K = np.array(intrinsics).reshape(3, 3)
+    dist = np.array(distortion)
+    new_K, roi = cv2.getOptimalNewCameraMatrix(
+        K, dist, (width, height), 1, (width, height))
+    roi_x, roi_y, roi_w, roi_h = roi
+    # target pixel -> pixel of the cropped undistorted image -> ray of
+    # the new camera matrix -> distorted source pixel
+    x = (np.arange(width) + 0.5) * roi_w / width - 0.5 + roi_x
+    y = (np.arange(height) + 0.5) * roi_h / height - 0.5 + roi_y
+    x, y = np.meshgrid(x, y)
+    rays = np.stack([
+        (x - new_K[0, 2]) / new_K[0, 0],
+        (y - new_K[1, 2]) / new_K[1, 1],
+        np.ones_like(x)], axis=-1).reshape(-1, 1, 3)
+    source, _ = cv2.projectPoints(rays, np.zeros(3), np.zeros(3), K, dist)
+    source = source.reshape(height, width, 2).astype(np.float32)
+    return cv2.convertMaps(
+        source[:, :, 0], source[:, :, 1], cv2.CV_16SC2)
+
+
+def undistortion_maps(camera: Camera, image_shape: tuple) -> tuple:
+    """Remap tables reproducing Calibration.undistort_image, i.e.
+    undistortion to the optimal new camera matrix, cropping to its
+    valid region and resizing to the image size, in a single
+    cv2.remap. The maps are cached per intrinsics, distortion and
+    image size.
+
+    :param camera: Camera instance with intrinsics and distortion
+    :type camera: Camera
+    :param image_shape: image size in px (y, x)
+    :type image_shape: tuple
+    :return: fixed point maps for cv2.remap
+    :rtype: tuple
+    """
+    intrinsics, distortion = _camera_key(camera)
+    return _undistortion_maps(
+        intrinsics, distortion, int(image_shape[0]), int(image_shape[1]))
+
+
+def undistort_color(color_img: np.ndarray, camera: Camera) -> np.ndarray:
+    """Undistorts an image with the cached undistortion_maps of the
+    camera, see Calibration.undistort_image
+
+    :param color_img: color or grayscale image
+    :type color_img: np.ndarray
+    :param camera: Camera instance with intrinsics and distortion
+    :type camera: Camera
+    :return: undistorted image
+    :rtype: np.ndarray
+    """
+    map1, map2 = undistortion_maps(camera, color_img.shape[:2])
+    return cv2.remap(color_img, map1, map2, cv2.INTER_LINEAR)
+
+
+def backproject_depth(
         depth_map: np.ndarray,
+        camera: Camera,
+        out: np.ndarray = None,
+        pixel_indices: np.ndarray = None,
+        depth_scale: float = 1.0,
+        distortion_aware: bool = False) -> np.ndarray:
+    """Back-projects a depth map into Blender conform world coordinates
+    using the cached ray grid of the camera and camera.RTb. The points
+    are computed in float32 as (scale * R) @ (depth * ray) + t without
+    building homogeneous coordinates. The depth map is used in its
+    stored type, e.g. uint16 millimeters or float16, the conversion to
+    metric depth is fused into the rotation. If pixel_indices is
+    passed, only these pixels are projected.
+
+    :param depth_map: depth map
+    :type depth_map: np.ndarray
+    :param camera: Camera instance with intrinsics and extrinsics
+    :type camera: Camera
+    :param out: float32 output buffer of shape (N, 3), defaults to None
+    :type out: np.ndarray, optional
+    :param pixel_indices: flat indices of the pixels to project,
+        defaults to None (all pixels)
+    :type pixel_indices: np.ndarray, optional
+    :param depth_scale: meters per depth unit, e.g. 0.001 for 16 bit
+        millimeter depth maps, defaults to 1.0
+    :type depth_scale: float, optional
+    :param distortion_aware: use the undistorted rays of the distorted
+        sensor pixels, see camera_ray_grid, defaults to False
+    :type distortion_aware: bool, optional
+    :return: world points of shape (N, 3)
+    :rtype: np.ndarray
+    """
+    rays = camera_ray_grid(camera, depth_map.shape, distortion_aware)
+    depth = depth_map.reshape(-1, 1)
+    if pixel_indices is not None:
+        rays = rays[pixel_indices]
+        depth = depth[pixel_indices]
+    if out is None:
+        out = np.empty(rays.shape, dtype=np.float32)
+    assert out.shape == rays.shape and out.dtype == np.float32
+    RTb = np.asarray(camera.RTb, dtype=np.float32)
+    np.matmul(rays, RTb[:3, :3].T * np.float32(depth_scale), out=out)
+    out *= depth
+    out += RTb[:3, 3]
+    return out
+
+
+def color_values(
         color_img: np.ndarray,
-        camera: Camera):
+        camera: Camera,
+        image_shape: tuple,
+        out: np.ndarray = None,
+        pixel_indices: np.ndarray = None,
+        distortion_aware: bool = False) -> np.ndarray:
+    """Undistorted per pixel uint8 RGB colors of a color or grayscale
+    image, see undistort_color. 16 bit images are scaled to 8 bit.
+    If distortion_aware, the depth map and the color image share the
+    distorted sensor pixels, so the colors are taken without
+    undistortion. If color_img is None, all pixels are colored gray.
+    If pixel_indices is passed, only the colors of these pixels are
+    returned.
+
+    :param color_img: color or grayscale image or None
+    :type color_img: np.ndarray
+    :param camera: Camera instance with intrinsics and distortion
+    :type camera: Camera
+    :param image_shape: image size in px (y, x)
+    :type image_shape: tuple
+    :param out: uint8 output buffer of shape (N, 3), defaults to None
+    :type out: np.ndarray, optional
+    :param pixel_indices: flat pixel indices, defaults to None (all)
+    :type pixel_indices: np.ndarray, optional
+    :param distortion_aware: skip the undistortion, defaults to False
+    :type distortion_aware: bool, optional
+    :return: colors of shape (N, 3)
+    :rtype: np.ndarray
+    """
+    n = int(image_shape[0]) * int(image_shape[1])
+    if pixel_indices is not None:
+        n = len(pixel_indices)
+    if out is None:
+        out = np.empty((n, 3), dtype=np.uint8)
+    assert out.shape == (n, 3) and out.dtype == np.uint8
     if color_img is None:
-        color_img = np.ones(list(depth_map.shape)+[3], dtype=np.uint8)*200
-    color_img = Calibration.undistort_image(
-        color_img,
-        camera.intrinsics,
-        camera.distortion)
-    if np.amax(color_img > 1):
-        color_img = color_img.astype(np.float32)
-        color_img /= 255
-    if len(color_img.shape) == 2:
-        tmp = np.zeros(list(color_img.shape) + [3])
-        for i in range(3):
-            tmp[:, :, i] = color_img
-        color_img = tmp
-
-    fx = camera.intrinsics[0, 0]
-    fy = camera.intrinsics[1, 1]
-    cx = camera.intrinsics[0, 2]
-    cy = camera.intrinsics[1, 2]
-    w = depth_map.shape[1]
-    h = depth_map.shape[0]
-    _x = np.arange(w)
-    _y = np.arange(h)
-    u, v = np.meshgrid(_x, _y)
-    x = (u - cx)
-    x = np.multiply(x, depth_map)
-    x /= fx
-    y = -(v - cy)
-    y = np.multiply(y, depth_map)
-    y /= fy
-    z = -depth_map
-    xyz = np.zeros((4, w*h))
-    rgb = np.zeros((w*h, 3))
-    pcl = np.zeros((w*h, 3))
-    xyz[0, :] = np.reshape(x, -1)
-    xyz[1, :] = np.reshape(y, -1)
-    xyz[2, :] = np.reshape(z, -1)
-    xyz[3, :] = 1
-
-    xyz = np.matmul(camera.RTb, xyz)
-    for i in range(3):
-        pcl[:, i] = xyz[i, :]
-
-    rgb[:, 0] = np.reshape(color_img[:, :, 0], -1)
-    rgb[:, 1] = np.reshape(color_img[:, :, 1], -1)
-    rgb[:, 2] = np.reshape(color_img[:, :, 2], -1)
+        out[:] = 200
+        return out
+    if not distortion_aware:
+        color_img = undistort_color(color_img, camera)
+    if color_img.dtype == np.uint16:
+        # rounded 255 / 65535 scaling in integers
+        color_img = ((color_img.astype(np.uint32) * 255 + 32767)
+                     // 65535).astype(np.uint8)
+    elif color_img.dtype != np.uint8:
+        if np.amax(color_img) <= 1:
+            color_img = color_img * 255
+        color_img = np.clip(color_img, 0, 255).astype(np.uint8)
+    if color_img.ndim == 2:
+        colors = color_img.reshape(-1, 1)
+    else:
+        colors = color_img[:, :, :3].reshape(-1, 3)
+    if pixel_indices is not None:
+        colors = colors[pixel_indices]
+    out[:] = colors
+    return out
+
+
+SAMPLING_MODES = ["stride", "random", "depth_adaptive"]
+
+
+def valid_depth_mask(
+        depth_map: np.ndarray,
+        near: float = 0.0,
+        far: float = np.inf,
+        depth_scale: float = 1.0) -> np.ndarray:
+    """Flat mask of the valid pixels of a depth map. Pixels are invalid
+    if their depth is NaN, infinite, not larger than near or larger
+    than far, e.g. background far planes of rendered .exr files or
+    zeros of 16 bit depth maps. By default only zero, negative and
+    non-finite depths are invalid. near and far are metric, they are
+    converted to depth units instead of converting the depth map.
+
+    :param depth_map: depth map
+    :type depth_map: np.ndarray
+    :param near: near clipping depth, defaults to 0.0
+    :type near: float, optional
+    :param far: far clipping depth, defaults to inf
+    :type far: float, optional
+    :param depth_scale: meters per depth unit, defaults to 1.0
+    :type depth_scale: float, optional
+    :return: boolean mask of shape (height * width,)
+    :rtype: np.ndarray
+    """
+    near = near / depth_scale
+    far = far / depth_scale
+    depth = depth_map.reshape(-1)
+    # NaN compares False, thus NaNs are masked by the range test
+    valid = depth > near
+    valid &= depth <= far
+    if far == np.inf:
+        valid &= np.isfinite(depth)
+    return valid
+
+
+def _keep_scale(weights: np.ndarray, target: float) -> float:
+    # scale s with sum(min(s * weights, 1)) == target. Probabilities
+    # saturating at 1 are fixed and the rest is rescaled. The scale and
+    # the saturated set only grow, so this ends after a few passes.
+    num_positive = np.count_nonzero(weights > 0)
+    if num_positive == 0:
+        return 0.0
+    if target >= num_positive:
+        return np.inf
+    saturated = np.zeros(weights.shape, dtype=bool)
+    num_saturated = 0
+    while True:
+        rest = np.sum(weights, where=~saturated, dtype=np.float64)
+        scale = (target - num_saturated) / rest
+        saturated = weights * scale >= 1
+        count = np.count_nonzero(saturated)
+        if count == num_saturated:
+            return scale
+        num_saturated = count
+
+
+def sample_pixels(
+        depth_map: np.ndarray,
+        factor: float,
+        mode: str = "random",
+        seed: int = 0,
+        valid: np.ndarray = None) -> np.ndarray:
+    """Choose the pixels of a depth map to project. The result is
+    deterministic for a given seed. If a flat validity mask is passed,
+    only valid pixels are chosen. Supported modes are
+
+    - stride: regular grid with a step of round(1 / sqrt(factor))
+    - random: each pixel is kept with probability factor
+    - depth_adaptive: the keep probability grows with the squared
+      depth, normalized such that factor of the valid pixels are kept
+      on average, so far away surfaces, which are covered by fewer
+      pixels, are sampled denser
+
+    :param depth_map: depth map
+    :type depth_map: np.ndarray
+    :param factor: fraction of pixels to keep, (0, 1]
+    :type factor: float
+    :param mode: sampling mode, defaults to "random"
+    :type mode: str, optional
+    :param seed: random seed, defaults to 0
+    :type seed: int, optional
+    :param valid: flat validity mask, defaults to None (all valid)
+    :type valid: np.ndarray, optional
+    :raises ValueError: on unknown sampling modes
+    :return: sorted flat pixel indices
+    :rtype: np.ndarray
+    """
+    assert 0 < factor <= 1
+    h, w = depth_map.shape[:2]
+    if mode == "stride":
+        step = max(1, int(round(1 / np.sqrt(factor))))
+        rows = np.arange(0, h, step)
+        cols = np.arange(0, w, step)
+        indices = (rows[:, None] * w + cols[None, :]).reshape(-1)
+        if valid is not None:
+            indices = indices[valid[indices]]
+        return indices
+    rng = np.random.default_rng(seed)
+    if mode == "random":
+        keep = rng.random(h * w, dtype=np.float32) < factor
+    elif mode == "depth_adaptive":
+        sq_depth = np.square(depth_map.reshape(-1), dtype=np.float32)
+        if valid is not None:
+            sq_depth[~valid] = 0
+        else:
+            sq_depth[~np.isfinite(sq_depth)] = 0
+        num_valid = h * w if valid is None else np.count_nonzero(valid)
+        scale = _keep_scale(sq_depth, factor * num_valid)
+        if scale == 0:
+            return np.zeros(0, dtype=np.int64)
+        if scale == np.inf:
+            keep = sq_depth > 0
+        else:
+            sq_depth *= np.float32(scale)
+            keep = rng.random(h * w, dtype=np.float32) < sq_depth
+    else:
+        raise ValueError(
+            f"Unknown sampling mode {mode}, supported are {SAMPLING_MODES}")
+    if valid is not None:
+        keep &= valid
+    return np.flatnonzero(keep)
+
+
+def estimate_grid_normals(
+        depth_map: np.ndarray,
+        camera: Camera,
+        pixel_indices: np.ndarray,
+        max_depth_ratio: float = 0.05,
+        distortion_aware: bool = False) -> tuple:
+    """Normals of the organized point grid of a depth map from finite
+    differences of the neighboring pixels. Forward differences are
+    used, backward differences if the forward neighbor is outside of
+    the image or not usable. Only the pixels in pixel_indices and their
+    neighbors are back-projected. Normals are oriented towards the
+    camera. A neighbor is not usable if its depth is not positive, not
+    finite or differs by more than max_depth_ratio relative to the
+    pixel depth, i.e. at depth discontinuities. A normal is invalid
+    and set to zero if neither neighbor of a row or column is usable.
+
+    :param depth_map: depth map
+    :type depth_map: np.ndarray
+    :param camera: Camera instance with intrinsics and extrinsics
+    :type camera: Camera
+    :param pixel_indices: flat pixel indices
+    :type pixel_indices: np.ndarray
+    :param max_depth_ratio: maximum relative depth difference of
+        neighbors, defaults to 0.05
+    :type max_depth_ratio: float, optional
+    :param distortion_aware: use the distortion aware rays, see
+        camera_ray_grid, defaults to False
+    :type distortion_aware: bool, optional
+    :return: float32 Blender conform world space normals of shape
+        (N, 3) and their validity mask of shape (N,)
+    :rtype: tuple
+    """
+    h, w = depth_map.shape[:2]
+    rays = camera_ray_grid(camera, (h, w), distortion_aware)
+    depth = depth_map.reshape(-1)
+    rows, cols = np.divmod(pixel_indices, w)
+
+    center_depth = depth[pixel_indices].astype(np.float32)
+    center = rays[pixel_indices] * center_depth[:, None]
+
+    def usable(step, inside):
+        neighbor = np.where(inside, pixel_indices + step, pixel_indices)
+        neighbor_depth = depth[neighbor].astype(np.float32)
+        # NaN compares False, thus NaNs are not usable
+        return inside & (neighbor_depth > 0) & \
+            (np.abs(neighbor_depth - center_depth) <=
+             max_depth_ratio * center_depth)
+
+    valid = np.ones(len(pixel_indices), dtype=bool)
+    tangents = []
+    for step, forward_inside, backward_inside in [
+            (1, cols < w - 1, cols > 0), (w, rows < h - 1, rows > 0)]:
+        forward = usable(step, forward_inside)
+        backward = usable(-step, backward_inside)
+        valid &= forward | backward
+        step = np.where(forward, step, np.where(backward_inside, -step, 0))
+        neighbor_depth = depth[pixel_indices + step].astype(np.float32)
+        tangent = rays[pixel_indices + step] * neighbor_depth[:, None]
+        tangent -= center
+        tangent *= np.sign(step)[:, None]
+        tangents.append(tangent)
+    normals = np.cross(tangents[0], tangents[1])
+
+    # orient towards the camera in the origin of camera space
+    flip = np.einsum("ij,ij->i", normals, center) > 0
+    normals[flip] *= -1
+    norm = np.linalg.norm(normals, axis=1)
+    valid &= norm > 0
+    normals[valid] /= norm[valid, None]
+    normals[~valid] = 0
+
+    R = np.asarray(camera.RTb, dtype=np.float32)[:3, :3]
+    return normals @ R.T, valid
+
+
+def as_crop_box(box, blender_conform: bool = True):
+    """Converts a world space crop box to an Open3D OrientedBoundingBox
+    in the Blender conform world coordinates the points are projected
+    in. Supported are Open3D AxisAlignedBoundingBox and
+    OrientedBoundingBox instances, a (min, max) corner pair or a dict
+    with center, extent and an optional rotation R, e.g. from a config
+    file.
+
+    :param box: crop box
+    :type box: o3d.geometry.OrientedBoundingBox
+    :param blender_conform: the box is given in the Blender world
+        conventions, otherwise in the Open3D ones, defaults to True
+    :type blender_conform: bool, optional
+    :raises ValueError: if the box type is not supported
+    :return: oriented box in Blender conform world coordinates
+    :rtype: o3d.geometry.OrientedBoundingBox
+    """
+    if isinstance(box, o3d.geometry.AxisAlignedBoundingBox):
+        box = o3d.geometry.OrientedBoundingBox(
+            box.get_center(), np.identity(3), box.get_extent())
+    elif isinstance(box, dict):
+        box = o3d.geometry.OrientedBoundingBox(
+            np.asarray(box["center"], dtype=np.float64),
+            np.asarray(box.get("R", np.identity(3)), dtype=np.float64),
+            np.asarray(box["extent"], dtype=np.float64))
+    elif isinstance(box, (list, tuple, np.ndarray)) and len(box) == 2:
+        lo = np.asarray(box[0], dtype=np.float64)
+        hi = np.asarray(box[1], dtype=np.float64)
+        assert np.all(hi >= lo)
+        box = o3d.geometry.OrientedBoundingBox(
+            (lo + hi) / 2, np.identity(3), hi - lo)
+    elif not isinstance(box, o3d.geometry.OrientedBoundingBox):
+        raise ValueError(f"Unsupported crop box {box}")
+    if blender_conform:
+        return box
+    # Open3D world coordinates are the Blender conform ones with
+    # flipped y and z axes
+    T1 = np.diag([1.0, -1.0, -1.0])
+    return o3d.geometry.OrientedBoundingBox(
+        T1 @ box.center, T1 @ box.R, box.extent)
+
+
+def crop_box_window(
+        box: o3d.geometry.OrientedBoundingBox,
+        camera: Camera,
+        image_shape: tuple,
+        distortion_aware: bool = False) -> tuple:
+    """Conservative image window and depth range of a Blender conform
+    world space crop box seen by a camera. The box corners are
+    transformed into camera space, their depth range bounds the depths
+    of all points inside. If the box is completely in front of the
+    camera, the rectangle around its projected corners bounds the
+    pixels, so whole rows and columns outside can be rejected before
+    projection. With distortion_aware, only the depth range is used.
+
+    :param box: crop box, see as_crop_box
+    :type box: o3d.geometry.OrientedBoundingBox
+    :param camera: Camera instance with intrinsics and extrinsics
+    :type camera: Camera
+    :param image_shape: height, width
+    :type image_shape: tuple
+    :param distortion_aware: the depth map is in the distorted sensor
+        space, defaults to False
+    :type distortion_aware: bool, optional
+    :return: row and column slices and the metric depth range
+        (near, far), the window is empty if the box is behind the camera
+    :rtype: tuple
+    """
+    h, w = image_shape[:2]
+    corners = np.asarray(box.get_box_points())
+    RTb = np.asarray(camera.RTb, dtype=np.float64)
+    # Blender camera space, the camera looks along -z
+    cam_corners = (corners - RTb[:3, 3]) @ RTb[:3, :3]
+    depth = -cam_corners[:, 2]
+    near, far = max(float(np.min(depth)), 0.0), float(np.max(depth))
+    if far <= 0:
+        return slice(0, 0), slice(0, 0), (0.0, 0.0)
+    rows, cols = slice(0, h), slice(0, w)
+    if near > 0 and not distortion_aware:
+        u = camera.fx * cam_corners[:, 0] / depth + camera.cx
+        v = camera.cy - camera.fy * cam_corners[:, 1] / depth
+        rows = slice(int(np.clip(np.floor(np.min(v)), 0, h)),
+                     int(np.clip(np.ceil(np.max(v)) + 1, 0, h)))
+        cols = slice(int(np.clip(np.floor(np.min(u)), 0, w)),
+                     int(np.clip(np.ceil(np.max(u)) + 1, 0, w)))
+    return rows, cols, (near, far)
+
+
+def points_in_box(
+        points: np.ndarray,
+        box: o3d.geometry.OrientedBoundingBox) -> np.ndarray:
+    """Mask of the points inside an oriented box
+
+    :param points: points of shape (N, 3)
+    :type points: np.ndarray
+    :param box: box in the coordinates of the points
+    :type box: o3d.geometry.OrientedBoundingBox
+    :return: boolean mask of shape (N,)
+    :rtype: np.ndarray
+    """
+    R = np.asarray(box.R, dtype=np.float32)
+    local = (points - np.asarray(box.center, dtype=np.float32)) @ R
+    half = np.asarray(box.extent, dtype=np.float32) / 2
+    return np.all(np.abs(local) <= half, axis=1)
+
+
+def points_to_pointcloud(
+        points: np.ndarray,
+        colors: np.ndarray = None) -> o3d.geometry.PointCloud:
+    """Creates an Open3D point cloud from float32 points and
+    uint8 colors.
+
+    :param points: points of shape (N, 3)
+    :type points: np.ndarray
+    :param colors: uint8 colors of shape (N, 3), defaults to None
+    :type colors: np.ndarray, optional
+    :return: point cloud
+    :rtype: o3d.geometry.PointCloud
+    """
     pcd = o3d.geometry.PointCloud()
-    pcd.points = o3d.utility.Vector3dVector(pcl)
-    pcd.colors = o3d.utility.Vector3dVector(rgb)
+    pcd.points = o3d.utility.Vector3dVector(
+        points.astype(np.float64, copy=False))
+    if colors is not None:
+        pcd.colors = o3d.utility.Vector3dVector(
+            colors.astype(np.float64) / 255)
     return pcd
 
 
-def load_as_rgbd(camera, depth_map, color_img=None):
+def project_3d_blender_conform(
+        depth_map: np.ndarray,
+        color_img: np.ndarray,
+        camera: Camera,
+        out_points: np.ndarray = None,
+        out_colors: np.ndarray = None,
+        pixel_indices: np.ndarray = None,
+        depth_scale: float = 1.0,
+        distortion_aware: bool = False) -> o3d.geometry.PointCloud:
+    """Back-projects a depth map and the corresponding color image into
+    a Blender conform world space point cloud, see backproject_depth
+    and color_values. Optional output buffers can be reused across
+    frames of the same size. If pixel_indices is passed, only these
+    pixels are projected.
+
+    :param depth_map: depth map
+    :type depth_map: np.ndarray
+    :param color_img: color or grayscale image or None
+    :type color_img: np.ndarray
+    :param camera: Camera instance
+    :type camera: Camera
+    :param out_points: float32 buffer (height * width, 3), defaults to None
+    :type out_points: np.ndarray, optional
+    :param out_colors: uint8 buffer (height * width, 3), defaults to None
+    :type out_colors: np.ndarray, optional
+    :param pixel_indices: flat pixel indices, defaults to None (all)
+    :type pixel_indices: np.ndarray, optional
+    :param depth_scale: meters per depth unit, defaults to 1.0
+    :type depth_scale: float, optional
+    :param distortion_aware: apply the lens distortion to the rays
+        instead of undistorting the color image, defaults to False
+    :type distortion_aware: bool, optional
+    :return: point cloud
+    :rtype: o3d.geometry.PointCloud
+    """
+    points = backproject_depth(
+        depth_map, camera, out=out_points, pixel_indices=pixel_indices,
+        depth_scale=depth_scale, distortion_aware=distortion_aware)
+    colors = color_values(
+        color_img, camera, depth_map.shape, out=out_colors,
+        pixel_indices=pixel_indices, distortion_aware=distortion_aware)
+    return points_to_pointcloud(points, colors)
+
+
+class PointSet:
+    """Structure of arrays of the points of several frames. Points are
+    float32, colors uint8 and frame_ids int32 indices of the frame each
+    point was projected from. Points of a frame are stored contiguously.
+    """
+
+    def __init__(
+            self,
+            points: np.ndarray,
+            colors: np.ndarray,
+            frame_ids: np.ndarray):
+        """
+        :param points: float32 points of shape (N, 3)
+        :type points: np.ndarray
+        :param colors: uint8 colors of shape (N, 3)
+        :type colors: np.ndarray
+        :param frame_ids: int32 frame ids of shape (N,)
+        :type frame_ids: np.ndarray
+        """
+        assert len(points) == len(colors) == len(frame_ids)
+        self.points = points
+        self.colors = colors
+        self.frame_ids = frame_ids
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def num_frames(self):
+        if len(self.frame_ids) == 0:
+            return 0
+        return int(self.frame_ids[-1]) + 1
+
+    def frame(self, frame_id: int) -> "PointSet":
+        """Points of a single frame as views into this set
+
+        :param frame_id: frame id
+        :type frame_id: int
+        :return: point set of the frame
+        :rtype: PointSet
+        """
+        start, stop = np.searchsorted(
+            self.frame_ids, [frame_id, frame_id + 1])
+        return PointSet(
+            self.points[start:stop],
+            self.colors[start:stop],
+            self.frame_ids[start:stop])
+
+    def to_pointcloud(self) -> o3d.geometry.PointCloud:
+        """Creates an Open3D point cloud of all points
+
+        :return: point cloud
+        :rtype: o3d.geometry.PointCloud
+        """
+        return points_to_pointcloud(self.points, self.colors)
+
+
+def backproject_depth_batch(
+        depth_maps: np.ndarray,
+        extrinsics,
+        camera: Camera = None,
+        color_imgs: list = None,
+        downsample_factor: float = 1.0,
+        sampling: str = "random",
+        seed: int = 0,
+        depth_near: float = 0.0,
+        depth_far: float = np.inf,
+        chunk_size: int = 8,
+        depth_scale: float = 1.0,
+        distortion_aware: bool = False) -> PointSet:
+    """Back-projects a stack of depth maps of the same camera into
+    Blender conform world coordinates. All frames share one cached ray
+    grid, the valid and sampled pixels of all frames are chosen first,
+    then the rays of chunks of chunk_size frames are scaled at once and
+    each frame is transformed with one matrix product, so the temporary
+    memory is bounded by the chunk and not by the sequence length. The
+    pixel selection matches register_depthmap_to_world with the same
+    parameters.
+
+    :param depth_maps: depth maps of shape (F, H, W) or a list of them
+    :type depth_maps: np.ndarray
+    :param extrinsics: CameraArray or list of F Camera instances or
+        OpenCV extrinsics of shape (F, 4, 4)
+    :type extrinsics: CameraArray, list or np.ndarray
+    :param camera: Camera providing the intrinsics, defaults to None
+        (first camera of extrinsics, all cameras must share its
+        intrinsics and distortion)
+    :type camera: Camera, optional
+    :param color_imgs: F color or grayscale images, defaults to None
+    :type color_imgs: list, optional
+    :param downsample_factor: fraction of pixels to keep, defaults to 1.0
+    :type downsample_factor: float, optional
+    :param sampling: sampling mode, see SAMPLING_MODES,
+        defaults to "random"
+    :type sampling: str, optional
+    :param seed: random seed of the sampling, defaults to 0
+    :type seed: int, optional
+    :param depth_near: depths <= depth_near are masked, defaults to 0.0
+    :type depth_near: float, optional
+    :param depth_far: depths > depth_far are masked, defaults to inf
+    :type depth_far: float, optional
+    :param chunk_size: number of frames projected at once, defaults to 8
+    :type chunk_size: int, optional
+    :param depth_scale: meters per depth unit, defaults to 1.0
+    :type depth_scale: float, optional
+    :param distortion_aware: apply the lens distortion to the rays
+        instead of undistorting the color images, defaults to False
+    :type distortion_aware: bool, optional
+    :return: points, colors and frame ids of all frames
+    :rtype: PointSet
+    """
+    assert chunk_size >= 1
+    num_frames = len(depth_maps)
+    if isinstance(extrinsics, np.ndarray):
+        assert camera is not None, "Intrinsics camera needed"
+        RTb = blender_extrinsics(extrinsics)
+    else:
+        cams = extrinsics
+        if not isinstance(cams, CameraArray):
+            cams = CameraArray.from_cameras(list(extrinsics))
+        if camera is None:
+            assert all(np.array_equal(
+                x, np.broadcast_to(x[:1], x.shape), equal_nan=True)
+                for x in [cams.intrinsics, cams.distortion]), \
+                "Cameras differ in intrinsics, pass the camera to use"
+            camera = extrinsics[0]
+        RTb = cams.RTb
+    assert RTb.shape == (num_frames, 4, 4)
+    if color_imgs is not None:
+        assert len(color_imgs) == num_frames
+    RTb = RTb.astype(np.float32)
+    # the depth unit conversion is fused into the rotations
+    RTb[:, :3, :3] *= np.float32(depth_scale)
+
+    image_shape = depth_maps[0].shape[:2]
+    rays = camera_ray_grid(camera, image_shape, distortion_aware)
+
+    pixel_indices = []
+    for depth_map in depth_maps:
+        assert depth_map.shape[:2] == image_shape
+        valid = valid_depth_mask(
+            depth_map, near=depth_near, far=depth_far,
+            depth_scale=depth_scale)
+        if downsample_factor != 1.0:
+            pixel_indices.append(sample_pixels(
+                depth_map, downsample_factor, mode=sampling, seed=seed,
+                valid=valid))
+        else:
+            pixel_indices.append(np.flatnonzero(valid))
+    counts = np.array([len(x) for x in pixel_indices], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    points = np.empty((offsets[-1], 3), dtype=np.float32)
+    colors = np.empty((offsets[-1], 3), dtype=np.uint8)
+    frame_ids = np.repeat(
+        np.arange(num_frames, dtype=np.int32), counts)
+
+    for first in range(0, num_frames, chunk_size):
+        last = min(first + chunk_size, num_frames)
+        start, stop = offsets[first], offsets[last]
+        if start == stop:
+            continue
+        pixels = np.concatenate(pixel_indices[first:last])
+        depth = np.concatenate([
+            depth_maps[f].reshape(-1)[pixel_indices[f]]
+            for f in range(first, last)])
+        cam_points = rays[pixels]
+        cam_points *= depth[:, None]
+        for f in range(first, last):
+            s, e = offsets[f], offsets[f + 1]
+            np.matmul(cam_points[s - start:e - start], RTb[f, :3, :3].T,
+                      out=points[s:e])
+            points[s:e] += RTb[f, :3, 3]
+
+    for f in range(num_frames):
+        color_values(
+            None if color_imgs is None else color_imgs[f],
+            camera,
+            image_shape,
+            out=colors[offsets[f]:offsets[f + 1]],
+            pixel_indices=pixel_indices[f],
+            distortion_aware=distortion_aware)
+
+    return PointSet(points, colors, frame_ids)
+
+
+def load_as_rgbd(
+        camera,
+        depth_map,
+        color_img=None,
+        depth_trunc=100,
+        depth_scale=1.0):
     if color_img is None:
         color_img = np.ones(list(depth_map.shape)+[3], dtype=np.uint8)*200
-    color_img = Calibration.undistort_image(
-        color_img,
-        camera.intrinsics,
-        camera.distortion)
+    color_img = undistort_color(color_img, camera)
     color_raw = o3d.geometry.Image(color_img.astype(np.uint8))
-    dmap = np.copy(depth_map)
+    # Open3D supports uint16 and float32 depth images only
+    if depth_map.dtype != np.uint16:
+        dmap = depth_map.astype(np.float32)
+    else:
+        dmap = np.copy(depth_map)
     depth_raw = o3d.geometry.Image(dmap)
     rgbd_image = o3d.geometry.RGBDImage.create_from_color_and_depth(
         color_raw,
         depth_raw,
-        depth_scale=1,
-        depth_trunc=100)
+        depth_scale=1 / depth_scale,
+        depth_trunc=depth_trunc)
     return rgbd_image
 
 
@@ -89,7 +853,71 @@ def register_depthmap_to_world(
         depth_map: np.ndarray,
         color_img: np.ndarray = None,
         downsample_factor: float = 0.1,
-        blender_conform: bool = True):
+        blender_conform: bool = True,
+        sampling: str = "random",
+        seed: int = 0,
+        depth_near: float = 0.0,
+        depth_far: float = np.inf,
+        stats: dict = None,
+        depth_scale: float = 1.0,
+        distortion_aware: bool = False,
+        estimate_normals: bool = False,
+        normal_max_depth_ratio: float = 0.05,
+        crop_box=None):
+    """Registers a depth map and an optional color image as point cloud
+    in the world coordinate system of the camera extrinsics. Invalid
+    depth values are masked and the pixels to keep are chosen on the
+    depth map before projection, see valid_depth_mask and
+    sample_pixels, so only the kept points are projected and converted.
+    Depth maps are used in their stored type, e.g. uint16 millimeters
+    with depth_scale 0.001 or float16, without a metric float32 copy.
+
+    :param camera: Camera instance with intrinsics and extrinsics
+    :type camera: Camera
+    :param depth_map: depth map
+    :type depth_map: np.ndarray
+    :param color_img: color or grayscale image, defaults to None
+    :type color_img: np.ndarray, optional
+    :param downsample_factor: fraction of pixels to keep, defaults to 0.1
+    :type downsample_factor: float, optional
+    :param blender_conform: project into the Blender world conventions,
+        otherwise Open3D's RGBD projection is used, defaults to True
+    :type blender_conform: bool, optional
+    :param sampling: sampling mode, see SAMPLING_MODES,
+        defaults to "random"
+    :type sampling: str, optional
+    :param seed: random seed of the sampling, defaults to 0
+    :type seed: int, optional
+    :param depth_near: depths <= depth_near are masked, defaults to 0.0
+    :type depth_near: float, optional
+    :param depth_far: depths > depth_far are masked, defaults to inf
+    :type depth_far: float, optional
+    :param stats: if a dict is passed, the number of total_pixels,
+        masked_pixels and points is stored, defaults to None
+    :type stats: dict, optional
+    :param depth_scale: meters per depth unit, defaults to 1.0
+    :type depth_scale: float, optional
+    :param distortion_aware: the depth map is in the distorted image
+        space of the sensor, rays are corrected with a cached lookup
+        table instead of undistorting the color image, defaults to False
+    :type distortion_aware: bool, optional
+    :param estimate_normals: attach normals of the organized depth grid,
+        see estimate_grid_normals. Points without a valid normal, e.g.
+        isolated by depth discontinuities, are kept with a zero normal,
+        defaults to False
+    :type estimate_normals: bool, optional
+    :param normal_max_depth_ratio: maximum relative depth difference of
+        neighboring pixels, defaults to 0.05
+    :type normal_max_depth_ratio: float, optional
+    :param crop_box: world space crop box in the conventions of
+        blender_conform, see as_crop_box. Rows, columns and depths
+        outside of its camera space window are masked before
+        projection, the projected points are cropped exactly before
+        the point cloud is created, defaults to None
+    :type crop_box: o3d.geometry.OrientedBoundingBox, optional
+    :return: point cloud
+    :rtype: o3d.geometry.PointCloud
+    """
 
     assert camera.image_size is not None
     assert camera.fx is not None
@@ -98,8 +926,70 @@ def register_depthmap_to_world(
     assert camera.cy is not None
     assert camera.RT is not None
 
-    if blender_conform:
-        pcd = project_3d_blender_conform(depth_map, color_img, camera)
+    box = None
+    if crop_box is None:
+        valid = valid_depth_mask(
+            depth_map, near=depth_near, far=depth_far,
+            depth_scale=depth_scale)
+    else:
+        box = as_crop_box(crop_box, blender_conform)
+        rows, cols, (near, far) = crop_box_window(
+            box, camera, depth_map.shape, distortion_aware)
+        # slightly widened, the exact test is done on the points
+        valid = valid_depth_mask(
+            depth_map,
+            near=max(depth_near, near * (1 - 1e-6)),
+            far=min(depth_far, far * (1 + 1e-6)),
+            depth_scale=depth_scale)
+        window = np.zeros(depth_map.shape[:2], dtype=bool)
+        window[rows, cols] = True
+        valid &= window.reshape(-1)
+    if downsample_factor != 1.0:
+        pixel_indices = sample_pixels(
+            depth_map, downsample_factor, mode=sampling, seed=seed,
+            valid=valid)
+    else:
+        pixel_indices = np.flatnonzero(valid)
+    if stats is not None:
+        stats["total_pixels"] = valid.size
+        stats["masked_pixels"] = valid.size - np.count_nonzero(valid)
+        stats["points"] = len(pixel_indices)
+
+    normals = None
+    if estimate_normals:
+        normals, normal_valid = estimate_grid_normals(
+            depth_map, camera, pixel_indices, normal_max_depth_ratio,
+            distortion_aware)
+        if stats is not None:
+            stats["discontinuity_pixels"] = \
+                len(normal_valid) - np.count_nonzero(normal_valid)
+
+    if blender_conform or distortion_aware or estimate_normals or \
+            box is not None:
+        points = backproject_depth(
+            depth_map, camera, pixel_indices=pixel_indices,
+            depth_scale=depth_scale, distortion_aware=distortion_aware)
+        if box is not None:
+            inside = points_in_box(points, box)
+            points = points[inside]
+            pixel_indices = pixel_indices[inside]
+            if normals is not None:
+                normals = normals[inside]
+            if stats is not None:
+                stats["cropped_pixels"] = \
+                    stats["points"] - len(pixel_indices)
+                stats["points"] = len(pixel_indices)
+        colors = color_values(
+            color_img, camera, depth_map.shape,
+            pixel_indices=pixel_indices, distortion_aware=distortion_aware)
+        pcd = points_to_pointcloud(points, colors)
+        if normals is not None:
+            pcd.normals = o3d.utility.Vector3dVector(
+                normals.astype(np.float64))
+        if not blender_conform:
+            # Open3D only supports pinhole cameras, its world coordinates
+            # are the Blender conform ones with flipped y and z axes
+            pcd.transform(np.diag([1.0, -1.0, -1.0, 1.0]))
     else:
         o3d_cam = o3d.camera.PinholeCameraIntrinsic(
             width=camera.image_size[1],
@@ -108,13 +998,15 @@ def register_depthmap_to_world(
             fy=camera.fy,
             cx=camera.cx,
             cy=camera.cy)
-        rgbd = load_as_rgbd(camera, depth_map, color_img)
+        # pixels with zero depth are skipped by Open3D
+        sampled = np.zeros_like(depth_map)
+        sampled.flat[pixel_indices] = depth_map.flat[pixel_indices]
+        rgbd = load_as_rgbd(
+            camera, sampled, color_img, depth_far, depth_scale)
         pcd = o3d.geometry.PointCloud.create_from_rgbd_image(
             rgbd,
             o3d_cam,
             camera.RT)
-    if downsample_factor != 1.0:
-        pcd = pcd.random_down_sample(downsample_factor)
     return pcd
 
 
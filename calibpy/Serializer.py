@@ -5,12 +5,18 @@
 """
 import json
 import yaml
+import base64
 import pickle
 import tempfile
 import numpy as np
 from pathlib import Path
 
 
+# the LibYAML bindings are much faster than the pure Python classes
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
 class Serializer:
     """
     Base class for objects that needs to be serializable. When
@@ -18,8 +24,18 @@ class Serializer:
     serialize and load, which allow to serialize all protected
     class attributes as dictionary and as .npy file. The latter
     can be used to instantiate the class from file.
+
+    In .yaml and .json files, arrays with up to TXT_ARRAY_SIZE elements
+    are written as nested lists, larger arrays as base64 encoded blocks
+    of their little endian bytes. If TXT_SIDECAR_BYTES is set, arrays
+    of at least that many bytes are written to .npy sidecar files next
+    to the text file instead. Each value keeps its type, arrays keep
+    their dtype and shape.
     """
 
+    TXT_ARRAY_SIZE = 64
+    TXT_SIDECAR_BYTES = None
+
     def __str__(self):
         string = f"{self.__class__.__name__}:\n"
         string += "-----------------------------------\n"
@@ -53,20 +69,23 @@ class Serializer:
             self.write(filename, data)
         return data
 
-    def load(self, filename: str):
+    def load(self, filename: str, allow_pickle: bool = True):
         """
         load attributes from file, supported are 
         pickle .npy files, .yaml and .json files
 
         :param filename: filename
         :type filename: str
+        :param allow_pickle: allow loading pickled .npy files, which can
+            execute arbitrary code, defaults to True
+        :type allow_pickle: bool, optional
         """
         if isinstance(filename, str):
             filename = Path(filename)
         assert isinstance(filename, Path)
         assert filename.is_file()
         if filename.suffix == ".npy":
-            self._load_npy(filename)
+            self._load_npy(filename, allow_pickle)
         elif filename.suffix == ".yaml":
             self._load_yaml(filename)
         elif filename.suffix == ".json":
@@ -123,9 +142,9 @@ class Serializer:
         :param data: input data dict
         :type data: dict
         """
+        data = self._make_txt_dumpable(data, filename)
         with filename.open(mode="w") as f:
-            data = Serializer._make_txt_dumpable(data)
-            yaml.dump(data, f)
+            yaml.dump(data, f, Dumper=YAML_DUMPER, sort_keys=False)
             print(f"File {str(filename)} saved")
 
     def _write_json(self, filename: Path, data: dict):
@@ -136,18 +155,25 @@ class Serializer:
         :param data: input data dict
         :type data: dict
         """
+        data = self._make_txt_dumpable(data, filename)
         with filename.open(mode="w") as f:
-            data = Serializer._make_txt_dumpable(data)
             json.dump(data, f)
             print(f"File {str(filename)} saved")
 
-    def _load_npy(self, filename: Path):
+    def _load_npy(self, filename: Path, allow_pickle: bool = True):
         """Loads a .npy file and creates a class attribute
         for each entry in the dictionary loaded.
 
         :param filename: dump file filename
         :type filename: Path
+        :param allow_pickle: allow unpickling the file, defaults to True
+        :type allow_pickle: bool, optional
+        :raises IOError: if allow_pickle is False
         """
+        if not allow_pickle:
+            raise IOError(
+                f"{filename} is a pickled file, it is only loaded with "
+                "allow_pickle=True, use it for trusted files only")
         with filename.open(mode="rb") as f:
             data = pickle.load(f)
         self.from_dict(data)
@@ -160,8 +186,9 @@ class Serializer:
         :type filename: Path
         """
         with filename.open(mode="rb") as f:
-            data = yaml.safe_load(f)
-        self.from_dict(Serializer.convert_from_dumped(data))
+            data = yaml.load(f, Loader=YAML_LOADER)
+        self.from_dict(
+            Serializer.convert_from_dumped(data, filename.parent))
 
     def _load_json(self, filename: Path):
         """Loads a .json file and creates a class attribute
@@ -172,27 +199,103 @@ class Serializer:
         """
         with filename.open(mode="rb") as f:
             data = json.load(f)
-        self.from_dict(Serializer.convert_from_dumped(data))
+        self.from_dict(
+            Serializer.convert_from_dumped(data, filename.parent))
 
-    @staticmethod
-    def _make_txt_dumpable(data: dict):
+    def _make_txt_dumpable(self, data: dict, filename: Path = None):
+        """Converts the values to types supported by the text formats.
+        Each value is stored with its type, arrays with dtype and shape,
+        see class description.
+
+        :param data: input data dict
+        :type data: dict
+        :param filename: text file the sidecar files are named after,
+            defaults to None (no sidecar files)
+        :type filename: Path, optional
+        :return: dumpable dict
+        :rtype: dict
+        """
         out = {}
         for key, val in data.items():
-            out_val_props = {}
-            if type(val) == np.ndarray:
-                out_val_props["value"] = val.tolist()
+            out_val_props = {"type": str(type(val))}
+            if isinstance(val, np.ndarray):
+                out_val_props.update(
+                    self._dump_array(key, val, filename))
+            elif isinstance(val, np.generic):
+                out_val_props["dtype"] = val.dtype.str
+                out_val_props["value"] = val.item()
             else:
-                out_val_props["value"] = val
-            out_val_props["type"] = str(type(val))
+                out_val_props["value"] = Serializer._to_builtin(val)
             out[key] = out_val_props
         return out
 
+    def _dump_array(self, key: str, val: np.ndarray, filename: Path):
+        props = {"dtype": val.dtype.str, "shape": list(val.shape)}
+        if val.dtype.hasobject or val.size <= self.TXT_ARRAY_SIZE:
+            props["value"] = Serializer._to_builtin(val)
+        elif self.TXT_SIDECAR_BYTES is not None and filename is not None \
+                and val.nbytes >= self.TXT_SIDECAR_BYTES:
+            sidecar = filename.with_name(f"{filename.stem}.{key}.npy")
+            np.save(sidecar, val, allow_pickle=False)
+            props["file"] = sidecar.name
+        else:
+            val = val.astype(val.dtype.newbyteorder("<"), copy=False)
+            props["dtype"] = val.dtype.str
+            props["base64"] = base64.b64encode(
+                np.ascontiguousarray(val).tobytes()).decode("ascii")
+        return props
+
     @staticmethod
-    def convert_from_dumped(data: dict):
-        data = {}
+    def _to_builtin(val):
+        # nested Python types, tuples become lists
+        if isinstance(val, (np.ndarray, np.generic)):
+            return val.tolist()
+        if isinstance(val, (list, tuple)):
+            return [Serializer._to_builtin(x) for x in val]
+        if isinstance(val, dict):
+            return {k: Serializer._to_builtin(x) for k, x in val.items()}
+        return val
+
+    @staticmethod
+    def convert_from_dumped(data: dict, directory: Path = None) -> dict:
+        """Restores the values of a dict written by _make_txt_dumpable
+
+        :param data: loaded text file dict
+        :type data: dict
+        :param directory: directory of sidecar files, defaults to None
+            (current working directory)
+        :type directory: Path, optional
+        :raises IOError: if a sidecar file is missing
+        :return: dict with the original types
+        :rtype: dict
+        """
+        directory = Path.cwd() if directory is None else Path(directory)
+        out = {}
         for key, val in data.items():
-            if val["type"] == str(type(np.array())):
-                data[key] = np.array(val["value"])
+            if val["type"] == str(np.ndarray):
+                out[key] = Serializer._load_array(val, directory)
+            elif "dtype" in val:
+                out[key] = np.dtype(val["dtype"]).type(val["value"])
+            elif val["type"] == str(tuple):
+                out[key] = tuple(val["value"])
             else:
-                data[key] = val["value"]
-        return data
+                out[key] = val["value"]
+        return out
+
+    @staticmethod
+    def _load_array(val: dict, directory: Path) -> np.ndarray:
+        if "file" in val:
+            sidecar = directory / val["file"]
+            if not sidecar.is_file():
+                raise IOError(f"Missing array file {sidecar}")
+            return np.load(sidecar, allow_pickle=False)
+        if "dtype" not in val:
+            # files of former versions
+            return np.array(val["value"])
+        dtype = np.dtype(val["dtype"])
+        shape = tuple(val["shape"])
+        if "base64" in val:
+            return np.frombuffer(
+                base64.b64decode(val["base64"]), dtype=dtype
+            ).reshape(shape).astype(dtype.newbyteorder("="))
+        return np.array(val["value"], dtype=dtype).reshape(shape)
@@ -6,6 +6,7 @@
 
 import yaml
 from pathlib import Path
+from calibpy.Serializer import YAML_LOADER
 
 
 class Settings:
@@ -127,7 +128,7 @@ class Settings:
         assert fname.suffix == ".yaml"
         with fname.open() as f:
             try:
-                cfg = yaml.safe_load(f)
+                cfg = yaml.load(f, Loader=YAML_LOADER)
             except yaml.YAMLError as exc:
                 print(exc)
         self.from_params(cfg)
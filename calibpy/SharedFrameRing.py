@@ -0,0 +1,267 @@
+"""
+:Copyrights: Artificial Pixels
+:Author: Sven Wanner (artificial.pixels@gmail.com)
+:Sponsor: SpexAI GmbH
+"""
+
+import os
+import queue
+import atexit
+import weakref
+import numpy as np
+from collections import namedtuple
+from multiprocessing import shared_memory
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    wait,
+    FIRST_COMPLETED)
+from calibpy.Stream import Stream
+
+
+# Handle of a frame inside a SharedFrameRing. This is all that is sent
+# to a worker process, the pixel data stays in shared memory.
+FrameSlot = namedtuple(
+    "FrameSlot", ["shm_name", "slot", "offset", "shape", "dtype"])
+
+# shared memory segments attached by the current (worker) process
+# and the frame views handed out per segment. NumPy arrays don't lock
+# the buffer they view, closing a segment with live views would crash.
+_ATTACHED = {}
+_VIEWS = {}
+
+
+def close_attached(keep: str = None):
+    """Close the shared memory segments attached by attach_frame in
+    the current process. Segments with frame views still alive stay
+    attached and are closed by a later call.
+
+    :param keep: name of a segment to keep attached, defaults to None
+    :type keep: str, optional
+    """
+    for name in list(_ATTACHED.keys()):
+        if name == keep or any(ref() is not None for ref in _VIEWS[name]):
+            continue
+        _ATTACHED.pop(name).close()
+        del _VIEWS[name]
+
+
+atexit.register(close_attached)
+
+
+def attach_frame(handle: FrameSlot) -> np.ndarray:
+    """Get a read only view of a frame in shared memory. The shared
+    memory segment is attached once per process and reused for all
+    subsequent frames of the same ring. Handles of a new ring detach
+    the segments of former rings, which are closed by then.
+
+    :param handle: frame slot handle
+    :type handle: FrameSlot
+    :return: frame view
+    :rtype: np.ndarray
+    """
+    shm = _ATTACHED.get(handle.shm_name)
+    if shm is None:
+        close_attached()
+        shm = shared_memory.SharedMemory(name=handle.shm_name)
+        _ATTACHED[handle.shm_name] = shm
+        _VIEWS[handle.shm_name] = []
+    frame = np.ndarray(
+        handle.shape,
+        dtype=np.dtype(handle.dtype),
+        buffer=shm.buf,
+        offset=handle.offset)
+    frame.flags.writeable = False
+    # views derived from the frame keep it alive via their base
+    views = [ref for ref in _VIEWS[handle.shm_name] if ref() is not None]
+    views.append(weakref.ref(frame))
+    _VIEWS[handle.shm_name] = views
+    return frame
+
+
+def _run_on_slot(func, handle: FrameSlot):
+    return func(attach_frame(handle))
+
+
+def _release_shm(shm: shared_memory.SharedMemory):
+    try:
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class SharedFrameRing:
+    """Ring of fixed size frame slots in a single shared memory segment.
+    A producer copies decoded frames into free slots and passes only
+    FrameSlot handles to worker processes, which map the frames
+    without pickling pixel data. A slot is recycled once its result
+    was acknowledged via release. The segment is unlinked on close,
+    when leaving the with block or, at the latest, on garbage
+    collection or interpreter shutdown.
+    """
+
+    def __init__(self, num_slots: int, slot_nbytes: int):
+        """
+        :param num_slots: number of frame slots
+        :type num_slots: int
+        :param slot_nbytes: size of a single slot in bytes
+        :type slot_nbytes: int
+        """
+        assert num_slots > 0
+        assert slot_nbytes > 0
+        self._num_slots = num_slots
+        self._slot_nbytes = slot_nbytes
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=num_slots * slot_nbytes)
+        self._finalizer = weakref.finalize(self, _release_shm, self._shm)
+        self._free = queue.Queue()
+        for slot in range(num_slots):
+            self._free.put(slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def num_slots(self):
+        return self._num_slots
+
+    @property
+    def slot_nbytes(self):
+        return self._slot_nbytes
+
+    @property
+    def num_free(self):
+        return self._free.qsize()
+
+    @property
+    def is_closed(self):
+        return not self._finalizer.alive
+
+    def close(self):
+        """Close and unlink the shared memory segment
+        """
+        self._finalizer()
+
+    def put(self, frame: np.ndarray, timeout: float = None) -> FrameSlot:
+        """Copy a frame into the next free slot. Blocks until a slot
+        is released if all slots are in use.
+
+        :param frame: frame
+        :type frame: np.ndarray
+        :param timeout: maximum time to wait for a slot in seconds,
+            defaults to None (wait forever)
+        :type timeout: float, optional
+        :raises ValueError: if the frame does not fit into a slot
+        :raises queue.Empty: if no slot was released within timeout
+        :return: frame slot handle
+        :rtype: FrameSlot
+        """
+        assert not self.is_closed
+        frame = np.asarray(frame)
+        if frame.nbytes > self._slot_nbytes:
+            raise ValueError(
+                f"Frame of {frame.nbytes} bytes does not fit into "
+                f"slots of {self._slot_nbytes} bytes")
+        slot = self._free.get(timeout=timeout)
+        offset = slot * self._slot_nbytes
+        view = np.ndarray(
+            frame.shape, dtype=frame.dtype,
+            buffer=self._shm.buf, offset=offset)
+        view[...] = frame
+        return FrameSlot(
+            self._shm.name, slot, offset, frame.shape, frame.dtype.str)
+
+    def get(self, handle: FrameSlot) -> np.ndarray:
+        """Read only view of a frame slot in the producer process. All
+        views must be dropped before the ring is closed.
+
+        :param handle: frame slot handle
+        :type handle: FrameSlot
+        :return: frame view
+        :rtype: np.ndarray
+        """
+        frame = np.ndarray(
+            handle.shape, dtype=np.dtype(handle.dtype),
+            buffer=self._shm.buf, offset=handle.offset)
+        frame.flags.writeable = False
+        return frame
+
+    def release(self, handle: FrameSlot):
+        """Acknowledge a frame and recycle its slot
+
+        :param handle: frame slot handle
+        :type handle: FrameSlot
+        """
+        self._free.put(handle.slot)
+
+
+def process_stream(
+        stream: Stream,
+        func,
+        processes: int = None,
+        num_slots: int = None,
+        **read_kwargs):
+    """Apply func to all frames of a stream in a process pool, frames
+    are transported to the workers via a SharedFrameRing. The slot
+    size is taken from the first frame. func must be picklable, i.e.
+    a module level function, and receives a read only frame view.
+    Results are yielded as they complete. If the iteration is stopped
+    early, pending frames are cancelled and running ones awaited
+    before the ring is unlinked.
+
+    :param stream: initialized Stream instance
+    :type stream: Stream
+    :param func: function applied to each frame
+    :type func: callable
+    :param processes: number of worker processes, defaults to None
+        (number of cpus)
+    :type processes: int, optional
+    :param num_slots: number of frame slots, defaults to None
+        (twice the number of workers)
+    :type num_slots: int, optional
+    :param read_kwargs: keyword arguments passed to stream.read
+    :raises AssertionError: if a frame can't be read
+    :yield: frame index, result
+    :rtype: tuple
+    """
+    if stream.length <= 0:
+        return
+    first = stream.read(0, **read_kwargs)
+    assert first is not None, "Failed to read image(s)!"
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if num_slots is None:
+        num_slots = 2 * processes
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        with SharedFrameRing(num_slots, first.nbytes) as ring:
+            pending = {}
+            index = 0
+            try:
+                while index < stream.length or len(pending) > 0:
+                    while index < stream.length and ring.num_free > 0:
+                        frame = first if index == 0 else \
+                            stream.read(index, **read_kwargs)
+                        assert frame is not None, \
+                            f"Failed to read image(s) of frame {index}!"
+                        handle = ring.put(frame)
+                        future = pool.submit(_run_on_slot, func, handle)
+                        pending[future] = (index, handle)
+                        index += 1
+                    done, _ = wait(
+                        pending.keys(), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        frame_index, handle = pending.pop(future)
+                        ring.release(handle)
+                        yield frame_index, future.result()
+            finally:
+                # workers must not attach to an unlinked ring
+                for future in pending.keys():
+                    future.cancel()
+                wait(pending.keys())
@@ -1,18 +1,84 @@
 import os
 import cv2
+from concurrent.futures import ThreadPoolExecutor
 import Imath
 import numpy as np
 import OpenEXR as exr
 from pathlib import Path
 
 from abc import abstractmethod
+from calibpy.FrameIndex import (
+    FrameIndex,
+    STREAM_FILETYPES,
+    parse_frame_name)
 
 
-STREAM_FILETYPES = ["png", "jpg", "jpeg", "tif", "tiff", "exr"]
+# STREAM_FILETYPES moved to FrameIndex, it is re-exported here
+__all__ = [
+    "STREAM_FILETYPES",
+    "VIDEO_FILETYPES",
+    "is_video_file",
+    "sample_frames",
+    "Stream",
+    "FileStream",
+    "VideoStream",
+    "SynchronizedStream"]
+
+VIDEO_FILETYPES = ["mp4", "mkv", "avi", "mov"]
+
+
+def is_video_file(filename: str) -> bool:
+    """Check if a filename has a supported video file extension
+
+    :param filename: filename
+    :type filename: str
+    :return: True if filename is a video file
+    :rtype: bool
+    """
+    return str(filename).split(".")[-1].lower() in VIDEO_FILETYPES
+
+
+def sample_frames(
+        frames: list,
+        stride: int = 1,
+        num_frames: int = 0,
+        random_seed: int = None) -> list:
+    """Choose a subset of a frame list. First every stride-th frame is
+    taken, then, if num_frames is larger than 0, num_frames frames are
+    chosen evenly spread over the remaining frames or, if random_seed
+    is not None, randomly drawn using random_seed. The order of the
+    frames is preserved.
+
+    :param frames: frame list, e.g. filenames
+    :type frames: list
+    :param stride: frame stride, defaults to 1
+    :type stride: int, optional
+    :param num_frames: number of frames to choose, defaults to 0 (all)
+    :type num_frames: int, optional
+    :param random_seed: seed for random sampling, defaults to None
+    :type random_seed: int, optional
+    :return: frame subset
+    :rtype: list
+    """
+    assert stride >= 1
+    frames = frames[::stride]
+    if num_frames <= 0 or num_frames >= len(frames):
+        return frames
+    if random_seed is None:
+        indices = np.linspace(0, len(frames) - 1, num_frames)
+        indices = np.round(indices).astype(int)
+    else:
+        rng = np.random.default_rng(random_seed)
+        indices = np.sort(
+            rng.choice(len(frames), size=num_frames, replace=False))
+    return [frames[i] for i in indices]
 
 
 class Stream:
 
+    # True if read() may be called from several threads at once
+    concurrent_reads = False
+
     def __init__(self, is_looping=True):
 
         self._current_frame = -1
@@ -51,6 +117,21 @@ class Stream:
         raise NotImplementedError(
             "Please derive from this class and do not use it directly!")
 
+    def read(self, index: int, *args, **kwargs):
+        """Access an arbitrary frame like get, but without moving the
+        current_frame pointer. Streams that can decode several frames
+        at once override this method and set concurrent_reads to True.
+
+        :param index: frame pointer
+        :type index: int
+        :return: frame
+        """
+        current_frame = self._current_frame
+        try:
+            return self.get(index, *args, **kwargs)
+        finally:
+            self._current_frame = current_frame
+
 
 class FileStream(Stream):
     """Implementation of a Stream class that handles loading from file tasks.
@@ -59,9 +140,14 @@ class FileStream(Stream):
     initialize method for more details.
     """
 
+    concurrent_reads = True
+
     def __init__(self, is_looping=False):
         super().__init__(is_looping)
         self._filenames = []
+        self._frame_index = None    # FrameIndex if loaded from directory
+        self._prefix = None
+        self._suffix = None
 
     @property
     def length(self):
@@ -71,6 +157,24 @@ class FileStream(Stream):
     def filenames(self):
         return self._filenames
 
+    @property
+    def frame_index(self):
+        return self._frame_index
+
+    def filename_of_frame(self, frame: int) -> str:
+        """Look up the filename of a parsed frame number. This is
+        only available if the stream was initialized from a directory.
+
+        :param frame: frame number as parsed from the filename
+        :type frame: int
+        :return: filename or None if the frame does not exist
+        :rtype: str
+        """
+        if self._frame_index is None:
+            return None
+        return self._frame_index.filename_of(
+            frame, prefix=self._prefix, suffix=self._suffix)
+
     def current_filename(self) -> str:
         """Get the filename of the current frame
 
@@ -105,7 +209,9 @@ class FileStream(Stream):
     def exrchannel2numpy(
             filename: str,
             channel_name="R") -> np.ndarray:
-        """Loading a single channel from a .ext file.
+        """Loading a single channel from a .ext file. The channel is
+        returned in its stored pixel type, i.e. half-float channels as
+        float16, float channels as float32 and uint channels as uint32.
 
         :param filename: filename
         :type filename: str
@@ -116,37 +222,28 @@ class FileStream(Stream):
         """
         assert Path(filename).is_file
         file = exr.InputFile(filename)
-        dw = file.header()['dataWindow']
+        header = file.header()
+        dw = header['dataWindow']
         size = (dw.max.x - dw.min.x + 1, dw.max.y - dw.min.y + 1)
-        Float_Type = Imath.PixelType(Imath.PixelType.FLOAT)
-        channel_str = file.channel(channel_name, Float_Type)
+        pixel_type = header['channels'][channel_name].type
+        dtype = {
+            Imath.PixelType.HALF: np.float16,
+            Imath.PixelType.FLOAT: np.float32,
+            Imath.PixelType.UINT: np.uint32}[pixel_type.v]
+        channel_str = file.channel(channel_name, pixel_type)
         channel = np.frombuffer(
-            channel_str, dtype=np.float32).reshape(size[1], -1)
+            channel_str, dtype=dtype).reshape(size[1], -1)
         return (channel)
 
     @staticmethod
     def sort_filenames(filenames):
         def filename_splitter(filename):
-            name = Path(filename).name
-            name = str(name).split(".")[0]
-            if "_" not in name:
-                return int(name)
-            name_split = name.split("_")
-            if len(name_split) == 3:
-                return name_split[1]
-            elif len(name_split) == 2:
-                name = name_split[1]
-                try:
-                    num = int(name_split[1])
-                    return num
-                except ValueError:
-                    try:
-                        num = int(name_split[0])
-                        return num
-                    except ValueError:
-                        raise IOError(
-                            "Unknown naming convention! Expecting: 000x,\
-                            suffix_000x, 000x_prefix or suffix_000x_prefix")
+            frame = parse_frame_name(filename)[1]
+            if frame is None:
+                raise IOError(
+                    "Unknown naming convention! Expecting: 000x, "
+                    "suffix_000x, 000x_prefix or suffix_000x_prefix")
+            return frame
 
         filenames.sort(key=lambda x: filename_splitter(x))
         return filenames
@@ -155,38 +252,16 @@ class FileStream(Stream):
     def filenames_from_directory(
             dir: str,
             prefix: str = None,
-            suffix: str = None):
+            suffix: str = None,
+            use_sidecar: bool = True,
+            sidecar_directory: str = None):
         assert Path(dir).is_dir()
-
-        from glob import glob
-        filenames = []
-        for fname in glob(dir + os.sep + "*"):
-            if fname.split(".")[-1].lower() in STREAM_FILETYPES:
-                if suffix is None and prefix is None:
-                    filenames.append(fname)
-                    continue
-                if suffix is not None and prefix is not None:
-                    name = Path(fname).name
-                    name = name.split(".")[0]
-                    split = name.split("_")
-                    if len(split) == 3 and \
-                            split[0] == prefix and \
-                            split[-1] == suffix:
-                        filenames.append(fname)
-                elif suffix is not None:
-                    name = Path(fname).name
-                    name = str(name).split(".")[0]
-                    split = name.split("_")
-                    if len(split) > 1 and split[-1] == suffix:
-                        filenames.append(fname)
-                elif prefix is not None:
-                    name = Path(fname).name
-                    name = str(name).split(".")[0]
-                    split = name.split("_")
-                    if len(split) > 1 and split[0] == prefix:
-                        filenames.append(fname)
+        filenames = FrameIndex(
+            dir, use_sidecar=use_sidecar,
+            sidecar_directory=sidecar_directory).filenames(
+                prefix=prefix, suffix=suffix)
         assert len(filenames) > 0, f"No images found in {dir}"
-        return FileStream.sort_filenames(filenames)
+        return filenames
 
     def _from_list(self, filenames: list):
         assert isinstance(filenames, list)
@@ -199,18 +274,33 @@ class FileStream(Stream):
             from_frame: int,
             to_frame: int,
             prefix: str,
-            suffix: str):
+            suffix: str,
+            use_sidecar: bool = True,
+            sidecar_directory: str = None,
+            stride: int = 1,
+            num_frames: int = 0,
+            random_seed: int = None):
         if isinstance(directory, Path):
             directory = str(directory)
         assert isinstance(directory, str)
         assert Path(directory).is_dir()
         print("Load from dir: ", directory)
-        filenames = FileStream.filenames_from_directory(
-            directory, prefix=prefix, suffix=suffix)
+        self._frame_index = FrameIndex(
+            directory, use_sidecar=use_sidecar,
+            sidecar_directory=sidecar_directory)
+        self._prefix = prefix
+        self._suffix = suffix
+        filenames = self._frame_index.filenames(prefix=prefix, suffix=suffix)
+        assert len(filenames) > 0, f"No images found in {directory}"
         if from_frame > 0:
             filenames = filenames[from_frame:]
         if to_frame > from_frame:
             filenames = filenames[:to_frame-from_frame]
+        filenames = sample_frames(
+            filenames,
+            stride=stride,
+            num_frames=num_frames,
+            random_seed=random_seed)
         self._from_list(filenames)
 
     def _from_filename(self, filename):
@@ -229,6 +319,11 @@ class FileStream(Stream):
                 to_frame = 0
                 prefix = None
                 suffix = None
+                use_sidecar = True
+                sidecar_directory = None
+                stride = 1
+                num_frames = 0
+                random_seed = None
                 if "from_frame" in kwargs.keys():
                     from_frame = kwargs["from_frame"]
                 if "to_frame" in kwargs.keys():
@@ -237,12 +332,27 @@ class FileStream(Stream):
                     prefix = kwargs["prefix"]
                 if "suffix" in kwargs.keys():
                     suffix = kwargs["suffix"]
+                if "use_sidecar" in kwargs.keys():
+                    use_sidecar = kwargs["use_sidecar"]
+                if "sidecar_directory" in kwargs.keys():
+                    sidecar_directory = kwargs["sidecar_directory"]
+                if "stride" in kwargs.keys():
+                    stride = kwargs["stride"]
+                if "num_frames" in kwargs.keys():
+                    num_frames = kwargs["num_frames"]
+                if "random_seed" in kwargs.keys():
+                    random_seed = kwargs["random_seed"]
                 self._from_dir(
                     directory=kwargs["directory"],
                     from_frame=from_frame,
                     to_frame=to_frame,
                     prefix=prefix,
-                    suffix=suffix)
+                    suffix=suffix,
+                    use_sidecar=use_sidecar,
+                    sidecar_directory=sidecar_directory,
+                    stride=stride,
+                    num_frames=num_frames,
+                    random_seed=random_seed)
                 if len(self._filenames) > 0:
                     return True
         elif "filename" in kwargs.keys():
@@ -283,6 +393,25 @@ class FileStream(Stream):
             return FileStream.load_image(fname, flag)
         return None
 
+    def read(self, index: int, *args, **kwargs) -> np.ndarray:
+        """Load an arbitrary frame without moving the current_frame
+        pointer. This method is thread safe. If the index passed is out
+        of range, None is returned. An additional parameter is flag to
+        specify the opencv imread flag. Default value is
+        cv2.IMREAD_GRAYSCALE
+
+        :param index: frame pointer
+        :type index: int
+        :return: image
+        :rtype: np.ndarray
+        """
+        flag = cv2.IMREAD_GRAYSCALE
+        if "flag" in kwargs.keys():
+            flag = kwargs["flag"]
+        if 0 <= index < self.length:
+            return FileStream.load_image(self._filenames[index], flag)
+        return None
+
     def next(self, *args, **kwargs) -> np.ndarray:
         """Function returns the next image from the streams buffer.
         If the buffer is empty and is_looping is set to True, the buffer 
@@ -305,3 +434,483 @@ class FileStream(Stream):
                 return None
         fname = self._filenames[self._current_frame]
         return FileStream.load_image(fname, flag)
+
+
+class VideoStream(Stream):
+    """Implementation of a Stream class reading frames from a video file
+    using cv2.VideoCapture. A frame range and a frame stride can be set
+    on initialize. Sequential next() calls decode the video in order
+    without seeking, skipped frames are only grabbed and not decoded.
+    get(index) seeks only if the requested frame is not the next one.
+    """
+
+    def __init__(self, is_looping=False, grayscale=True):
+        super().__init__(is_looping)
+        self._filename = None
+        self._capture = None
+        self._from_frame = 0
+        self._stride = 1
+        self._length = 0
+        self._grayscale = grayscale
+        self._position = 0          # video frame the capture reads next
+
+    def __del__(self):
+        self.release()
+
+    @property
+    def length(self):
+        return self._length
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def stride(self):
+        return self._stride
+
+    def release(self):
+        """Release the underlying cv2.VideoCapture
+        """
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+    def frame_number(self, index: int) -> int:
+        """Video frame number of a stream index
+
+        :param index: stream index
+        :type index: int
+        :return: frame number in the video file
+        :rtype: int
+        """
+        return self._from_frame + index * self._stride
+
+    def current_filename(self) -> str:
+        """Get a pseudo filename of the current frame. The name follows
+        the prefix_000x convention: <video stem>_<frame number>.png,
+        placed next to the video file.
+
+        :return: filename
+        :rtype: str
+        """
+        if self._current_frame >= 0 and self._current_frame < self.length:
+            path = Path(self._filename)
+            frame = self.frame_number(self._current_frame)
+            return str(path.parent / f"{path.stem}_{frame:06d}.png")
+        return None
+
+    def initialize(self, *args, **kwargs) -> bool:
+        """Open a video file. Supported keyword arguments are filename,
+        from_frame, to_frame (exclusive, 0 means until the end), stride
+        and grayscale. Seeking to random frames is slow, thus frames
+        can't be sampled by num_frames and random_seed. If the container
+        doesn't report its frame count, the frames are counted by
+        reading the video once.
+
+        :raises ValueError: if num_frames is passed
+
+        :return: True if the video could be opened and has frames
+        :rtype: bool
+        """
+        print("Initialize VideoStream:")
+        if "filename" not in kwargs.keys():
+            return False
+        filename = kwargs["filename"]
+        if isinstance(filename, Path):
+            filename = str(filename)
+        assert isinstance(filename, str)
+        assert Path(filename).is_file()
+        from_frame = 0
+        to_frame = 0
+        stride = 1
+        if "from_frame" in kwargs.keys():
+            from_frame = kwargs["from_frame"]
+        if "to_frame" in kwargs.keys():
+            to_frame = kwargs["to_frame"]
+        if "stride" in kwargs.keys():
+            stride = kwargs["stride"]
+        if "grayscale" in kwargs.keys():
+            self._grayscale = kwargs["grayscale"]
+        assert stride >= 1
+        if kwargs.get("num_frames", 0) > 0:
+            raise ValueError(
+                "num_frames and random_seed are not supported by "
+                "VideoStream, use stride")
+
+        self.release()
+        print("Load video from file: ", filename)
+        self._capture = cv2.VideoCapture(filename)
+        if not self._capture.isOpened():
+            self._capture = None
+            return False
+        self._filename = filename
+        num_frames = int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if num_frames <= 0:
+            print("Unknown frame count, counting the frames of ", filename)
+            num_frames = self._count_frames()
+        if to_frame > from_frame:
+            num_frames = min(num_frames, to_frame)
+        self._from_frame = from_frame
+        self._stride = stride
+        self._length = max(0, (num_frames - from_frame + stride - 1) // stride)
+        self._position = 0
+        self.reset()
+        return self._length > 0
+
+    def _count_frames(self) -> int:
+        """Count the frames by grabbing all of them with a separate
+        capture, seeking back is unreliable for containers without
+        frame count
+
+        :return: number of frames
+        :rtype: int
+        """
+        capture = cv2.VideoCapture(self._filename)
+        num_frames = 0
+        while capture.grab():
+            num_frames += 1
+        capture.release()
+        return num_frames
+
+    def _grayscale_from_flag(self, kwargs) -> bool:
+        if "flag" in kwargs.keys():
+            return kwargs["flag"] == cv2.IMREAD_GRAYSCALE
+        return self._grayscale
+
+    def _read(self, index: int, grayscale: bool) -> np.ndarray:
+        frame = self.frame_number(index)
+        gap = frame - self._position
+        # short forward gaps (stride) are cheaper to grab than to seek
+        if gap < 0 or gap >= self._stride:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, frame)
+            self._position = frame
+        while self._position < frame:
+            self._capture.grab()
+            self._position += 1
+        success, img = self._capture.read()
+        if not success:
+            return None
+        self._position += 1
+        if grayscale and img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return img
+
+    def get(self, index: int = None, *args, **kwargs) -> np.ndarray:
+        """Access an arbitrary frame of the stream. If the index
+        passed is out of range, None is returned. If the index is None,
+        the frame at the current_frame pointer is returned. An optional
+        flag keyword selects grayscale (cv2.IMREAD_GRAYSCALE) or BGR
+        output, by default the grayscale setting of the stream is used.
+
+        :param index: frame pointer
+        :type index: int
+        :return: image
+        :rtype: np.ndarray
+        """
+        if self.length <= 0:
+            return None
+        if index is None:
+            index = self._current_frame
+        if 0 <= index < self.length:
+            self._current_frame = index
+            return self._read(index, self._grayscale_from_flag(kwargs))
+        return None
+
+    def next(self, *args, **kwargs) -> np.ndarray:
+        """Function returns the next frame of the video. If the end is
+        reached and is_looping is set to True, the stream starts over,
+        otherwise None is returned.
+
+        :return: image
+        :rtype: np.ndarray
+        """
+        if self.length <= 0:
+            return None
+        self._current_frame += 1
+        if self.current_frame >= self.length:
+            if self._is_looping:
+                self._current_frame = 0
+            else:
+                return None
+        return self._read(
+            self._current_frame, self._grayscale_from_flag(kwargs))
+
+
+class SynchronizedStream(Stream):
+    """Stream pairing color frames, depth frames and extrinsic cameras
+    by their parsed frame number, see FrameIndex for the supported
+    naming conventions. Each step yields a tuple (color, depth, camera).
+    Color images are loaded as RGB, depth maps unchanged (e.g. float
+    .exr or 16 bit .png). Frames missing in one of the modalities are
+    skipped and reported. Upcoming frames are decoded in a background
+    thread pool, both modalities in parallel.
+    """
+
+    def __init__(self, is_looping=False, prefetch=4, num_workers=4):
+        super().__init__(is_looping)
+        self._frames = []           # synchronized frame numbers
+        self._depth_filenames = {}  # frame -> filename
+        self._color_filenames = {}  # frame -> filename
+        self._cameras = {}          # frame -> Camera
+        self._report = {}           # missing frames per modality
+        self._prefetch = prefetch
+        self._num_workers = num_workers
+        self._executor = None
+        self._pending = {}          # index -> (color future, depth future)
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def length(self):
+        return len(self._frames)
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def report(self):
+        return self._report
+
+    def frame_number(self, index: int) -> int:
+        """Parsed frame number of a stream index
+
+        :param index: stream index
+        :type index: int
+        :return: frame number
+        :rtype: int
+        """
+        return self._frames[index]
+
+    def current_filename(self) -> str:
+        """Get the depth filename of the current frame
+
+        :return: filename
+        :rtype: str
+        """
+        if self._current_frame >= 0 and self._current_frame < self.length:
+            return self._depth_filenames[self._frames[self._current_frame]]
+        return None
+
+    def close(self):
+        """Shut down the prefetch thread pool
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._pending = {}
+
+    def reset(self):
+        super().reset()
+        self._pending = {}
+
+    @staticmethod
+    def _frame_map(
+            directory: str,
+            prefix: str = None,
+            suffix: str = None) -> dict:
+        index = FrameIndex(directory)
+        frame_map = {}
+        for name, frame, x_prefix, x_suffix, _, _ in index.entries:
+            if frame is None or \
+                    (prefix is not None and x_prefix != prefix) or \
+                    (suffix is not None and x_suffix != suffix):
+                continue
+            if frame in frame_map:
+                raise IOError(
+                    f"Frame {frame} is ambiguous in {directory}: "
+                    f"{Path(frame_map[frame]).name} and {name}, "
+                    "pass the filename prefix and/or suffix")
+            frame_map[frame] = os.path.join(index.directory, name)
+        return frame_map
+
+    @staticmethod
+    def _camera_map(extrinsics: list, frames: list) -> dict:
+        if isinstance(extrinsics, dict):
+            return dict(extrinsics)
+        cameras = {}
+        for cam in extrinsics:
+            frame = parse_frame_name(str(cam.name))[1]
+            if frame is None:
+                print("Extrinsics without frame numbers in their names, "
+                      "falling back to the frame order")
+                return dict(zip(frames, extrinsics))
+            cameras[frame] = cam
+        return cameras
+
+    def initialize(self, *args, **kwargs) -> bool:
+        """Synchronize the frames of a depth directory with a color
+        directory and/or a list of extrinsic cameras. Supported keyword
+        arguments are depth_directory, color_directory, extrinsics
+        (list of Camera instances named by their frame or a dict
+        frame -> Camera), from_frame/to_frame, which choose a subset
+        of the depth directory content, and stride, num_frames and
+        random_seed, see sample_frames. Instead of these, frames can
+        pass the frame numbers to synchronize, e.g. those of extrinsics
+        sampled before, so frames are not sampled twice. If a directory
+        holds several files per frame, e.g. color_0001.png and
+        mask_0001.png, the files are chosen by depth_prefix/depth_suffix
+        and color_prefix/color_suffix.
+
+        :raises IOError: if a frame maps to several files
+        :raises ValueError: if frames is combined with sampling
+        :return: True if at least one synchronized frame exists
+        :rtype: bool
+        """
+        print("Initialize SynchronizedStream:")
+        assert "depth_directory" in kwargs.keys()
+        color_directory = kwargs.get("color_directory")
+        extrinsics = kwargs.get("extrinsics")
+        from_frame = kwargs.get("from_frame", 0)
+        to_frame = kwargs.get("to_frame", 0)
+        stride = kwargs.get("stride", 1)
+        num_frames = kwargs.get("num_frames", 0)
+        random_seed = kwargs.get("random_seed")
+        subset = kwargs.get("frames")
+        if subset is not None and (
+                from_frame > 0 or to_frame > 0 or stride > 1 or
+                num_frames > 0):
+            raise ValueError(
+                "frames can't be combined with from_frame, to_frame, "
+                "stride or num_frames")
+
+        self.close()
+        self._depth_filenames = SynchronizedStream._frame_map(
+            kwargs["depth_directory"],
+            prefix=kwargs.get("depth_prefix"),
+            suffix=kwargs.get("depth_suffix"))
+        self._color_filenames = {}
+        self._cameras = {}
+        self._report = {
+            "missing_depth": set(),
+            "missing_color": set(),
+            "missing_extrinsics": set()}
+        depth_frames = sorted(self._depth_filenames.keys())
+        if subset is not None:
+            # frames chosen before, e.g. those of sampled extrinsics
+            subset = set(subset)
+            self._report["missing_depth"] = subset - set(depth_frames)
+            depth_frames = [x for x in depth_frames if x in subset]
+        else:
+            if from_frame > 0:
+                depth_frames = depth_frames[from_frame:]
+            if to_frame > from_frame:
+                depth_frames = depth_frames[:to_frame-from_frame]
+        range_frames = set(depth_frames)
+        depth_frames = sample_frames(
+            depth_frames,
+            stride=stride,
+            num_frames=num_frames,
+            random_seed=random_seed)
+        frames = set(depth_frames)
+
+        def in_range(others):
+            if subset is not None:
+                return set(others) & subset
+            if len(range_frames) == 0:
+                return set(others)
+            low, high = min(range_frames), max(range_frames)
+            return set(x for x in others if low <= x <= high)
+
+        if color_directory:
+            self._color_filenames = SynchronizedStream._frame_map(
+                color_directory,
+                prefix=kwargs.get("color_prefix"),
+                suffix=kwargs.get("color_suffix"))
+            color_frames = in_range(self._color_filenames.keys())
+            self._report["missing_color"] = frames - color_frames
+            self._report["missing_depth"] |= color_frames - range_frames
+            frames &= color_frames
+        if extrinsics is not None:
+            self._cameras = SynchronizedStream._camera_map(
+                extrinsics, depth_frames)
+            cam_frames = in_range(self._cameras.keys())
+            self._report["missing_extrinsics"] = frames - cam_frames
+            self._report["missing_depth"] |= cam_frames - range_frames
+            frames &= cam_frames
+
+        for key, missing in self._report.items():
+            self._report[key] = sorted(missing)
+            if len(missing) > 0:
+                print(f"{key.replace('_', ' ')} for frames: "
+                      f"{self._report[key]}")
+
+        self._frames = sorted(frames)
+        self.reset()
+        return self.length > 0
+
+    def _load_color(self, frame: int) -> np.ndarray:
+        if frame not in self._color_filenames:
+            return None
+        img = FileStream.load_image(
+            self._color_filenames[frame], cv2.IMREAD_COLOR)
+        if img is not None and img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return img
+
+    def _load_depth(self, frame: int) -> np.ndarray:
+        return FileStream.load_image(
+            self._depth_filenames[frame], cv2.IMREAD_UNCHANGED)
+
+    def _submit(self, index: int):
+        if index in self._pending:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._num_workers)
+        frame = self._frames[index]
+        self._pending[index] = (
+            self._executor.submit(self._load_color, frame),
+            self._executor.submit(self._load_depth, frame))
+
+    def _collect(self, index: int) -> tuple:
+        self._submit(index)
+        color, depth = self._pending.pop(index)
+        frame = self._frames[index]
+        return color.result(), depth.result(), self._cameras.get(frame)
+
+    def get(self, index: int = None, *args, **kwargs) -> tuple:
+        """Access an arbitrary synchronized frame. If the index
+        passed is out of range, None is returned. If the index is None,
+        the frame at the current_frame pointer is returned.
+
+        :param index: frame pointer
+        :type index: int
+        :return: color image, depth map, camera
+        :rtype: tuple
+        """
+        if self.length <= 0:
+            return None
+        if index is None:
+            index = self._current_frame
+        if 0 <= index < self.length:
+            self._current_frame = index
+            return self._collect(index)
+        return None
+
+    def next(self, *args, **kwargs) -> tuple:
+        """Function returns the next synchronized frame and schedules
+        the decoding of the upcoming frames. If the end is reached and
+        is_looping is set to True, the stream starts over, otherwise
+        None is returned.
+
+        :return: color image, depth map, camera
+        :rtype: tuple
+        """
+        if self.length <= 0:
+            return None
+        self._current_frame += 1
+        if self.current_frame >= self.length:
+            if self._is_looping:
+                self._current_frame = 0
+            else:
+                return None
+        for i in range(self._current_frame + 1,
+                       self._current_frame + 1 + self._prefetch):
+            if i < self.length:
+                self._submit(i)
+            elif self._is_looping:
+                self._submit(i % self.length)
+        return self._collect(self._current_frame)
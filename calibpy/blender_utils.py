@@ -9,6 +9,8 @@ the cameras into the pointclouds. See `single_cam.blend`
 
 import os
 import bpy
+import json
+import struct
 import pickle
 import numpy as np
 from glob import glob
@@ -24,14 +26,63 @@ def read_npys_from_dir(dirname: str) -> list:
     return filenames
 
 
-def load_camera_props_from_file(filename: str):
+def load_camera_props_from_file(filename: str, allow_pickle: bool = False):
     assert isinstance(filename, str)
     assert Path(filename).exists()
     with open(filename, 'rb') as file:
+        is_record = file.read(6) == b"\x93NUMPY"
+        file.seek(0)
+        if is_record:
+            return camera_props_from_record(
+                np.load(file, allow_pickle=False))
+        if not allow_pickle:
+            raise IOError(
+                f"{filename} is a pickled camera file, it is only loaded "
+                "with allow_pickle=True, use it for trusted files only")
         return pickle.load(file)
     return None
 
 
+def load_camera_sequence_props(filename: str) -> list:
+    # single file extrinsics of calibpy.CameraSequence, the header
+    # describes the record layouts
+    with open(filename, 'rb') as file:
+        magic, version, offset, descr_size = struct.unpack(
+            "<8sIII", file.read(20))
+        assert magic == b"CALIBSEQ"
+        descr = json.loads(file.read(descr_size).decode("utf-8"))
+        dtypes = {}
+        for key in ["camera_dtype", "frame_dtype"]:
+            dtypes[key] = np.dtype([(name, fmt, tuple(shape))
+                                    for name, fmt, shape in descr[key]])
+        camera = np.frombuffer(
+            file.read(dtypes["camera_dtype"].itemsize),
+            dtype=dtypes["camera_dtype"])[0]
+        file.seek(offset)
+        frames = np.frombuffer(file.read(), dtype=dtypes["frame_dtype"])
+    shared = camera_props_from_record(camera)
+    props = []
+    for frame in frames:
+        frame_props = dict(shared)
+        frame_props["name"] = bytes(frame["name"]).decode("utf-8")
+        frame_props["RT"] = np.array(frame["RT"])
+        frame_props["RTb"] = np.array(frame["RTb"])
+        props.append(frame_props)
+    return props
+
+
+def camera_props_from_record(record: np.ndarray) -> dict:
+    # binary Camera record of calibpy, attributes not set are NaN
+    props = {"name": bytes(record["name"]).decode("utf-8")}
+    for key in ["f_mm", "sensor_size", "intrinsics", "distortion",
+                "RT", "RTb"]:
+        value = np.array(record[key])
+        props[key] = None if np.all(np.isnan(value)) else value
+    if props["f_mm"] is not None:
+        props["f_mm"] = float(props["f_mm"])
+    return props
+
+
 def find_latest_object_by_name(context, name):
     bpy.ops.object.select_all(action='DESELECT')
     objs = [x for x in context.scene.objects.keys() if x.startswith(name)]
@@ -4,12 +4,26 @@
 :Sponsor: SpexAI GmbH
 """
 
+import cv2
+import numpy as np
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import open3d as o3d
 from calibpy.Camera import Camera
+from calibpy.CameraSequence import CameraSequence
 from calibpy.Settings import Settings
-from calibpy.Stream import FileStream
+from calibpy.Stream import (
+    FileStream,
+    VideoStream,
+    SynchronizedStream,
+    is_video_file)
+from calibpy.FrameIndex import parse_frame_name
 from calibpy.Calibration import Calibration
+from calibpy.Fusion import VoxelFusion, TSDFFusion
+from calibpy.PointCloudIO import write_pointcloud, format_suffix
+from calibpy.PointCloudWriter import PointCloudWriter
+from calibpy.Octree import OctreeWriter
+from calibpy.Refinement import ICPRefinement
 from calibpy.Registration import register_depthmap_to_world, show_registration
 
 
@@ -36,6 +50,94 @@ def get_savename_pattern(
     return fname
 
 
+def open_image_stream(
+        source: str,
+        from_frame: int = 0,
+        to_frame: int = 0,
+        stride: int = 1,
+        num_frames: int = 0,
+        random_seed: int = None):
+    """Creates a stream for a calibration input, which is either a
+    video file or an image directory. num_frames and random_seed
+    are only supported for image directories, VideoStream raises a
+    ValueError.
+
+    :param source: video filename or image directory
+    :type source: str
+    :param from_frame: first frame, defaults to 0
+    :type from_frame: int, optional
+    :param to_frame: last frame (exclusive), defaults to 0
+    :type to_frame: int, optional
+    :param stride: frame stride, defaults to 1
+    :type stride: int, optional
+    :param num_frames: number of frames to sample, defaults to 0 (all)
+    :type num_frames: int, optional
+    :param random_seed: seed for random sampling, defaults to None
+    :type random_seed: int, optional
+    :return: VideoStream or FileStream instance
+    :rtype: Stream
+    """
+    if Path(source).is_file() and is_video_file(source):
+        stream = VideoStream()
+        stream.initialize(
+            filename=source,
+            from_frame=from_frame,
+            to_frame=to_frame,
+            stride=stride,
+            num_frames=num_frames,
+            random_seed=random_seed)
+    else:
+        stream = FileStream()
+        stream.initialize(
+            directory=source,
+            from_frame=from_frame,
+            to_frame=to_frame,
+            stride=stride,
+            num_frames=num_frames,
+            random_seed=random_seed)
+    return stream
+
+
+def extrinsics_frames(extrinsics: list) -> list:
+    """Frame numbers of extrinsic cameras named by their frames, e.g.
+    those of extrinsic_calibration_sequence
+
+    :param extrinsics: Camera instances
+    :type extrinsics: list
+    :return: frame numbers or None if a name has no frame number
+    :rtype: list
+    """
+    frames = [parse_frame_name(str(cam.name))[1] for cam in extrinsics]
+    if any(frame is None for frame in frames):
+        return None
+    return frames
+
+
+def frame_selection(
+        from_frame: int = 0,
+        to_frame: int = 0,
+        stride: int = 1,
+        num_frames: int = 0,
+        random_seed: int = None,
+        frames: list = None) -> dict:
+    """SynchronizedStream keyword arguments choosing the frames. If
+    frames are given, e.g. those of extrinsics sampled before, they
+    replace the range and sampling arguments, so the frames are
+    sampled only once.
+
+    :return: keyword arguments
+    :rtype: dict
+    """
+    if frames is not None:
+        return {"frames": frames}
+    return {
+        "from_frame": from_frame,
+        "to_frame": to_frame,
+        "stride": stride,
+        "num_frames": num_frames,
+        "random_seed": random_seed}
+
+
 def show_pcl_set(pcds: list):
     show_registration(pcds)
 
@@ -54,12 +156,16 @@ def instric_calibration(
     cam = None
     if isinstance(fname, Path) and fname.is_file() and is_lazy:
         cam = Camera()
-        cam.load(fname)
-        return cam
+        try:
+            cam.load(fname)
+            return cam
+        except IOError as e:
+            # pickled files of former versions are not trusted
+            print(f"{e}, recalibrating")
 
     # We use FileStream with directory to read all files from a directory
-    fs = FileStream()
-    fs.initialize(directory=image_directory)
+    # or a VideoStream if the input is a video file
+    fs = open_image_stream(image_directory)
 
     # run intrinsic calibration on the images loaded
     cam = calib.calibrate_intrinsics(fs)
@@ -98,27 +204,38 @@ def extrinsic_calibration_sequence(
         image_directory: str,
         out_dir: Path = None,
         register_from_frame: int = 0,
-        register_to_frame: int = 0):
+        register_to_frame: int = 0,
+        register_stride: int = 1,
+        register_num_frames: int = 0,
+        register_seed: int = None):
 
     # We use FileStream with directory to read all files from a directory
-    # from_frame/to_frame chooses a frame subset of the folder content
-    fs = FileStream()
-    fs.initialize(
-        directory=image_directory,
+    # or a VideoStream if the input is a video file. from_frame/to_frame
+    # chooses a frame subset of the folder or video content, which is
+    # sampled further by stride, num_frames and seed
+    fs = open_image_stream(
+        image_directory,
         from_frame=register_from_frame,
-        to_frame=register_to_frame)
-
-    # run extrinsic calibration on the images loaded
-    cams = calib.calibrate_extrinsics(fs, intrinsics)
+        to_frame=register_to_frame,
+        stride=register_stride,
+        num_frames=register_num_frames,
+        random_seed=register_seed)
 
-    # save each frame cam if out_dir wasn't None
-    for n, cam in enumerate(cams):
-        fname = get_savename_pattern(
-            save_dir=out_dir,
-            name="extrinsics",
-            pattern=n)
-        if fname is not None:
-            cam.serialize(fname)
+    # run extrinsic calibration on the images loaded and append each
+    # frame cam to a single sequence file if out_dir wasn't None
+    fname = get_savename_pattern(
+        save_dir=out_dir,
+        name="extrinsics",
+        ftype=CameraSequence.SUFFIX)
+    sequence = None
+    if fname is not None:
+        sequence = CameraSequence(fname, intrinsics, mode="w")
+    try:
+        cams = calib.calibrate_extrinsics(
+            fs, intrinsics, sequence=sequence)
+    finally:
+        if sequence is not None:
+            sequence.close()
     return cams
 
 
@@ -129,7 +246,12 @@ def register_view(
         out_dir: Path,
         register_from_frame: int = 0,
         register_to_frame: int = 0,
-        blender_conform: bool = True):
+        blender_conform: bool = True,
+        depth_near: float = 0.0,
+        depth_far: float = np.inf,
+        depth_scale: float = 1.0,
+        distortion_aware: bool = False,
+        crop_box=None):
 
     if isinstance(out_dir, str):
         out_dir = Path(out_dir)
@@ -149,12 +271,22 @@ def register_view(
 
     # register the depth and color images as pointclouds to
     # the global coordinate system of the extrnal calibration
+    stats = {}
+    # depth maps are loaded in their stored type, e.g. 16 bit
     pcd = register_depthmap_to_world(
         extrinsics,
-        fs_depths.get(0),
+        fs_depths.get(0, flag=cv2.IMREAD_UNCHANGED),
         fs_imgs.get(0),
         0.1,
-        blender_conform)
+        blender_conform,
+        depth_near=depth_near,
+        depth_far=depth_far,
+        stats=stats,
+        depth_scale=depth_scale,
+        distortion_aware=distortion_aware,
+        crop_box=crop_box)
+    print(f"Masked {stats['masked_pixels']} of "
+          f"{stats['total_pixels']} depth pixels")
 
     # save pointcloud if out_dir wasn't None
     fname = get_savename_pattern(
@@ -167,53 +299,367 @@ def register_view(
     return [pcd]
 
 
-def register_stream(
+def iter_register_stream(
         image_directory: str,
         depth_directory: str,
         extrinsics: list,
         out_dir: Path,
         register_from_frame: int = 0,
         register_to_frame: int = 0,
-        blender_conform: bool = True):
+        blender_conform: bool = True,
+        register_stride: int = 1,
+        register_num_frames: int = 0,
+        register_seed: int = None,
+        depth_near: float = 0.0,
+        depth_far: float = np.inf,
+        num_workers: int = 4,
+        stats: dict = None,
+        output_format: str = "ply",
+        depth_scale: float = 1.0,
+        distortion_aware: bool = False,
+        crop_box=None,
+        refinement: ICPRefinement = None,
+        cameras: dict = None,
+        register_frames: list = None):
+    """Registers all frames of a depth stream in a thread pool and
+    yields the pointclouds as they complete. NumPy and Open3D release
+    the GIL for most of the work. If out_dir is not None, each
+    pointcloud is saved as pcl_XXXXXX.ply (or .npz) by a background
+    writer, so the registration never waits on disk. With a refinement,
+    the pointclouds are refined and yielded in frame order.
+
+    :param num_workers: number of registration threads, defaults to 4
+    :type num_workers: int, optional
+    :param stats: if a dict is passed, total_pixels, masked_pixels and
+        points are summed up over all frames, defaults to None
+    :type stats: dict, optional
+    :param output_format: pointcloud file format, see
+        POINTCLOUD_FORMATS, defaults to "ply"
+    :type output_format: str, optional
+    :param depth_scale: meters per depth unit, e.g. 0.001 for 16 bit
+        millimeter depth maps, defaults to 1.0
+    :type depth_scale: float, optional
+    :param distortion_aware: correct the lens distortion of the depth
+        maps with a cached ray lookup table, defaults to False
+    :type distortion_aware: bool, optional
+    :param crop_box: world space crop box, see as_crop_box, points
+        outside are dropped before the pointclouds are created,
+        defaults to None
+    :type crop_box: o3d.geometry.OrientedBoundingBox, optional
+    :param refinement: ICP refinement aligning each frame to the
+        frames before, defaults to None
+    :type refinement: ICPRefinement, optional
+    :param cameras: if a dict is passed, the (refined) camera of each
+        yielded frame is stored by its stream index, defaults to None
+    :type cameras: dict, optional
+    :param register_frames: frame numbers to register, e.g. those of
+        sampled extrinsics, replace from/to frame and sampling,
+        defaults to None
+    :type register_frames: list, optional
+    :yield: stream index, pointcloud
+    :rtype: tuple
+    """
+    assert num_workers >= 1
+    if isinstance(out_dir, str):
+        out_dir = Path(out_dir)
+    if stats is None:
+        stats = {}
+    for key in ["total_pixels", "masked_pixels", "points"]:
+        stats.setdefault(key, 0)
+
+    # We use a SynchronizedStream to pair color images, depth maps and
+    # extrinsics by their frame numbers. from_frame/to_frame chooses a
+    # frame subset of the depth folder content, which is sampled further
+    # by stride, num_frames and seed
+    stream = SynchronizedStream(
+        prefetch=2 * num_workers, num_workers=num_workers)
+    stream.initialize(
+        depth_directory=depth_directory,
+        color_directory=image_directory,
+        extrinsics=extrinsics,
+        **frame_selection(
+            register_from_frame, register_to_frame, register_stride,
+            register_num_frames, register_seed, register_frames))
+
+    writer = PointCloudWriter(
+        max_queued=2 * num_workers, fmt=output_format)
+    try:
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            pending = {}
+            completed = {}
+            index = 0
+            next_index = 0
+            while index < stream.length or len(pending) > 0:
+                # keep the number of frames in flight bounded
+                while index < stream.length and \
+                        len(pending) < 2 * num_workers:
+                    color_img, depth_map, cam = stream.next()
+                    frame_stats = {}
+                    # register the depth and color images as pointclouds
+                    # to the global coordinate system of the external
+                    # calibration
+                    future = pool.submit(
+                        register_depthmap_to_world,
+                        cam,
+                        depth_map,
+                        color_img,
+                        0.1,
+                        blender_conform,
+                        depth_near=depth_near,
+                        depth_far=depth_far,
+                        stats=frame_stats,
+                        depth_scale=depth_scale,
+                        distortion_aware=distortion_aware,
+                        crop_box=crop_box)
+                    pending[future] = (index, frame_stats, cam)
+                    index += 1
+                done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, frame_stats, cam = pending.pop(future)
+                    completed[i] = (future.result(), cam)
+                    for key in ["total_pixels", "masked_pixels", "points"]:
+                        stats[key] += frame_stats[key]
+                # the refinement needs the frames in order
+                if refinement is None:
+                    ready = sorted(completed.keys())
+                else:
+                    ready = []
+                    while next_index + len(ready) in completed:
+                        ready.append(next_index + len(ready))
+                    next_index += len(ready)
+                for i in ready:
+                    pcd, cam = completed.pop(i)
+                    if refinement is not None:
+                        cam, pcd = refinement.refine(cam, pcd)
+                    if cameras is not None:
+                        cameras[i] = cam
+                    # save each pointcloud if out_dir wasn't None
+                    fname = get_savename_pattern(
+                        save_dir=out_dir,
+                        name="pcl",
+                        pattern=i,
+                        ftype=writer.suffix)
+                    if fname is not None:
+                        writer.write(fname, pcd)
+                    yield i, pcd
+    finally:
+        stream.close()
+        writer.close()
+
 
+def register_stream(
+        image_directory: str,
+        depth_directory: str,
+        extrinsics: list,
+        out_dir: Path,
+        register_from_frame: int = 0,
+        register_to_frame: int = 0,
+        blender_conform: bool = True,
+        register_stride: int = 1,
+        register_num_frames: int = 0,
+        register_seed: int = None,
+        depth_near: float = 0.0,
+        depth_far: float = np.inf,
+        fusion_voxel_size: float = None,
+        num_workers: int = 4,
+        output_format: str = "ply",
+        octree_bbox: tuple = None,
+        octree_depth: int = 5,
+        depth_scale: float = 1.0,
+        distortion_aware: bool = False,
+        crop_box=None,
+        icp_voxel_sizes: list = None,
+        icp_max_iterations=30,
+        icp_time_budgets=None,
+        register_frames: list = None):
+    """Registers all frames of a depth stream, see iter_register_stream,
+    and collects the pointclouds in frame order, optionally fused,
+    refined or tiled into an octree. Callers processing the pointclouds
+    as they complete, without keeping all of them in memory, should
+    use iter_register_stream directly.
+
+    :param octree_bbox: world space (min, max) corners of the octree,
+        needs an out_dir, defaults to None
+    :type octree_bbox: tuple, optional
+    :return: pointclouds in frame order, or the fused pointcloud
+    :rtype: list
+    """
     if isinstance(out_dir, str):
         out_dir = Path(out_dir)
 
-    # We use FileStreams with directory to read all files from a directory
-    # from_frame/to_frame chooses a frame subset of the folder content
-    fs_imgs = FileStream()
-    fs_depths = FileStream()
-    fs_imgs.initialize(
-        directory=image_directory,
-        from_frame=register_from_frame,
-        to_frame=register_to_frame)
-    fs_depths.initialize(
-        directory=depth_directory,
-        from_frame=register_from_frame,
-        to_frame=register_to_frame)
+    # If ICP voxel sizes are given, each frame is aligned to the frames
+    # before, coarse to fine, to correct small extrinsic errors
+    refinement = None
+    cameras = {}
+    if icp_voxel_sizes is not None:
+        refinement = ICPRefinement(
+            icp_voxel_sizes,
+            max_iterations=icp_max_iterations,
+            time_budgets=icp_time_budgets,
+            blender_conform=blender_conform)
 
-    pcds = []
-    for i in range(4):
-        # register the depth and color images as pointclouds to
-        # the global coordinate system of the external calibration
-        pcd = register_depthmap_to_world(
-            extrinsics[i],
-            fs_depths.get(i),
-            fs_imgs.get(i),
-            0.1,
-            blender_conform)
-        pcds.append(pcd)
-
-        # save each pointcloud if out_dir wasn't None
+    # If an octree bounding box (min, max) is given, the registered
+    # frames are additionally tiled into a level of detail octree
+    octree = None
+    if octree_bbox is not None and out_dir is None:
+        print("No out_dir given, the octree is skipped")
+    elif octree_bbox is not None:
+        bbox_min = np.asarray(octree_bbox[0], dtype=np.float64)
+        size = np.max(np.asarray(octree_bbox[1]) - bbox_min)
+        octree = OctreeWriter(
+            out_dir / "octree", bbox_min, size, max_depth=octree_depth)
+
+    # If a fusion voxel size is given, all frames are merged into a
+    # single voxel hash instead of keeping one pointcloud per frame
+    fusion = None
+    if fusion_voxel_size is not None:
+        fusion = VoxelFusion(fusion_voxel_size)
+
+    pcds = {}
+    stats = {}
+    for i, pcd in iter_register_stream(
+            image_directory=image_directory,
+            depth_directory=depth_directory,
+            extrinsics=extrinsics,
+            out_dir=out_dir,
+            register_from_frame=register_from_frame,
+            register_to_frame=register_to_frame,
+            blender_conform=blender_conform,
+            register_stride=register_stride,
+            register_num_frames=register_num_frames,
+            register_seed=register_seed,
+            register_frames=register_frames,
+            depth_near=depth_near,
+            depth_far=depth_far,
+            num_workers=num_workers,
+            stats=stats,
+            output_format=output_format,
+            depth_scale=depth_scale,
+            distortion_aware=distortion_aware,
+            crop_box=crop_box,
+            refinement=refinement,
+            cameras=cameras):
+        if octree is not None:
+            octree.add_pointcloud(pcd)
+        if fusion is not None:
+            fusion.add_pointcloud(pcd)
+        else:
+            pcds[i] = pcd
+    print(f"Masked {stats['masked_pixels']} of "
+          f"{stats['total_pixels']} depth pixels")
+
+    # save the refined cams if out_dir wasn't None
+    if refinement is not None:
+        accepted = sum(x["accepted"] for x in refinement.history)
+        print(f"Refined {accepted} of {refinement.num_frames} frames")
+        fname = get_savename_pattern(
+            save_dir=out_dir,
+            name="extrinsics_refined",
+            ftype=CameraSequence.SUFFIX)
+        if fname is not None and len(cameras) > 0:
+            indices = sorted(cameras.keys())
+            with CameraSequence(
+                    fname, cameras[indices[0]], mode="w") as sequence:
+                sequence.extend([cameras[i] for i in indices])
+    if octree is not None:
+        octree.close()
+        print(f"Tiled {octree.num_points} points into "
+              f"{len(octree.nodes)} octree nodes")
+
+    # save the fused pointcloud if out_dir wasn't None
+    if fusion is not None:
+        pcd = fusion.to_pointcloud()
         fname = get_savename_pattern(
             save_dir=out_dir,
             name="pcl",
-            pattern=i,
+            pattern="fused",
+            ftype=format_suffix(output_format))
+        if fname is not None:
+            write_pointcloud(fname, pcd, output_format)
+        return [pcd]
+
+    return [pcds[i] for i in sorted(pcds.keys())]
+
+
+def integrate_stream(
+        image_directory: str,
+        depth_directory: str,
+        extrinsics: list,
+        out_dir: Path,
+        voxel_size: float,
+        sdf_trunc: float = None,
+        extract: str = "mesh",
+        register_from_frame: int = 0,
+        register_to_frame: int = 0,
+        blender_conform: bool = True,
+        register_stride: int = 1,
+        register_num_frames: int = 0,
+        register_seed: int = None,
+        depth_near: float = 0.0,
+        depth_far: float = np.inf,
+        depth_scale: float = 1.0,
+        register_frames: list = None):
+    """Integrates a depth stream into a TSDF volume frame by frame and
+    extracts the surface at the end
+
+    :param extract: "mesh" or "points", defaults to "mesh"
+    :type extract: str, optional
+    :param register_frames: frame numbers to integrate, e.g. those of
+        sampled extrinsics, replace from/to frame and sampling,
+        defaults to None
+    :type register_frames: list, optional
+    :return: list holding the extracted mesh or pointcloud
+    :rtype: list
+    """
+    assert extract in ["mesh", "points"]
+    if isinstance(out_dir, str):
+        out_dir = Path(out_dir)
+
+    tsdf = TSDFFusion(
+        voxel_size,
+        sdf_trunc=sdf_trunc,
+        depth_near=depth_near,
+        depth_far=depth_far,
+        blender_conform=blender_conform,
+        depth_scale=depth_scale)
+
+    stream = SynchronizedStream()
+    stream.initialize(
+        depth_directory=depth_directory,
+        color_directory=image_directory,
+        extrinsics=extrinsics,
+        **frame_selection(
+            register_from_frame, register_to_frame, register_stride,
+            register_num_frames, register_seed, register_frames))
+
+    # only the current frame is kept in memory, all information
+    # is accumulated inside the volume
+    for i in range(stream.length):
+        color_img, depth_map, cam = stream.next()
+        tsdf.integrate(cam, depth_map, color_img)
+    stream.close()
+    print(f"Integrated {tsdf.num_frames} frames")
+
+    if extract == "mesh":
+        geometry = tsdf.extract_mesh()
+        fname = get_savename_pattern(
+            save_dir=out_dir,
+            name="tsdf",
+            pattern="mesh",
+            ftype="ply")
+        if fname is not None:
+            o3d.io.write_triangle_mesh(str(fname), geometry)
+    else:
+        geometry = tsdf.extract_pointcloud()
+        fname = get_savename_pattern(
+            save_dir=out_dir,
+            name="tsdf",
+            pattern="pcl",
             ftype="ply")
         if fname is not None:
-            o3d.io.write_point_cloud(str(fname), pcd)
+            o3d.io.write_point_cloud(str(fname), geometry)
 
-    return pcds
+    return [geometry]
 
 
 def single_cam_workflow(
@@ -228,7 +674,25 @@ def single_cam_workflow(
         register_from_frame: int = 0,
         register_to_frame: int = 1,
         lazy_intrinsics: bool = True,
-        visualize: bool = True):
+        visualize: bool = True,
+        register_stride: int = 1,
+        register_num_frames: int = 0,
+        register_seed: int = None,
+        depth_near: float = 0.0,
+        depth_far: float = np.inf,
+        fusion_voxel_size: float = None,
+        tsdf_voxel_size: float = None,
+        tsdf_trunc: float = None,
+        tsdf_extract: str = "mesh",
+        pointcloud_format: str = "ply",
+        octree_bbox: tuple = None,
+        octree_depth: int = 5,
+        depth_scale: float = 1.0,
+        distortion_aware: bool = False,
+        crop_box=None,
+        icp_voxel_sizes: list = None,
+        icp_max_iterations=30,
+        icp_time_budgets=None):
     intr = None
     extr = None
     extrs = None
@@ -260,13 +724,17 @@ def single_cam_workflow(
 
     # ***** Check if single view or stream mode is needed
     assert isinstance(extrinsic_calibration_input, str)
-    if Path(extrinsic_calibration_input).is_file():
+    if Path(extrinsic_calibration_input).is_file() and \
+            not is_video_file(extrinsic_calibration_input):
         single_file_mode = True
+    elif is_video_file(extrinsic_calibration_input):
+        assert Path(extrinsic_calibration_input).is_file()
     else:
         assert Path(extrinsic_calibration_input).is_dir()
 
     # ***** Extrinsic calibration of a single view *****
     extrs = None
+    register_frames = None
     if single_file_mode:
         extr = extrinsic_calibration_image(
             calib=calib,
@@ -282,7 +750,13 @@ def single_cam_workflow(
             image_directory=extrinsic_calibration_input,
             out_dir=out_root,
             register_from_frame=register_from_frame,
-            register_to_frame=register_to_frame)
+            register_to_frame=register_to_frame,
+            register_stride=register_stride,
+            register_num_frames=register_num_frames,
+            register_seed=register_seed)
+        # the depth frames are paired with the sampled extrinsics by
+        # frame number instead of being sampled a second time
+        register_frames = extrinsics_frames(extrs)
 
     # ***** If no depth map registration desired we're done here
     if depth_registration_input is None:
@@ -307,7 +781,34 @@ def single_cam_workflow(
             out_dir=out_root,
             register_from_frame=register_from_frame,
             register_to_frame=register_to_frame,
-            blender_conform=blender_conform)
+            blender_conform=blender_conform,
+            depth_near=depth_near,
+            depth_far=depth_far,
+            depth_scale=depth_scale,
+            distortion_aware=distortion_aware,
+            crop_box=crop_box)
+    # ***** Surface reconstruction of a depth stream *****
+    elif tsdf_voxel_size is not None:
+        if not Path(color_registration_input).is_dir():
+            color_registration_input = ""
+        pcds = integrate_stream(
+            image_directory=color_registration_input,
+            depth_directory=depth_registration_input,
+            extrinsics=extrs,
+            out_dir=out_root,
+            voxel_size=tsdf_voxel_size,
+            sdf_trunc=tsdf_trunc,
+            extract=tsdf_extract,
+            register_from_frame=register_from_frame,
+            register_to_frame=register_to_frame,
+            blender_conform=blender_conform,
+            register_stride=register_stride,
+            register_num_frames=register_num_frames,
+            register_seed=register_seed,
+            depth_near=depth_near,
+            depth_far=depth_far,
+            depth_scale=depth_scale,
+            register_frames=register_frames)
     # ***** Registration of a depth stream *****
     else:
         if not Path(color_registration_input).is_dir():
@@ -319,6 +820,22 @@ def single_cam_workflow(
             out_dir=out_root,
             register_from_frame=register_from_frame,
             register_to_frame=register_to_frame,
-            blender_conform=blender_conform)
+            blender_conform=blender_conform,
+            register_stride=register_stride,
+            register_num_frames=register_num_frames,
+            register_seed=register_seed,
+            depth_near=depth_near,
+            depth_far=depth_far,
+            fusion_voxel_size=fusion_voxel_size,
+            output_format=pointcloud_format,
+            octree_bbox=octree_bbox,
+            octree_depth=octree_depth,
+            depth_scale=depth_scale,
+            distortion_aware=distortion_aware,
+            crop_box=crop_box,
+            icp_voxel_sizes=icp_voxel_sizes,
+            icp_max_iterations=icp_max_iterations,
+            icp_time_budgets=icp_time_budgets,
+            register_frames=register_frames)
 
     return intr, extrs, pcds
@@ -7,6 +7,7 @@
 
 
 import argparse
+import numpy as np
 from calibpy.Settings import Settings
 from calibpy.single_cam_workflow import single_cam_workflow, show_pcl_set
 
@@ -28,6 +29,29 @@ if __name__ == "__main__":
     ps = Settings()
     ps.from_config(args.input)
 
+    # optional settings, e.g. frame sampling of the streams, TSDF surface
+    # reconstruction, output formats, the depth unit and the valid depth
+    # range, depth_far: .inf in yaml means unbounded
+    for key, default in [("register_stride", 1),
+                         ("register_num_frames", 0),
+                         ("register_seed", None),
+                         ("tsdf_voxel_size", None),
+                         ("tsdf_trunc", None),
+                         ("tsdf_extract", "mesh"),
+                         ("pointcloud_format", "ply"),
+                         ("octree_bbox", None),
+                         ("octree_depth", 5),
+                         ("depth_scale", 1.0),
+                         ("depth_near", 0.0),
+                         ("depth_far", np.inf),
+                         ("distortion_aware", False),
+                         ("crop_box", None),
+                         ("icp_voxel_sizes", None),
+                         ("icp_max_iterations", 30),
+                         ("icp_time_budgets", None)]:
+        if key not in ps:
+            setattr(ps, key, default)
+
     if args.workflow == "single_cam_workflow":
         intr, extrs, pcls = single_cam_workflow(
             project_dir=ps.project_dir,
@@ -41,7 +65,24 @@ if __name__ == "__main__":
             register_from_frame=ps.register_from_frame,
             register_to_frame=ps.register_to_frame,
             lazy_intrinsics=ps.lazy_intrinsics,
-            visualize=ps.visualize)
+            visualize=ps.visualize,
+            register_stride=ps.register_stride,
+            register_num_frames=ps.register_num_frames,
+            register_seed=ps.register_seed,
+            tsdf_voxel_size=ps.tsdf_voxel_size,
+            tsdf_trunc=ps.tsdf_trunc,
+            tsdf_extract=ps.tsdf_extract,
+            pointcloud_format=ps.pointcloud_format,
+            octree_bbox=ps.octree_bbox,
+            octree_depth=ps.octree_depth,
+            depth_scale=ps.depth_scale,
+            depth_near=ps.depth_near,
+            depth_far=ps.depth_far,
+            distortion_aware=ps.distortion_aware,
+            crop_box=ps.crop_box,
+            icp_voxel_sizes=ps.icp_voxel_sizes,
+            icp_max_iterations=ps.icp_max_iterations,
+            icp_time_budgets=ps.icp_time_budgets)
 
         print("#"*30)
         print("#\tSINGLE CAM WORKFLOW")
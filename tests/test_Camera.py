@@ -36,6 +36,21 @@ class TestCameraModule(unittest.TestCase):
                         [0, 0, 0, 1]])
         np.testing.assert_almost_equal(ref, cam.RTb)
 
+    def test_rotation_and_translation(self):
+        print("test_rotation_and_translation...")
+        cam = Camera()
+        cam.quick_init()
+        R = np.array([[0, -1, 0], [1, 0, 0], [0, 0, 1]])
+        cam.set_rotation_and_translation(R, np.array([[1], [2], [3]]))
+        ref = np.array([[0, -1, 0, 1],
+                        [1, 0, 0, 2],
+                        [0, 0, 1, 3],
+                        [0, 0, 0, 1]])
+        np.testing.assert_almost_equal(ref, cam.RT)
+        np.testing.assert_almost_equal(
+            np.linalg.inv(ref), np.diag([1, -1, -1, 1]) @ cam.RTb @
+            np.diag([1, -1, -1, 1]))
+
     def test_serializing(self):
         print("test_serializing...")
         dump_fname = str(self._root / "test.npy")
@@ -54,6 +69,55 @@ class TestCameraModule(unittest.TestCase):
         import os
         os.remove(dump_fname)
 
+    def test_record(self):
+        print("test_record...")
+        from calibpy.Camera import CAMERA_DTYPE
+        from calibpy.Serializer import Serializer
+        dump_fname = self._root / "test_record.npy"
+        cam = Camera(name="cam")
+        cam.quick_init()
+        cam.name = "cam"
+        cam.distortion = np.array([[0.1, -0.05, 0.001, 0.002, 0.01]])
+        cam.serialize(dump_fname)
+        # a plain NumPy file, loadable without pickle
+        record = np.load(dump_fname, allow_pickle=False)
+        self.assertEqual(record.dtype, CAMERA_DTYPE)
+        cam2 = Camera()
+        cam2.load(dump_fname)
+        self.assertEqual(cam2.name, "cam")
+        self.assertEqual(cam.f_mm, cam2.f_mm)
+        self.assertEqual(cam.sensor_size_mm, cam2.sensor_size_mm)
+        self.assertEqual(cam.image_size, cam2.image_size)
+        np.testing.assert_array_equal(cam.intrinsics, cam2.intrinsics)
+        np.testing.assert_array_equal(cam.distortion, cam2.distortion)
+        np.testing.assert_array_equal(cam.RT, cam2.RT)
+        np.testing.assert_array_equal(cam.RTb, cam2.RTb)
+
+        # loaded cameras can be edited in place
+        cam2.intrinsics[0, 2] = 5
+        cam2.distortion[0, 0] = 0
+        cam2.RT[0, 3] += 1
+        cam2.RTb[0, 3] += 1
+        self.assertEqual(cam2.intrinsics[0, 2], 5)
+        self.assertNotEqual(cam.intrinsics[0, 2], 5)
+
+        # attributes not set stay None
+        cam3 = Camera()
+        cam3.from_record(Camera().to_record())
+        for value in cam3.serialize().values():
+            self.assertIsNone(value)
+
+        # pickled files of former versions are loaded on request only
+        Serializer._write_npy(cam, dump_fname, cam.serialize())
+        cam4 = Camera()
+        with self.assertRaises(IOError):
+            cam4.load(dump_fname)
+        self.assertIsNone(cam4.RTb)
+        cam4.load(dump_fname, allow_pickle=True)
+        np.testing.assert_array_equal(cam.RTb, cam4.RTb)
+        self.assertEqual(cam4.name, "cam")
+        dump_fname.unlink()
+
 
 if __name__ == '__main__':
     unittest.main()
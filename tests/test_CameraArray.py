@@ -0,0 +1,112 @@
+import cv2
+import unittest
+import tempfile
+import numpy as np
+from pathlib import Path
+from calibpy.Camera import Camera
+from calibpy.CameraArray import CameraArray
+from calibpy.CameraSequence import CameraSequence
+from calibpy.Registration import backproject_depth_batch
+
+
+class TestCameraArrayModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start CameraArray tests...")
+        self._intrinsics = Camera(name="intrinsics")
+        self._intrinsics.quick_init(image_size=(48, 64))
+        self._intrinsics.distortion = np.array([[0.1, -0.05, 0, 0, 0.01]])
+        self._cams = []
+        for i in range(8):
+            cam = Camera.from_cam(self._intrinsics)
+            cam.name = f"{i:04d}"
+            RT = np.identity(4)
+            RT[:3, :3] = cv2.Rodrigues(np.array([0.1, -0.2, 0.05 * i]))[0]
+            RT[:3, 3] = [0.1 * i, -1, 4]
+            cam.RT = RT
+            self._cams.append(cam)
+
+    def check_camera(self, a: Camera, b: Camera):
+        self.assertEqual(a.name, b.name)
+        self.assertEqual(a.f_mm, b.f_mm)
+        self.assertEqual(a.sensor_size_mm, b.sensor_size_mm)
+        self.assertEqual(a.image_size, b.image_size)
+        np.testing.assert_array_equal(a.intrinsics, b.intrinsics)
+        np.testing.assert_array_equal(a.distortion, b.distortion)
+        np.testing.assert_allclose(a.RT, b.RT)
+        np.testing.assert_allclose(a.RTb, b.RTb, atol=1e-12)
+
+    def test_cameras(self):
+        cams = CameraArray.from_cameras(self._cams)
+        self.assertEqual(len(cams), 8)
+        self.assertEqual(cams.RTb.shape, (8, 4, 4))
+        self.assertEqual(cams.distortion.shape, (8, 5))
+        np.testing.assert_allclose(cams.fx, self._intrinsics.fx)
+        for a, b in zip(cams, self._cams):
+            self.check_camera(a, b)
+
+        # the batched inverse matches Camera.RTb
+        shared = CameraArray.from_camera(
+            self._intrinsics, cams.RT, cams.names)
+        np.testing.assert_allclose(shared.RTb, cams.RTb, atol=1e-12)
+        self.check_camera(shared[-1], self._cams[-1])
+
+        part = cams[2:5]
+        self.assertTrue(isinstance(part, CameraArray))
+        self.assertEqual(part.names, ["0002", "0003", "0004"])
+        part = cams[np.array([True, False] * 4)]
+        self.assertEqual(part.names, ["0000", "0002", "0004", "0006"])
+        self.check_camera(cams[np.int64(3)], self._cams[3])
+
+        empty = CameraArray.from_cameras([])
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(empty.RT.shape, (0, 4, 4))
+
+    def test_serialization(self):
+        cams = CameraArray.from_cameras(self._cams)
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = Path(tmp) / "cams.npy"
+            cams.serialize(fname)
+            np.load(fname, allow_pickle=False)
+            loaded = CameraArray()
+            loaded.load(fname)
+            self.assertEqual(len(loaded), 8)
+            for a, b in zip(loaded, self._cams):
+                self.check_camera(a, b)
+
+            fname = Path(tmp) / "extrinsics.camseq"
+            with CameraSequence(fname, self._intrinsics, "w") as seq:
+                seq.extend(self._cams)
+                seq_cams = seq.to_array()
+            np.testing.assert_array_equal(seq_cams.RTb, cams.RTb)
+            self.assertEqual(seq_cams.names, cams.names)
+
+    def test_batch_projection(self):
+        cams = CameraArray.from_cameras(self._cams[:3])
+        rng = np.random.default_rng(0)
+        depths = rng.uniform(1, 5, (3, 48, 64)).astype(np.float32)
+        pset = backproject_depth_batch(depths, cams)
+        ref = backproject_depth_batch(depths, self._cams[:3])
+        np.testing.assert_allclose(pset.points, ref.points, atol=1e-5)
+
+        # the intrinsics of the first camera are not silently used for all
+        distortion = cams.distortion.copy()
+        distortion[1, 0] += 0.1
+        cams.distortion = distortion
+        with self.assertRaises(AssertionError):
+            backproject_depth_batch(depths, cams)
+        pset = backproject_depth_batch(depths, cams, camera=self._cams[0])
+        np.testing.assert_allclose(pset.points, ref.points, atol=1e-5)
+
+        # the same holds for a list of cameras
+        cam_list = [Camera.from_cam(x) for x in self._cams[:3]]
+        cam_list[2].intrinsics = cam_list[2].intrinsics * 1.1
+        with self.assertRaises(AssertionError):
+            backproject_depth_batch(depths, cam_list)
+        pset = backproject_depth_batch(
+            depths, cam_list, camera=self._cams[0])
+        np.testing.assert_allclose(pset.points, ref.points, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
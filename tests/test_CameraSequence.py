@@ -0,0 +1,96 @@
+import cv2
+import unittest
+import tempfile
+import numpy as np
+from pathlib import Path
+from calibpy.Camera import Camera
+from calibpy.CameraSequence import CameraSequence, FRAME_DTYPE
+
+
+class TestCameraSequenceModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start CameraSequence tests...")
+        self._tmp = tempfile.TemporaryDirectory()
+        self._fname = Path(self._tmp.name) / "extrinsics.camseq"
+        self._intrinsics = Camera(name="intrinsics")
+        self._intrinsics.quick_init(image_size=(48, 64))
+        self._intrinsics.distortion = np.array([[0.1, -0.05, 0, 0, 0.01]])
+        self._cams = []
+        for i in range(10):
+            cam = Camera.from_cam(self._intrinsics)
+            cam.name = f"{i:04d}"
+            RT = np.identity(4)
+            RT[:3, :3] = cv2.Rodrigues(np.array([0.1, -0.2, 0.01 * i]))[0]
+            RT[:3, 3] = [0.1 * i, -1, 4]
+            cam.RT = RT
+            self._cams.append(cam)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_append_and_read(self):
+        with CameraSequence(self._fname, self._intrinsics, "w") as seq:
+            self.assertEqual(len(seq), 0)
+            self.assertEqual(seq.RT.shape, (0, 4, 4))
+            for i, cam in enumerate(self._cams[:6]):
+                seq.append(cam, num_corners=20 + i,
+                           reprojection_error=0.1 * i)
+                # readable while appending
+                self.assertEqual(len(seq), i + 1)
+                np.testing.assert_array_equal(seq.RTb[i], cam.RTb)
+
+        # a partial record of an interrupted write is dropped
+        with open(self._fname, "ab") as f:
+            f.write(b"\1" * (FRAME_DTYPE.itemsize // 2))
+        with CameraSequence(self._fname, self._intrinsics, "a") as seq:
+            self.assertEqual(len(seq), 6)
+            seq.extend(self._cams[6:])
+
+        other = Camera.from_cam(self._intrinsics)
+        other.intrinsics = other.intrinsics * 2
+        with self.assertRaises(AssertionError):
+            CameraSequence(self._fname, other, "a")
+
+        seq = CameraSequence(self._fname)
+        self.assertEqual(len(seq), 10)
+        self.assertTrue(isinstance(seq.frames, np.memmap))
+        self.assertEqual(seq.RT.shape, (10, 4, 4))
+        np.testing.assert_array_equal(
+            seq.RTb[2:5], np.stack([x.RTb for x in self._cams[2:5]]))
+        self.assertEqual(seq.names, [x.name for x in self._cams])
+        np.testing.assert_array_equal(
+            seq.num_corners, [20, 21, 22, 23, 24, 25, -1, -1, -1, -1])
+        self.assertTrue(np.all(np.isnan(seq.reprojection_error[6:])))
+
+        np.testing.assert_array_equal(
+            seq.camera.intrinsics, self._intrinsics.intrinsics)
+        self.assertIsNone(seq.camera.RT)
+        cam = seq[7]
+        self.assertEqual(cam.name, "0007")
+        np.testing.assert_array_equal(cam.RT, self._cams[7].RT)
+        np.testing.assert_array_equal(cam.RTb, self._cams[7].RTb)
+        np.testing.assert_array_equal(
+            cam.distortion, self._intrinsics.distortion)
+        self.assertEqual(cam.image_size, (48, 64))
+        cams = seq[-3:]
+        self.assertEqual([x.name for x in cams], ["0007", "0008", "0009"])
+
+        # the header describes the layout, plain NumPy can read it
+        frames = np.fromfile(
+            self._fname, dtype=FRAME_DTYPE, offset=seq._offset)
+        np.testing.assert_array_equal(frames["RT"], seq.RT)
+
+    def test_invalid(self):
+        with open(self._fname, "wb") as f:
+            f.write(b"not a sequence file")
+        with self.assertRaises(IOError):
+            CameraSequence(self._fname)
+        seq = CameraSequence(self._fname, self._intrinsics, "w")
+        seq.close()
+        with self.assertRaises(AssertionError):
+            CameraSequence(self._fname).append(self._cams[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
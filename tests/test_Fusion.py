@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+import open3d as o3d
+from calibpy.Camera import Camera
+from calibpy.Fusion import VoxelFusion, TSDFFusion
+
+
+class TestFusionModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start Fusion tests...")
+
+    def test_voxel_fusion(self):
+        fusion = VoxelFusion(voxel_size=1.0)
+        points = np.array([[0.2, 0.2, 0.2],
+                           [0.4, 0.6, 0.8],
+                           [-0.5, 3.5, 1.5]])
+        colors = np.array([[255, 0, 0],
+                           [255, 0, 0],
+                           [0, 0, 255]], dtype=np.uint8)
+        fusion.add(points, colors)
+        self.assertEqual(len(fusion), 2)
+
+        # a second, overlapping frame only adds one new voxel
+        pcd = o3d.geometry.PointCloud()
+        pcd.points = o3d.utility.Vector3dVector(
+            [[0.9, 0.1, 0.5], [10.5, -20.5, 0.5]])
+        pcd.colors = o3d.utility.Vector3dVector([[0, 1, 0], [1, 1, 1]])
+        fusion.add_pointcloud(pcd)
+        self.assertEqual(len(fusion), 3)
+        self.assertEqual(fusion.num_frames, 2)
+        self.assertEqual(sorted(fusion.counts.tolist()), [1, 1, 3])
+
+        fused_points = fusion.points()
+        fused_colors = fusion.colors()
+        i = int(np.argmax(fusion.counts))
+        np.testing.assert_allclose(
+            fused_points[i], [0.5, 0.3, 0.5], rtol=1e-6)
+        np.testing.assert_array_equal(fused_colors[i], [170, 85, 0])
+
+        fused = fusion.to_pointcloud()
+        self.assertEqual(len(fused.points), 3)
+        self.assertTrue(fused.has_colors())
+
+        # the voxel hash does not grow if the same frame is added again
+        for _ in range(5):
+            fusion.add(points, colors)
+        self.assertEqual(len(fusion), 3)
+
+        with self.assertRaises(ValueError):
+            fusion.add(np.array([[1e7, 0, 0]]))
+        self.assertEqual(fusion.num_frames, 7)
+        self.assertEqual(len(fusion), 3)
+
+        # merging many frames matches fusing all points at once
+        rng = np.random.default_rng(0)
+        frames = [rng.uniform(-5, 5, (200, 3)) for _ in range(4)]
+        fusion = VoxelFusion(voxel_size=1.0)
+        for frame in frames:
+            fusion.add(frame)
+        reference = VoxelFusion(voxel_size=1.0)
+        reference.add(np.concatenate(frames))
+        self.assertTrue(np.all(np.diff(fusion._keys) > 0))
+        np.testing.assert_array_equal(fusion.counts, reference.counts)
+        np.testing.assert_allclose(fusion.points(), reference.points(),
+                                   rtol=1e-5)
+        self.assertFalse(fusion.to_pointcloud().has_normals())
+
+        # normals are averaged per voxel and renormalized
+        fusion = VoxelFusion(voxel_size=1.0)
+        fusion.add(np.array([[0.2, 0.2, 0.2], [0.4, 0.6, 0.8]]),
+                   normals=np.array([[1.0, 0, 0], [0, 1.0, 0]]))
+        fusion.add(np.array([[0.5, 0.5, 0.5]]))
+        pcd = fusion.to_pointcloud()
+        self.assertTrue(pcd.has_normals())
+        np.testing.assert_allclose(
+            np.asarray(pcd.normals), [[np.sqrt(0.5), np.sqrt(0.5), 0]])
+
+    def test_tsdf_fusion(self):
+        cam = Camera()
+        cam.quick_init(image_size=(60, 80))
+        depth = np.full((60, 80), 2.0, dtype=np.float32)
+        depth[:5] = np.nan
+        for blender_conform, z in [(True, -2), (False, 2)]:
+            tsdf = TSDFFusion(voxel_size=0.01, blender_conform=blender_conform)
+            for _ in range(2):
+                tsdf.integrate(cam, depth)
+            self.assertEqual(tsdf.num_frames, 2)
+            pcd = tsdf.extract_pointcloud()
+            points = np.asarray(pcd.points)
+            self.assertGreater(len(points), 0)
+            np.testing.assert_allclose(points[:, 2], z, atol=0.02)
+            mesh = tsdf.extract_mesh()
+            self.assertGreater(len(mesh.triangles), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
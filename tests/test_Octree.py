@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+import numpy as np
+from pathlib import Path
+from calibpy.Octree import (
+    OctreeWriter,
+    OctreeReader,
+    node_name,
+    node_cell)
+
+
+def sort_rows(points):
+    return points[np.lexsort(points.T)]
+
+
+class TestOctreeModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start Octree tests...")
+        rng = np.random.default_rng(0)
+        self._points = rng.uniform(-1, 1, (20000, 3)).astype(np.float32)
+        self._colors = rng.integers(0, 256, (20000, 3), dtype=np.uint8)
+
+    def test_node_names(self):
+        for cell, level in [((0, 0, 0), 0), ((1, 0, 1), 1), ((5, 2, 7), 3)]:
+            self.assertEqual(node_cell(node_name(cell, level)), (cell, level))
+        self.assertEqual(node_name((1, 1, 0), 1), "r6")
+
+    def test_write_and_query(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with OctreeWriter(tmp, [-1, -1, -1], 2.0,
+                              max_depth=3, grid_size=4) as writer:
+                for frame in np.array_split(np.arange(20000), 4):
+                    writer.add(self._points[frame], self._colors[frame])
+                writer.add(np.array([[5.0, 0, 0]]))
+                self.assertEqual(writer.num_dropped, 1)
+
+            reader = OctreeReader(tmp)
+            self.assertEqual(reader.num_points, 20000)
+            self.assertEqual(sum(reader.nodes.values()), 20000)
+
+            points, colors = reader.query()
+            self.assertEqual(len(points), 20000)
+            np.testing.assert_array_equal(
+                sort_rows(points), sort_rows(self._points))
+
+            # the root level holds at most one point per grid cell
+            points, _ = reader.query(lod=0)
+            self.assertTrue(0 < len(points) <= 4 ** 3)
+            previous = len(points)
+            for lod in range(1, 4):
+                points, _ = reader.query(lod=lod)
+                self.assertTrue(len(points) > previous)
+                previous = len(points)
+
+            lo = np.array([-0.2, 0.1, -1.0])
+            hi = np.array([0.5, 0.6, 0.0])
+            points, colors = reader.query(lo, hi)
+            inside = np.all(
+                (self._points >= lo) & (self._points <= hi), axis=1)
+            np.testing.assert_array_equal(
+                sort_rows(points), sort_rows(self._points[inside]))
+            self.assertEqual(colors.dtype, np.uint8)
+
+    def test_overwrite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with OctreeWriter(tmp, [-1, -1, -1], 2.0,
+                              max_depth=3, grid_size=4) as writer:
+                writer.add(self._points, self._colors)
+
+            # a shallower octree written into the same directory
+            # replaces the previous one entirely
+            with OctreeWriter(tmp, [-1, -1, -1], 2.0,
+                              max_depth=1, grid_size=4) as writer:
+                writer.add(self._points[:100], self._colors[:100])
+
+            reader = OctreeReader(tmp)
+            self.assertEqual(reader.num_points, 100)
+            points, colors = reader.query()
+            np.testing.assert_array_equal(
+                sort_rows(points), sort_rows(self._points[:100]))
+            self.assertEqual(
+                sorted(p.name for p in Path(tmp).iterdir()),
+                ["0", "1", "metadata.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
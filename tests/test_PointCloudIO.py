@@ -0,0 +1,64 @@
+import tempfile
+import unittest
+import numpy as np
+import open3d as o3d
+from pathlib import Path
+from calibpy.PointCloudIO import (
+    POINTCLOUD_FORMATS,
+    format_suffix,
+    quantize_points,
+    read_points,
+    read_pointcloud,
+    write_pointcloud)
+
+
+class TestPointCloudIOModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start PointCloudIO tests...")
+        rng = np.random.default_rng(0)
+        self._points = rng.uniform(-5, 5, (1000, 3)) + [10, 0, -3]
+        self._colors = rng.integers(0, 256, (1000, 3), dtype=np.uint8)
+        self._pcd = o3d.geometry.PointCloud()
+        self._pcd.points = o3d.utility.Vector3dVector(self._points)
+        self._pcd.colors = o3d.utility.Vector3dVector(self._colors / 255)
+
+    def test_quantization(self):
+        quantized, origin, scale = quantize_points(self._points)
+        self.assertEqual(quantized.dtype, np.int16)
+        error = np.abs(quantized * scale + origin - self._points)
+        self.assertTrue(np.all(error <= scale / 2 + 1e-12))
+        with self.assertRaises(ValueError):
+            quantize_points(self._points, scale=1e-5)
+
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for fmt in POINTCLOUD_FORMATS:
+                fname = Path(tmp) / f"pcl_{fmt}.{format_suffix(fmt)}"
+                write_pointcloud(fname, self._pcd, fmt)
+                points, colors = read_points(str(fname))
+                atol = 1e-5 if fmt != "ply_int16" else 1e-3
+                np.testing.assert_allclose(points, self._points, atol=atol)
+                np.testing.assert_array_equal(colors, self._colors)
+                pcd = read_pointcloud(str(fname))
+                self.assertEqual(len(pcd.points), 1000)
+                if fmt.startswith("ply"):
+                    # uncompressed files are memory-mapped
+                    self.assertFalse(colors.flags.writeable)
+                    del points, colors
+                if fmt == "ply_int16":
+                    points, _ = read_points(str(fname), dequantize=False)
+                    self.assertEqual(points.dtype, np.int16)
+                    del points
+
+            empty = o3d.geometry.PointCloud()
+            write_pointcloud(Path(tmp) / "empty.ply", empty, "ply_float32")
+            points, colors = read_points(str(Path(tmp) / "empty.ply"))
+            self.assertEqual(points.shape, (0, 3))
+
+        with self.assertRaises(ValueError):
+            format_suffix("las")
+
+
+if __name__ == '__main__':
+    unittest.main()
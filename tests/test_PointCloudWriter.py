@@ -0,0 +1,36 @@
+import tempfile
+import unittest
+import numpy as np
+import open3d as o3d
+from pathlib import Path
+from calibpy.PointCloudWriter import PointCloudWriter
+
+
+class TestPointCloudWriterModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start PointCloudWriter tests...")
+
+    def test_write(self):
+        pcd = o3d.geometry.PointCloud()
+        pcd.points = o3d.utility.Vector3dVector(np.random.rand(100, 3))
+        with tempfile.TemporaryDirectory() as tmp:
+            with PointCloudWriter(max_queued=2) as writer:
+                for i in range(5):
+                    writer.write(Path(tmp) / f"pcl_{i:06d}.ply", pcd)
+            self.assertTrue(writer.is_closed)
+            self.assertEqual(writer.num_written, 5)
+            for i in range(5):
+                result = o3d.io.read_point_cloud(
+                    str(Path(tmp) / f"pcl_{i:06d}.ply"))
+                self.assertEqual(len(result.points), 100)
+
+            writer = PointCloudWriter()
+            writer.write(Path(tmp) / "missing" / "pcl.ply", pcd)
+            with self.assertRaises(IOError):
+                writer.flush()
+            writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
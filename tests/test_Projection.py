@@ -0,0 +1,95 @@
+import cv2
+import unittest
+import numpy as np
+from calibpy.Camera import Camera
+from calibpy.CameraArray import CameraArray
+from calibpy.Projection import project_points, unproject_pixels
+
+
+class TestProjectionModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start Projection tests...")
+        self._cams = []
+        for i in range(4):
+            cam = Camera(name=f"{i:04d}")
+            cam.quick_init(image_size=(480, 640))
+            cam.set_distortion(0.1 - 0.05 * i, -0.05, 0.002, -0.001, 0.01)
+            cam.set_rotation_and_translation(
+                cv2.Rodrigues(np.array([0.1, -0.2, 0.05 * i]))[0],
+                np.array([0.1 * i, -0.2, 4.0]))
+            self._cams.append(cam)
+        rng = np.random.default_rng(0)
+        self._points = rng.uniform(-1.5, 1.5, (500, 3))
+
+    def test_project(self):
+        for cam in self._cams:
+            ref, _ = cv2.projectPoints(
+                self._points, cv2.Rodrigues(cam.RT[:3, :3])[0],
+                cam.RT[:3, 3], cam.intrinsics, cam.distortion)
+            pixels, depth, visible = cam.project_points(self._points)
+            np.testing.assert_allclose(pixels, ref.reshape(-1, 2), atol=1e-4)
+            cam_points = self._points @ cam.RT[:3, :3].T + cam.RT[:3, 3]
+            np.testing.assert_allclose(depth, cam_points[:, 2])
+            inside = (pixels[:, 0] >= -0.5) & (pixels[:, 0] < 639.5) & \
+                (pixels[:, 1] >= -0.5) & (pixels[:, 1] < 479.5)
+            np.testing.assert_array_equal(visible, inside)
+            self.assertTrue(0 < np.sum(visible) < len(visible))
+
+        # points behind the camera are not visible
+        _, depth, visible = self._cams[0].project_points(-self._points * 10)
+        self.assertFalse(np.any(visible[depth <= 0]))
+
+        # all cameras at once
+        cams = CameraArray.from_cameras(self._cams)
+        pixels, depth, visible = cams.project_points(self._points)
+        self.assertEqual(pixels.shape, (4, 500, 2))
+        self.assertEqual(visible.shape, (4, 500))
+        for i, cam in enumerate(self._cams):
+            p, d, v = cam.project_points(self._points)
+            np.testing.assert_allclose(pixels[i], p)
+            np.testing.assert_array_equal(visible[i], v)
+
+        # Blender conform world points
+        blender = self._points * [1, -1, -1]
+        p, _, _ = self._cams[1].project_points(blender, blender_conform=True)
+        np.testing.assert_allclose(p, pixels[1])
+
+        # float32 stays float32
+        p, d, _ = project_points(
+            self._points.astype(np.float32), cams.RT, cams.intrinsics,
+            cams.distortion)
+        self.assertEqual(p.dtype, np.float32)
+        np.testing.assert_allclose(p, pixels, atol=1e-2)
+
+    def test_unproject(self):
+        cams = CameraArray.from_cameras(self._cams)
+        pixels, depth, visible = cams.project_points(self._points)
+        points = cams.unproject_pixels(pixels, depth)
+        self.assertEqual(points.shape, (4, 500, 3))
+        np.testing.assert_allclose(
+            points[visible], np.broadcast_to(
+                self._points, points.shape)[visible], atol=1e-6)
+
+        cam = self._cams[2]
+        pixels, depth, visible = cam.project_points(self._points)
+        ref = cv2.undistortPointsIter(
+            pixels.reshape(-1, 1, 2), cam.intrinsics, cam.distortion,
+            None, None, (cv2.TERM_CRITERIA_COUNT, 10, 0)).reshape(-1, 2)
+        points = cam.unproject_pixels(pixels, depth, blender_conform=True)
+        cam_points = (points * [1, -1, -1]) @ cam.RT[:3, :3].T + \
+            cam.RT[:3, 3]
+        np.testing.assert_allclose(
+            cam_points[:, :2] / cam_points[:, 2:], ref, atol=1e-6)
+
+        # no distortion
+        points = unproject_pixels(
+            [[320, 240], [0, 0]], [2.0, 3.0], np.identity(4),
+            cam.intrinsics)
+        np.testing.assert_allclose(points[0, 0], [0, 0, 2])
+        np.testing.assert_allclose(
+            points[0, 1], [-320 / cam.fx * 3, -240 / cam.fy * 3, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
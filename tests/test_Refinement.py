@@ -0,0 +1,97 @@
+import cv2
+import unittest
+import numpy as np
+import open3d as o3d
+from calibpy.Camera import Camera
+from calibpy.Refinement import ICPRefinement
+
+
+T1 = np.diag([1.0, -1.0, -1.0, 1.0])
+
+
+def corner_pointcloud(spacing: float = 0.01):
+    # three orthogonal planes constrain all six degrees of freedom
+    u, v = np.meshgrid(np.arange(0, 1, spacing), np.arange(0, 1, spacing))
+    u, v, w = u.reshape(-1), v.reshape(-1), np.zeros(u.size)
+    points = np.concatenate([np.stack([u, v, w], axis=1),
+                             np.stack([u, w, v], axis=1),
+                             np.stack([w, u, v], axis=1)])
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points)
+    return pcd
+
+
+class TestRefinementModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start Refinement tests...")
+        self._cam = Camera()
+        self._cam.quick_init(image_size=(48, 64))
+        RT = np.identity(4)
+        RT[:3, :3] = cv2.Rodrigues(np.array([0.1, -0.2, 0.3]))[0]
+        RT[:3, 3] = [0.5, -1, 4]
+        self._cam.RT = RT
+        # world space error of the extrinsics of the second frame
+        self._error = np.identity(4)
+        self._error[:3, :3] = cv2.Rodrigues(np.array([0.02, -0.01, 0.03]))[0]
+        self._error[:3, 3] = [0.02, -0.03, 0.01]
+
+    def test_refine_blender_conform(self):
+        refinement = ICPRefinement(
+            voxel_sizes=[0.08, 0.04, 0.02], max_iterations=[20, 20, 10])
+        cam, pcd = refinement.refine(self._cam, corner_pointcloud())
+        np.testing.assert_allclose(cam.RT, self._cam.RT)
+        self.assertEqual(refinement.num_frames, 1)
+
+        bad = Camera.from_cam(self._cam)
+        bad.RT = self._cam.RT @ np.linalg.inv(T1 @ self._error @ T1)
+        np.testing.assert_allclose(
+            bad.RTb, self._error @ self._cam.RTb, atol=1e-12)
+        pcd = corner_pointcloud()
+        pcd.transform(self._error)
+        cam, refined = refinement.refine(bad, pcd)
+        info = refinement.history[-1]
+        self.assertTrue(info["accepted"])
+        self.assertEqual(len(info["iterations"]), 3)
+        self.assertTrue(all(
+            n <= m for n, m in zip(info["iterations"], [20, 20, 10])))
+        np.testing.assert_allclose(cam.RT, self._cam.RT, atol=2e-3)
+        np.testing.assert_allclose(
+            np.asarray(refined.points),
+            np.asarray(corner_pointcloud().points), atol=5e-3)
+        self.assertEqual(refinement.num_frames, 2)
+
+    def test_refine_opencv(self):
+        refinement = ICPRefinement(
+            voxel_sizes=[0.08, 0.02], time_budgets=10.0,
+            blender_conform=False)
+        refinement.refine(self._cam, corner_pointcloud())
+        bad = Camera.from_cam(self._cam)
+        bad.RT = self._cam.RT @ np.linalg.inv(self._error)
+        pcd = corner_pointcloud()
+        pcd.transform(self._error)
+        cam, _ = refinement.refine(bad, pcd)
+        np.testing.assert_allclose(cam.RT, self._cam.RT, atol=2e-3)
+        # the time budget is checked after runs of a few iterations
+        self.assertTrue(all(
+            n % ICPRefinement._BUDGET_ITERATIONS == 0
+            for n in refinement.history[-1]["iterations"]))
+
+    def test_reject(self):
+        refinement = ICPRefinement(voxel_sizes=[0.02], min_fitness=0.5)
+        refinement.refine(self._cam, corner_pointcloud())
+        num_points = len(refinement.model().points)
+        pcd = corner_pointcloud()
+        pcd.translate([5.0, 0.0, 0.0])
+        cam, refined = refinement.refine(self._cam, pcd)
+        self.assertFalse(refinement.history[-1]["accepted"])
+        np.testing.assert_allclose(cam.RT, self._cam.RT)
+        np.testing.assert_allclose(
+            np.asarray(refined.points), np.asarray(pcd.points))
+        # the misaligned frame is not merged into the model
+        self.assertEqual(refinement.num_frames, 2)
+        self.assertEqual(len(refinement.model().points), num_points)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,354 @@
+import cv2
+import unittest
+import tracemalloc
+import numpy as np
+import open3d as o3d
+from calibpy.Camera import Camera
+from calibpy.Calibration import Calibration
+from calibpy.Registration import (
+    backproject_depth,
+    color_values,
+    sample_pixels,
+    valid_depth_mask,
+    blender_extrinsics,
+    camera_ray_grid,
+    clear_caches,
+    estimate_grid_normals,
+    as_crop_box,
+    crop_box_window,
+    backproject_depth_batch,
+    register_depthmap_to_world,
+    project_3d_blender_conform)
+
+
+def reference_projection(depth_map, camera):
+    # float64 homogeneous projection as in the original implementation
+    h, w = depth_map.shape
+    u, v = np.meshgrid(np.arange(w), np.arange(h))
+    xyz = np.ones((4, w*h))
+    xyz[0, :] = np.reshape((u - camera.cx) * depth_map / camera.fx, -1)
+    xyz[1, :] = np.reshape(-(v - camera.cy) * depth_map / camera.fy, -1)
+    xyz[2, :] = np.reshape(-depth_map, -1)
+    return np.matmul(camera.RTb, xyz)[:3].T
+
+
+class TestRegistrationModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start Registration tests...")
+        self._cam = Camera()
+        self._cam.quick_init(image_size=(48, 64))
+        RT = np.identity(4)
+        RT[:3, :3] = cv2.Rodrigues(np.array([0.1, -0.2, 0.3]))[0]
+        RT[:3, 3] = [0.5, -1, 4]
+        self._cam.RT = RT
+        rng = np.random.default_rng(0)
+        self._depth = rng.uniform(1, 5, (48, 64)).astype(np.float32)
+
+    def test_backprojection(self):
+        points = backproject_depth(self._depth, self._cam)
+        self.assertEqual(points.dtype, np.float32)
+        np.testing.assert_allclose(
+            points, reference_projection(self._depth, self._cam),
+            rtol=1e-5, atol=1e-4)
+
+        pcd = project_3d_blender_conform(self._depth, None, self._cam)
+        self.assertEqual(len(pcd.points), 48 * 64)
+        np.testing.assert_allclose(np.asarray(pcd.colors), 200 / 255)
+
+    def test_sampling(self):
+        full = backproject_depth(self._depth, self._cam)
+        for mode in ["stride", "random", "depth_adaptive"]:
+            idx = sample_pixels(self._depth, 0.25, mode=mode, seed=3)
+            np.testing.assert_array_equal(
+                idx, sample_pixels(self._depth, 0.25, mode=mode, seed=3))
+            self.assertTrue(np.all(np.diff(idx) > 0))
+            points = backproject_depth(
+                self._depth, self._cam, pixel_indices=idx)
+            np.testing.assert_allclose(points, full[idx], rtol=1e-6)
+        idx = sample_pixels(self._depth, 0.25, mode="stride")
+        self.assertEqual(len(idx), 24 * 32)
+        with self.assertRaises(ValueError):
+            sample_pixels(self._depth, 0.25, mode="unknown")
+
+        # far pixels are kept more often in depth adaptive mode
+        depth = np.ones((100, 100), dtype=np.float32)
+        depth[:, 50:] = 4
+        idx = sample_pixels(depth, 0.2, mode="depth_adaptive")
+        far = np.count_nonzero(idx % 100 >= 50)
+        self.assertGreater(far, 4 * (len(idx) - far))
+
+        # saturated probabilities are redistributed, factor of the
+        # valid pixels is kept
+        depth = np.ones((200, 200), dtype=np.float32)
+        depth[:, 100:] = 10
+        valid = np.ones(depth.size, dtype=bool)
+        valid[:4000] = False
+        for factor in [0.2, 0.8]:
+            idx = sample_pixels(
+                depth, factor, mode="depth_adaptive", valid=valid)
+            self.assertTrue(np.all(valid[idx]))
+            self.assertAlmostEqual(
+                len(idx) / np.count_nonzero(valid), factor, delta=0.01)
+        idx = sample_pixels(depth, 1.0, mode="depth_adaptive")
+        self.assertEqual(len(idx), depth.size)
+
+        for blender_conform in [True, False]:
+            pcd1 = register_depthmap_to_world(
+                self._cam, self._depth, blender_conform=blender_conform)
+            pcd2 = register_depthmap_to_world(
+                self._cam, self._depth, blender_conform=blender_conform)
+            self.assertEqual(
+                len(pcd1.points),
+                len(sample_pixels(self._depth, 0.1)))
+            np.testing.assert_array_equal(
+                np.asarray(pcd1.points), np.asarray(pcd2.points))
+
+    def test_invalid_depth(self):
+        depth = np.copy(self._depth)
+        depth[0, :10] = 0
+        depth[1, :10] = np.nan
+        depth[2, :10] = np.inf
+        depth[3, :10] = -np.inf
+        depth[4, :10] = 1e10
+        depth[5, :10] = -1
+        # only zero, negative and non-finite depths by default
+        valid = valid_depth_mask(depth)
+        self.assertEqual(np.count_nonzero(~valid), 50)
+        self.assertTrue(np.all(valid[4 * 64:4 * 64 + 10]))
+        valid = valid_depth_mask(depth, far=100.0)
+        self.assertEqual(np.count_nonzero(~valid), 60)
+        valid = valid_depth_mask(depth, near=2, far=np.inf)
+        self.assertFalse(np.any(valid[1 * 64:4 * 64].reshape(3, 64)[:, :10]))
+        self.assertTrue(np.all(depth.reshape(-1)[valid] > 2))
+
+        for blender_conform in [True, False]:
+            stats = {}
+            pcd = register_depthmap_to_world(
+                self._cam, depth, downsample_factor=1.0,
+                blender_conform=blender_conform, stats=stats,
+                depth_far=100.0)
+            self.assertEqual(stats["masked_pixels"], 60)
+            self.assertEqual(stats["total_pixels"], 48 * 64)
+            self.assertEqual(len(pcd.points), 48 * 64 - 60)
+            self.assertTrue(np.all(np.isfinite(np.asarray(pcd.points))))
+
+    def test_colors(self):
+        v, u = np.mgrid[0:48, 0:64]
+        gray = (128 + 100 * np.sin(u / 5) * np.cos(v / 7)).astype(np.uint8)
+        for distortion in [np.zeros((1, 5)),
+                           np.array([[-0.3, 0.1, 0.001, 0.002, 0]])]:
+            self._cam.distortion = distortion
+            colors = color_values(gray, self._cam, gray.shape)
+            # the cached remap matches Calibration.undistort_image up to
+            # interpolation differences
+            ref = Calibration.undistort_image(
+                gray, self._cam.intrinsics, self._cam.distortion)
+            self.assertEqual(colors.dtype, np.uint8)
+            for i in range(3):
+                diff = np.abs(colors[:, i].astype(int) - ref.reshape(-1))
+                self.assertTrue(np.mean(diff) < 1)
+            colors = color_values(
+                gray, self._cam, gray.shape, distortion_aware=True)
+            np.testing.assert_array_equal(colors[:, 0], gray.reshape(-1))
+
+        # 16 bit colors are scaled, not clipped
+        rgb16 = np.stack([np.full((48, 64), x, dtype=np.uint16)
+                          for x in [0, 32896, 65535]], axis=-1)
+        colors = color_values(
+            rgb16, self._cam, rgb16.shape, distortion_aware=True)
+        np.testing.assert_array_equal(colors[0], [0, 128, 255])
+
+    def test_distortion_aware_rays(self):
+        cam = Camera()
+        cam.quick_init(image_size=(48, 64))
+        cam.distortion = np.array([[-0.3, 0.1, 0.001, 0.002, 0.01]])
+        rays = camera_ray_grid(cam, (48, 64), distortion_aware=True)
+        self.assertTrue(
+            rays is camera_ray_grid(cam, (48, 64), distortion_aware=True))
+        self.assertFalse(np.allclose(rays, camera_ray_grid(cam, (48, 64))))
+        clear_caches()
+        self.assertFalse(
+            rays is camera_ray_grid(cam, (48, 64), distortion_aware=True))
+
+        depth = np.full((48, 64), 2.0, dtype=np.float32)
+        points = backproject_depth(depth, cam, distortion_aware=True)
+        # project the opencv camera space points with the lens model
+        cv_points = points * np.array([1, -1, -1], dtype=np.float32)
+        pixels, _ = cv2.projectPoints(
+            cv_points.astype(np.float64), np.zeros(3), np.zeros(3),
+            cam.intrinsics, cam.distortion)
+        v, u = np.mgrid[0:48, 0:64]
+        np.testing.assert_allclose(
+            pixels.reshape(-1, 2),
+            np.stack([u.reshape(-1), v.reshape(-1)], axis=1), atol=1e-2)
+
+        blender = register_depthmap_to_world(
+            cam, depth, None, 1.0, True, distortion_aware=True)
+        opencv = register_depthmap_to_world(
+            cam, depth, None, 1.0, False, distortion_aware=True)
+        np.testing.assert_allclose(
+            np.asarray(opencv.points),
+            np.asarray(blender.points) * [1, -1, -1], atol=1e-6)
+
+    def test_buffers_and_memory(self):
+        depth = np.ones((1080, 1920), dtype=np.float32)
+        out = np.empty((1080 * 1920, 3), dtype=np.float32)
+        backproject_depth(depth, self._cam, out=out)  # warm up ray cache
+        tracemalloc.start()
+        points = backproject_depth(depth, self._cam, out=out)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertTrue(points is out)
+        self.assertLess(peak, 1024 * 1024)
+
+    def test_batch(self):
+        cams = []
+        depths = []
+        rng = np.random.default_rng(1)
+        for i in range(5):
+            cam = Camera.from_cam(self._cam)
+            RT = np.array(self._cam.RT)
+            RT[:3, 3] += [0.1 * i, 0, 0]
+            cam.RT = RT
+            cams.append(cam)
+            depth = rng.uniform(1, 5, (48, 64)).astype(np.float32)
+            depth[i] = np.nan
+            depths.append(depth)
+        RT = np.stack([cam.RT for cam in cams])
+        np.testing.assert_allclose(
+            blender_extrinsics(RT), np.stack([cam.RTb for cam in cams]),
+            atol=1e-12)
+
+        for extrinsics, camera in [(cams, None), (RT, self._cam)]:
+            pset = backproject_depth_batch(
+                np.stack(depths), extrinsics, camera=camera,
+                downsample_factor=0.5, chunk_size=2)
+            self.assertEqual(pset.points.dtype, np.float32)
+            self.assertEqual(pset.frame_ids.dtype, np.int32)
+            self.assertEqual(pset.num_frames, 5)
+            for i in range(5):
+                pcd = register_depthmap_to_world(
+                    cams[i], depths[i], None, 0.5)
+                frame = pset.frame(i)
+                np.testing.assert_allclose(
+                    frame.points, np.asarray(pcd.points),
+                    rtol=1e-5, atol=1e-4)
+                np.testing.assert_array_equal(frame.colors, 200)
+
+    def test_depth_formats(self):
+        depth = np.round(self._depth, 3)
+        depth[0, :10] = 0
+        reference = register_depthmap_to_world(
+            self._cam, depth, None, 1.0)
+        depth_mm = np.round(depth * 1000).astype(np.uint16)
+        for blender_conform in [True, False]:
+            ref = register_depthmap_to_world(
+                self._cam, depth, None, 1.0, blender_conform)
+            pcd = register_depthmap_to_world(
+                self._cam, depth_mm, None, 1.0, blender_conform,
+                depth_scale=0.001)
+            np.testing.assert_allclose(
+                np.asarray(pcd.points), np.asarray(ref.points),
+                rtol=1e-5, atol=1e-4)
+        self.assertEqual(len(reference.points), 48 * 64 - 10)
+
+        mask = valid_depth_mask(depth_mm, near=0.0, far=4.0,
+                                depth_scale=0.001)
+        np.testing.assert_array_equal(
+            mask, valid_depth_mask(depth, near=0.0, far=4.0))
+
+        depth_half = depth.astype(np.float16)
+        points = backproject_depth(depth_half, self._cam)
+        self.assertEqual(points.dtype, np.float32)
+        np.testing.assert_allclose(
+            points, backproject_depth(
+                depth_half.astype(np.float32), self._cam), rtol=1e-6)
+
+        pset = backproject_depth_batch(
+            np.stack([depth_mm, depth_mm]), [self._cam, self._cam],
+            depth_scale=0.001)
+        np.testing.assert_allclose(
+            pset.frame(1).points, np.asarray(reference.points),
+            rtol=1e-5, atol=1e-4)
+
+    def test_grid_normals(self):
+        # tilted plane n . p = -3 in Blender camera space, facing the
+        # camera in the origin
+        n = np.array([0.3, 0.2, 1.0])
+        n /= np.linalg.norm(n)
+        rays = camera_ray_grid(self._cam, (48, 64)).astype(np.float64)
+        depth = (-3 / (rays @ n)).reshape(48, 64).astype(np.float32)
+        depth[:, 40:] += 1
+        # an isolated spike has no usable neighbor
+        depth[10, 20] += 1
+        indices = sample_pixels(depth, 1.0)
+        normals, valid = estimate_grid_normals(depth, self._cam, indices)
+        self.assertEqual(normals.dtype, np.float32)
+        spike = 10 * 64 + 20
+        np.testing.assert_array_equal(valid, indices != spike)
+        np.testing.assert_array_equal(normals[indices == spike], 0)
+        # backward differences next to the discontinuity
+        expected = np.asarray(self._cam.RTb)[:3, :3] @ n
+        cols = indices % 64
+        np.testing.assert_allclose(
+            normals[(cols < 40) & valid],
+            np.tile(expected, (np.count_nonzero((cols < 40) & valid), 1)),
+            atol=1e-4)
+
+        stats = {}
+        pcd = register_depthmap_to_world(
+            self._cam, depth, None, 1.0, estimate_normals=True,
+            stats=stats)
+        self.assertTrue(pcd.has_normals())
+        self.assertEqual(len(pcd.points), 48 * 64)
+        self.assertEqual(stats["discontinuity_pixels"], 1)
+        np.testing.assert_allclose(
+            np.asarray(pcd.normals)[:40], np.tile(expected, (40, 1)),
+            atol=1e-4)
+        np.testing.assert_array_equal(np.asarray(pcd.normals)[spike], 0)
+        opencv = register_depthmap_to_world(
+            self._cam, depth, None, 1.0, False, estimate_normals=True)
+        np.testing.assert_allclose(
+            np.asarray(opencv.normals),
+            np.asarray(pcd.normals) * [1, -1, -1], atol=1e-6)
+
+    def test_crop_box(self):
+        full = np.asarray(register_depthmap_to_world(
+            self._cam, self._depth, None, 1.0).points)
+        center = np.median(full, axis=0)
+        R = cv2.Rodrigues(np.array([0.3, 0.2, -0.1]))[0]
+        boxes = [
+            (center - 0.5, center + 0.5),
+            {"center": center, "extent": [1.0, 2.0, 0.5], "R": R},
+            o3d.geometry.AxisAlignedBoundingBox(center - 1, center + 0.2)]
+        for box in boxes:
+            obb = as_crop_box(box)
+            inside = np.asarray(obb.get_point_indices_within_bounding_box(
+                o3d.utility.Vector3dVector(full.astype(np.float64))))
+            rows, cols, _ = crop_box_window(obb, self._cam, (48, 64))
+            pixels = np.zeros((48, 64), dtype=bool)
+            pixels[rows, cols] = True
+            self.assertTrue(np.all(pixels.reshape(-1)[inside]))
+
+            for blender_conform in [True, False]:
+                stats = {}
+                if blender_conform:
+                    world_box = box
+                else:
+                    flip = np.diag([1.0, -1.0, -1.0])
+                    world_box = o3d.geometry.OrientedBoundingBox(
+                        flip @ obb.center, flip @ obb.R, obb.extent)
+                pcd = register_depthmap_to_world(
+                    self._cam, self._depth, None, 1.0, blender_conform,
+                    stats=stats, crop_box=world_box)
+                expected = full[np.sort(inside)]
+                if not blender_conform:
+                    expected = expected * [1, -1, -1]
+                self.assertEqual(stats["points"], len(inside))
+                np.testing.assert_allclose(
+                    np.asarray(pcd.points), expected, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
+import json
 import unittest
+import tempfile
 import numpy as np
 from pathlib import Path
+from calibpy.Camera import Camera
 from calibpy.Serializer import Serializer
 
 
@@ -14,6 +17,10 @@ class Derivative(Serializer):
         self._h = np.array([[1, 2]])
 
 
+class Empty(Serializer):
+    pass
+
+
 class TestSerializerModule(unittest.TestCase):
 
     def setUp(self):
@@ -69,3 +76,67 @@ class TestSerializerModule(unittest.TestCase):
 
         obj4.from_dict(self._gt)
         self.check_dicts(obj4.serialize(), self._gt)
+
+        # the attributes are restored from the files, not the defaults
+        for fname in self._tmp:
+            obj5 = Empty()
+            obj5.load(filename=fname)
+            self.check_dicts(obj5.serialize(), self._gt)
+
+    def test_text_arrays(self):
+        obj = Empty()
+        obj.from_dict({
+            "small": np.arange(6, dtype=np.int16).reshape(2, 3),
+            "large": np.random.default_rng(0).random((50, 4, 4)),
+            "image": np.arange(1000, dtype=np.uint16).reshape(10, 100),
+            "empty": np.zeros((0, 4, 4)),
+            "flags": np.array([True, False]),
+            "size": (1080, 1920),
+            "scalar": np.float32(0.5),
+            "none": None})
+        gt = obj.serialize()
+        with tempfile.TemporaryDirectory() as tmp:
+            for suffix in [".yaml", ".json"]:
+                fname = Path(tmp) / f"arrays{suffix}"
+                obj.serialize(fname)
+                loaded = Empty()
+                loaded.load(fname)
+                self.check_dicts(loaded.serialize(), gt)
+                for key, val in gt.items():
+                    if isinstance(val, np.ndarray):
+                        self.assertEqual(
+                            loaded.serialize()[key].dtype, val.dtype)
+            with open(Path(tmp) / "arrays.json") as f:
+                dumped = json.load(f)
+            self.assertTrue("value" in dumped["small"])
+            self.assertTrue("base64" in dumped["large"])
+
+            obj.TXT_SIDECAR_BYTES = 4096
+            fname = Path(tmp) / "sidecar.yaml"
+            obj.serialize(fname)
+            self.assertTrue((Path(tmp) / "sidecar.large.npy").is_file())
+            self.assertFalse((Path(tmp) / "sidecar.image.npy").is_file())
+            loaded = Empty()
+            loaded.load(fname)
+            self.check_dicts(loaded.serialize(), gt)
+
+            # files of former versions keep nested lists without dtype
+            fname = Path(tmp) / "former.json"
+            with open(fname, "w") as f:
+                json.dump({"h": {"value": [[1, 2]],
+                                 "type": str(np.ndarray)}}, f)
+            loaded = Empty()
+            loaded.load(fname)
+            np.testing.assert_array_equal(loaded.serialize()["h"], [[1, 2]])
+
+    def test_camera(self):
+        cam = Camera(name="cam")
+        cam.quick_init()
+        cam.set_distortion(0.1, -0.05, 0.001, 0.002, 0.01)
+        with tempfile.TemporaryDirectory() as tmp:
+            for suffix in [".yaml", ".json"]:
+                fname = Path(tmp) / f"cam{suffix}"
+                cam.serialize(fname)
+                loaded = Camera()
+                loaded.load(fname)
+                self.check_dicts(loaded.serialize(), cam.serialize())
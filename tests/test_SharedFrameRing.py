@@ -0,0 +1,101 @@
+import cv2
+import unittest
+import numpy as np
+from pathlib import Path
+from multiprocessing import shared_memory
+from calibpy.Stream import FileStream
+from calibpy.SharedFrameRing import (
+    SharedFrameRing,
+    attach_frame,
+    close_attached,
+    process_stream,
+    _ATTACHED)
+
+
+def frame_mean(frame):
+    return float(np.mean(frame))
+
+
+class TestSharedFrameRingModule(unittest.TestCase):
+
+    def setUp(self):
+        print("start SharedFrameRing tests...")
+        self._root = Path.cwd() / "tests" / "data"
+
+    def assertUnlinked(self, name):
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+    def test_slots(self):
+        with SharedFrameRing(num_slots=2, slot_nbytes=64) as ring:
+            name = ring.name
+            a = ring.put(np.arange(8, dtype=np.float64))
+            b = ring.put(np.ones((2, 3), dtype=np.uint8))
+            self.assertEqual(ring.num_free, 0)
+            np.testing.assert_array_equal(
+                ring.get(a), np.arange(8, dtype=np.float64))
+            self.assertEqual(ring.get(b).shape, (2, 3))
+            with self.assertRaises(ValueError):
+                ring.put(np.zeros(100))
+            ring.release(a)
+            c = ring.put(np.zeros(4))
+            self.assertEqual(c.slot, a.slot)
+        self.assertTrue(ring.is_closed)
+        self.assertUnlinked(name)
+
+    def test_attached(self):
+        # the current process acts as worker
+        with SharedFrameRing(num_slots=2, slot_nbytes=64) as ring_a:
+            frame = attach_frame(ring_a.put(np.arange(4)))
+            np.testing.assert_array_equal(frame, np.arange(4))
+            with SharedFrameRing(num_slots=2, slot_nbytes=64) as ring_b:
+                # a view of ring a is alive, thus it stays attached
+                attach_frame(ring_b.put(np.arange(4)))
+                self.assertEqual(
+                    sorted(_ATTACHED.keys()),
+                    sorted([ring_a.name, ring_b.name]))
+                # derived views keep the segment attached, too
+                view = frame[1:]
+                del frame
+                close_attached(keep=ring_b.name)
+                self.assertEqual(len(_ATTACHED), 2)
+                np.testing.assert_array_equal(view, [1, 2, 3])
+                del view
+                close_attached(keep=ring_b.name)
+                self.assertEqual(list(_ATTACHED.keys()), [ring_b.name])
+        close_attached()
+        self.assertEqual(len(_ATTACHED), 0)
+
+    def test_process_stream(self):
+        filenames = [
+            str(self._root / "single_cam" / "undistorted" / f"{i:04d}.png")
+            for i in range(1, 7)]
+        fs = FileStream()
+        fs.initialize(filenames=filenames)
+        results = dict(process_stream(
+            fs, frame_mean, processes=2, num_slots=3))
+        self.assertEqual(sorted(results.keys()), list(range(6)))
+        for i, fname in enumerate(filenames):
+            ref = cv2.imread(fname, cv2.IMREAD_GRAYSCALE)
+            self.assertAlmostEqual(results[i], np.mean(ref))
+
+        # stopping early doesn't leave workers on an unlinked ring
+        for i, result in process_stream(
+                fs, frame_mean, processes=2, num_slots=3):
+            break
+        self.assertEqual(len(list(process_stream(fs, frame_mean))), 6)
+
+        # every frame is checked, not only the first
+        class FailingStream(FileStream):
+            def read(self, index, *args, **kwargs):
+                if index == 3:
+                    return None
+                return super().read(index, *args, **kwargs)
+        failing = FailingStream()
+        failing.initialize(filenames=filenames)
+        with self.assertRaises(AssertionError):
+            list(process_stream(failing, frame_mean, processes=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,13 @@ import cv2
 import unittest
 import numpy as np
 from pathlib import Path
-from calibpy.Stream import FileStream
+from calibpy.Stream import (
+    FileStream,
+    VideoStream,
+    SynchronizedStream,
+    sample_frames)
+from calibpy.FrameIndex import FrameIndex
+from calibpy.AsyncStream import AsyncStream
 
 
 class TestStreamModule(unittest.TestCase):
@@ -77,8 +83,322 @@ class TestStreamModule(unittest.TestCase):
             fname = fs.current_filename()
             self.assertEqual(fname, filenames[i])
 
+    def test_sampling_from_dir(self):
+        directory = str(self._root / "single_cam" / "undistorted")
+        fs = FileStream()
+        fs.initialize(directory=directory, from_frame=2, stride=10)
+        self.assertEqual(
+            [Path(x).name for x in fs.filenames],
+            ["0003.png", "0013.png", "0023.png"])
+        fs = FileStream()
+        fs.initialize(directory=directory, num_frames=3)
+        self.assertEqual(
+            [Path(x).name for x in fs.filenames],
+            ["0001.png", "0013.png", "0024.png"])
+        fs1 = FileStream()
+        fs1.initialize(directory=directory, num_frames=5, random_seed=42)
+        fs2 = FileStream()
+        fs2.initialize(directory=directory, num_frames=5, random_seed=42)
+        self.assertEqual(fs1.length, 5)
+        self.assertEqual(fs1.filenames, fs2.filenames)
+        self.assertEqual(fs1.filenames, sorted(fs1.filenames))
+        self.assertEqual(sample_frames(list(range(10)), 4, 10), [0, 4, 8])
+
     def test_load_pre_suffixes_from_dir(self):
-        pass
+        root = self._root / "dummy_images"
+        fs = FileStream()
+        fs.initialize(directory=str(root / "prefixes"), prefix="p1")
+        self.assertEqual(
+            [Path(x).name for x in fs.filenames],
+            ["p1_0001.png", "p1_0004.png"])
+        fs = FileStream()
+        fs.initialize(directory=str(root / "suffixes"), suffix="s1")
+        self.assertEqual(
+            [Path(x).name for x in fs.filenames],
+            ["0001_s1.png", "0004_s1.png"])
+        fs = FileStream()
+        fs.initialize(
+            directory=str(root / "pre_and_suffixes"),
+            prefix="p1",
+            suffix="s1")
+        self.assertEqual(
+            [Path(x).name for x in fs.filenames],
+            ["p1_0001_s1.png", "p1_0004_s1.png"])
+        self.assertEqual(
+            Path(fs.filename_of_frame(4)).name, "p1_0004_s1.png")
+        self.assertTrue(fs.filename_of_frame(3) is None)
+
+    def test_unknown_naming(self):
+        with self.assertRaises(IOError) as e:
+            FileStream.sort_filenames(["0001.png", "a_b_c.png"])
+        self.assertNotIn("  ", str(e.exception))
+
+    def test_frame_index(self):
+        import shutil
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            src = self._root / "dummy_images" / "same_pattern"
+            for fname in ["0001.png", "0002.png", "0003.png"]:
+                shutil.copy(src / fname, tmp)
+            index = FrameIndex(tmp)
+            self.assertFalse(index.from_sidecar)
+            self.assertTrue(Path(index.sidecar_filename).is_file())
+            self.assertEqual(index.frames(), [1, 2, 3])
+            self.assertEqual(
+                index.filename_of(2), str(Path(tmp) / "0002.png"))
+
+            # unchanged directory, the sidecar is reused
+            index = FrameIndex(tmp)
+            self.assertTrue(index.from_sidecar)
+            self.assertEqual(len(index), 3)
+
+            # adding a frame invalidates the sidecar
+            shutil.copy(src / "0001.png", Path(tmp) / "0010.png")
+            index = FrameIndex(tmp)
+            self.assertFalse(index.from_sidecar)
+            self.assertEqual(index.frames(), [1, 2, 3, 10])
+            self.assertEqual(
+                index.filenames()[-1], str(Path(tmp) / "0010.png"))
+
+        # sidecars of read-only data directories are stored elsewhere
+        with tempfile.TemporaryDirectory() as tmp, \
+                tempfile.TemporaryDirectory() as sidecars:
+            shutil.copy(src / "0001.png", tmp)
+            index = FrameIndex(tmp, sidecar_directory=sidecars)
+            self.assertEqual(
+                Path(index.sidecar_filename).parent, Path(sidecars))
+            self.assertTrue(Path(index.sidecar_filename).is_file())
+            self.assertFalse((Path(tmp) / FrameIndex.INDEX_FILENAME).exists())
+            index = FrameIndex(tmp, sidecar_directory=sidecars)
+            self.assertTrue(index.from_sidecar)
+
+            # a sidecar directory that is not writable is skipped
+            missing = Path(sidecars) / "missing"
+            index = FrameIndex(tmp, sidecar_directory=missing)
+            self.assertFalse(index.from_sidecar)
+            self.assertFalse(missing.exists())
+            self.assertEqual(index.frames(), [1])
+
+    def test_exr_pixel_types(self):
+        import tempfile
+        import Imath
+        import OpenEXR as exr
+        depth = np.linspace(0.5, 10, 24).reshape(4, 6)
+        with tempfile.TemporaryDirectory() as tmp:
+            for pixel_type, dtype in [
+                    (Imath.PixelType.HALF, np.float16),
+                    (Imath.PixelType.FLOAT, np.float32)]:
+                fname = str(Path(tmp) / f"depth_{pixel_type}.exr")
+                header = exr.Header(6, 4)
+                header["channels"] = {
+                    "R": Imath.Channel(Imath.PixelType(pixel_type))}
+                file = exr.OutputFile(fname, header)
+                file.writePixels({"R": depth.astype(dtype).tobytes()})
+                file.close()
+                channel = FileStream.load_image(fname)
+                self.assertEqual(channel.dtype, dtype)
+                np.testing.assert_array_equal(channel, depth.astype(dtype))
+
+    def test_video_stream(self):
+        import tempfile
+        filenames = [
+            str(self._root / "single_cam" / "undistorted" / f"{i:04d}.png")
+            for i in range(1, 11)]
+        with tempfile.TemporaryDirectory() as tmp:
+            video = str(Path(tmp) / "capture.avi")
+            first = cv2.imread(filenames[0])
+            h, w = first.shape[:2]
+            writer = cv2.VideoWriter(
+                video, cv2.VideoWriter_fourcc(*"MJPG"), 10, (w, h))
+            for fname in filenames:
+                writer.write(cv2.imread(fname))
+            writer.release()
+
+            vs = VideoStream()
+            self.assertTrue(vs.initialize(filename=video))
+            self.assertEqual(vs.length, 10)
+            frames = []
+            while True:
+                img = vs.next()
+                if img is None:
+                    break
+                self.assertEqual(img.shape, (h, w))
+                self.assertEqual(
+                    Path(vs.current_filename()).name,
+                    f"capture_{len(frames):06d}.png")
+                frames.append(img)
+            self.assertEqual(len(frames), 10)
+
+            vs = VideoStream()
+            vs.initialize(
+                filename=video, from_frame=1, to_frame=9, stride=3)
+            self.assertEqual(vs.length, 3)
+            for i, frame in enumerate([1, 4, 7]):
+                img = vs.next()
+                np.testing.assert_array_equal(img, frames[frame])
+                self.assertEqual(vs.frame_number(i), frame)
+            self.assertTrue(vs.next() is None)
+
+            # random access seeks, sequential access continues from there
+            np.testing.assert_array_equal(vs.get(0), frames[1])
+            np.testing.assert_array_equal(vs.get(2), frames[7])
+            np.testing.assert_array_equal(vs.get(1), frames[4])
+            img = vs.get(1, flag=cv2.IMREAD_COLOR)
+            self.assertEqual(img.shape, (h, w, 3))
+
+            # fallback of containers without frame count
+            self.assertEqual(vs._count_frames(), 10)
+            np.testing.assert_array_equal(vs.get(0), frames[1])
+            vs.release()
+
+            with self.assertRaises(ValueError):
+                VideoStream().initialize(
+                    filename=video, num_frames=3, random_seed=1)
+
+    def test_synchronized_stream(self):
+        import shutil
+        import tempfile
+        from calibpy.Camera import Camera
+        with tempfile.TemporaryDirectory() as tmp:
+            color_dir = Path(tmp) / "color"
+            depth_dir = Path(tmp) / "depth"
+            color_dir.mkdir()
+            depth_dir.mkdir()
+            src = self._root / "single_cam" / "undistorted"
+            for i in [1, 2, 4]:
+                shutil.copy(src / f"{i:04d}.png", color_dir)
+            for i in range(1, 5):
+                depth = np.full((4, 6), 1000 * i, dtype=np.uint16)
+                cv2.imwrite(str(depth_dir / f"depth_{i:04d}.png"), depth)
+            cams = []
+            for i in [4, 2, 1, 3]:
+                cam = Camera()
+                cam.quick_init()
+                cam.name = f"{i:04d}"
+                cams.append(cam)
+
+            stream = SynchronizedStream()
+            self.assertTrue(stream.initialize(
+                depth_directory=str(depth_dir),
+                color_directory=str(color_dir),
+                extrinsics=cams))
+            self.assertEqual(stream.frames, [1, 2, 4])
+            self.assertEqual(stream.report["missing_color"], [3])
+            self.assertEqual(stream.report["missing_depth"], [])
+            for frame in [1, 2, 4]:
+                color, depth, cam = stream.next()
+                self.assertEqual(cam.name, f"{frame:04d}")
+                self.assertEqual(depth.dtype, np.uint16)
+                self.assertEqual(depth[0, 0], 1000 * frame)
+                ref = cv2.cvtColor(
+                    cv2.imread(str(color_dir / f"{frame:04d}.png")),
+                    cv2.COLOR_BGR2RGB)
+                np.testing.assert_array_equal(color, ref)
+            self.assertTrue(stream.next() is None)
+            color, depth, cam = stream.get(1)
+            self.assertEqual(cam.name, "0002")
+            stream.close()
+
+            # frames sampled before are paired, not sampled again
+            self.assertTrue(stream.initialize(
+                depth_directory=str(depth_dir),
+                extrinsics=cams[:2],
+                frames=[4, 2]))
+            self.assertEqual(stream.frames, [2, 4])
+            self.assertEqual(stream.report["missing_extrinsics"], [])
+            self.assertTrue(stream.initialize(
+                depth_directory=str(depth_dir), frames=[1, 5]))
+            self.assertEqual(stream.frames, [1])
+            self.assertEqual(stream.report["missing_depth"], [5])
+            with self.assertRaises(ValueError):
+                stream.initialize(
+                    depth_directory=str(depth_dir), frames=[1],
+                    num_frames=2)
+            stream.close()
+
+            # several files per frame are chosen by prefix
+            for i in range(1, 5):
+                mask = np.zeros((4, 6), dtype=np.uint8)
+                cv2.imwrite(str(depth_dir / f"mask_{i:04d}.png"), mask)
+            with self.assertRaises(IOError):
+                stream.initialize(depth_directory=str(depth_dir))
+            self.assertTrue(stream.initialize(
+                depth_directory=str(depth_dir), depth_prefix="depth"))
+            self.assertEqual(stream.frames, [1, 2, 3, 4])
+            self.assertEqual(stream.get(2)[1][0, 0], 3000)
+            stream.close()
+
+    def test_async_stream(self):
+        import asyncio
+        filenames = [
+            str(self._root / "single_cam" / "undistorted" / f"{i:04d}.png")
+            for i in range(1, 7)]
+        fs = FileStream()
+        fs.initialize(filenames=filenames)
+
+        async def run():
+            async with AsyncStream(fs, max_in_flight=2) as astream:
+                means = []
+                async for img in astream:
+                    means.append(await astream.submit(np.mean, img))
+                img = await astream.aget(3, flag=cv2.IMREAD_COLOR)
+                missing = await astream.aget(10)
+            return means, img, missing
+
+        means, img, missing = asyncio.run(run())
+        self.assertEqual(len(means), 6)
+        for mean, fname in zip(means, filenames):
+            ref = cv2.imread(fname, cv2.IMREAD_GRAYSCALE)
+            self.assertAlmostEqual(mean, np.mean(ref))
+        np.testing.assert_array_equal(img, cv2.imread(filenames[3]))
+        self.assertTrue(missing is None)
+        self.assertEqual(fs.current_frame, -1)
+
+    def test_async_stream_in_flight(self):
+        import time
+        import asyncio
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        filenames = [
+            str(self._root / "single_cam" / "undistorted" / f"{i:04d}.png")
+            for i in range(1, 7)]
+        fs = FileStream()
+        fs.initialize(filenames=filenames)
+        lock = threading.Lock()
+        counts = {"current": 0, "max": 0}
+        read = fs.read
+
+        def counting_read(*args, **kwargs):
+            with lock:
+                counts["current"] += 1
+                counts["max"] = max(counts["max"], counts["current"])
+            time.sleep(0.02)
+            try:
+                return read(*args, **kwargs)
+            finally:
+                with lock:
+                    counts["current"] -= 1
+
+        fs.read = counting_read
+
+        async def iterate(astream):
+            return [img.shape async for img in astream]
+
+        # more workers than max_in_flight, the semaphore has to limit
+        executor = ThreadPoolExecutor(max_workers=8)
+
+        async def run():
+            async with AsyncStream(
+                    fs, max_in_flight=2, executor=executor) as astream:
+                return await asyncio.gather(
+                    iterate(astream),
+                    *[astream.aget(i % 6) for i in range(6)])
+
+        results = asyncio.run(run())
+        executor.shutdown()
+        self.assertEqual(len(results[0]), 6)
+        self.assertTrue(all(x is not None for x in results[1:]))
+        self.assertLessEqual(counts["max"], 2)
 
     def test_looping(self):
         fs = FileStream(is_looping=False)
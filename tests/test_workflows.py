@@ -119,7 +119,13 @@ class TestCameraModule(unittest.TestCase):
         directory = self._root / "single_cam" / "undistorted"
         stream.initialize(directory=directory)
 
-        cams = calib.calibrate_extrinsics(stream, cam)
+        quality = []
+        cams = calib.calibrate_extrinsics(stream, cam, quality=quality)
+        self.assertEqual(len(quality), len(cams))
+        for q in quality:
+            self.assertTrue(
+                q["num_corners"] >= settings.min_number_of_corners)
+            self.assertTrue(q["reprojection_error"] < 1.0)
         i = 1
         for cam in cams:
             name = cam.name if cam.name else i
@@ -147,6 +153,73 @@ class TestCameraModule(unittest.TestCase):
                     #broken with opencv 4.5.4
                     #self.assertTrue(test < 0.1)
 
+    def test_register_stream(self):
+        import tempfile
+        import open3d as o3d
+        from calibpy.Camera import Camera
+        from calibpy.Octree import OctreeReader
+        from calibpy.Refinement import ICPRefinement
+        from calibpy.single_cam_workflow import (
+            iter_register_stream,
+            register_stream)
+        with tempfile.TemporaryDirectory() as tmp:
+            depth_dir = Path(tmp) / "depth"
+            out_dir = Path(tmp) / "out"
+            depth_dir.mkdir()
+            out_dir.mkdir()
+            cams = []
+            for i in range(6):
+                depth = np.full((48, 64), i + 1, dtype=np.uint16)
+                cv2.imwrite(str(depth_dir / f"{i:04d}.png"), depth)
+                cam = Camera()
+                cam.quick_init(image_size=(48, 64))
+                cam.name = f"{i:04d}"
+                cams.append(cam)
+
+            stats = {}
+            indices = []
+            for i, pcd in iter_register_stream(
+                    "", str(depth_dir), cams, out_dir,
+                    num_workers=3, stats=stats):
+                indices.append(i)
+                self.assertTrue(len(pcd.points) > 0)
+            self.assertEqual(sorted(indices), list(range(6)))
+            self.assertEqual(stats["total_pixels"], 6 * 48 * 64)
+            for i in range(6):
+                pcd = o3d.io.read_point_cloud(
+                    str(out_dir / f"pcl_{i:06d}.ply"))
+                ref = register_depthmap_to_world(
+                    cams[i], np.full((48, 64), i + 1, dtype=np.uint16))
+                np.testing.assert_allclose(
+                    np.asarray(pcd.points), np.asarray(ref.points),
+                    rtol=1e-5, atol=1e-5)
+
+            # planes of different depths don't overlap, the refinement
+            # rejects all frames and keeps their order
+            refinement = ICPRefinement(voxel_sizes=[0.2, 0.1])
+            refined = {}
+            indices = [i for i, _ in iter_register_stream(
+                "", str(depth_dir), cams, None, num_workers=3,
+                refinement=refinement, cameras=refined)]
+            self.assertEqual(indices, list(range(6)))
+            self.assertEqual(refinement.num_frames, 6)
+            for i in range(6):
+                np.testing.assert_allclose(refined[i].RT, cams[i].RT)
+
+            register_stream(
+                "", str(depth_dir), cams, out_dir,
+                octree_bbox=([-5, -5, -7], [5, 5, 3]), octree_depth=2)
+            reader = OctreeReader(out_dir / "octree")
+            self.assertTrue(reader.num_points > 0)
+            points, _ = reader.query()
+            self.assertEqual(len(points), reader.num_points)
+
+            pcds = register_stream("", str(depth_dir), cams, None)
+            self.assertEqual(len(pcds), 6)
+            for i, pcd in enumerate(pcds):
+                np.testing.assert_allclose(
+                    np.asarray(pcd.points)[:, 2], -(i + 1), rtol=1e-5)
+
     def test_registration(self):
         # create a settings object
         settings = Settings()